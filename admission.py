@@ -0,0 +1,151 @@
+"""
+Admission control for blocking work called from async endpoints.
+
+Work runs on a dedicated thread pool so the event loop stays free. At most `max_in_flight`
+calls run at once and at most `max_queue` wait for a slot; beyond that callers get
+`ServerBusy` right away (mapped to 503 + Retry-After by the routes) instead of piling up
+behind a slow LLM call.
+"""
+import asyncio
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from starlette.responses import StreamingResponse
+
+from profiling import profiled
+
+# Marks the end of a generator driven with next() on the pool
+_DONE = object()
+
+
+class ServerBusy(Exception):
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(self, name: str, max_in_flight: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix=name)
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        # Exponentially weighted mean service time, used for Retry-After
+        self._mean_seconds = 1.0
+
+    def retry_after(self) -> int:
+        backlog = self.waiting + self.in_flight
+        return max(1, math.ceil(self._mean_seconds * (backlog + 1) / self.max_in_flight))
+
+    def _reject(self, reason: str):
+        self.rejected += 1
+        raise ServerBusy(f"{self.name}: {reason}, retry later", self.retry_after())
+
+    async def _acquire(self):
+        # Counters are updated before the first await, so this check sees every caller
+        if self.in_flight + self.waiting >= self.max_in_flight + self.max_queue:
+            self._reject("too many requests queued")
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._reject("timed out waiting for a free slot")
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        return time.perf_counter()
+
+    def _release(self, started: float):
+        self._mean_seconds = 0.8 * self._mean_seconds + 0.2 * (time.perf_counter() - started)
+        self.in_flight -= 1
+        self._slots.release()
+
+    async def run(self, fn, *args):
+        """
+        Run `fn(*args)` on the pool once a slot is free. Raises ServerBusy when saturated.
+        """
+        started = await self._acquire()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, profiled(fn), *args)
+        finally:
+            self._release(started)
+
+    async def stream(self, fn, *args):
+        """
+        Admit a call to the generator function `fn(*args)` and return an `AdmittedStream`
+        over its items, each produced on the pool. Raises ServerBusy before anything runs;
+        the slot is held until the stream is exhausted or closed. Serve it with
+        `AdmittedStreamingResponse`, which closes it however the response ends.
+        """
+        started = await self._acquire()
+        return AdmittedStream(self, started, fn, args)
+
+
+class AdmittedStream:
+    """
+    Async iterator over a generator admitted by `AdmissionController.stream`. The slot is
+    released once, on exhaustion, on an error or cancellation while iterating, or by
+    `aclose()`, including when iteration never started.
+    """
+
+    def __init__(self, controller: AdmissionController, started: float, fn, args):
+        self._controller = controller
+        self._started = started
+        self._fn = fn
+        self._args = args
+        self._generator = None
+        self._closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._closed:
+            raise StopAsyncIteration
+        loop = asyncio.get_running_loop()
+        executor = self._controller._executor
+        try:
+            if self._generator is None:
+                self._generator = await loop.run_in_executor(executor, profiled(self._fn), *self._args)
+            item = await loop.run_in_executor(executor, profiled(next), self._generator, _DONE)
+        except BaseException:
+            await self.aclose()
+            raise
+        if item is _DONE:
+            await self.aclose()
+            raise StopAsyncIteration
+        return item
+
+    async def aclose(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if self._generator is not None:
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(self._controller._executor, profiled(self._generator.close))
+        finally:
+            self._controller._release(self._started)
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse over an `AdmittedStream` that frees its slot however the response
+    ends, including when the client is gone before the first item is sent.
+    """
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.body_iterator.aclose()
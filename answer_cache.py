@@ -0,0 +1,189 @@
+"""
+Semantic answer cache for the chat endpoints.
+
+A query is answered from the cache when its normalized text matches an earlier query, or
+when its embedding's cosine similarity to one is at least `similarity`. Entries belong to
+the knowledge-base version they were answered against; as soon as a commit bumps the
+version, all older entries are dropped. Eviction is LRU, bounded by entry count and an
+approximate memory budget, plus a TTL counted from when the answer was stored.
+
+Answers to scoped searches (one user's videos, PDFs only, ...) are cached per scope and
+only ever match queries with the same scope.
+"""
+import copy
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# ANSWER_CACHE_MAX_ENTRIES=0 disables the cache
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1024"))
+ANSWER_CACHE_MAX_MB = float(os.getenv("ANSWER_CACHE_MAX_MB", "32"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """
+    Case-, whitespace- and punctuation-insensitive form of a query.
+    """
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", query.lower())).strip()
+
+
+class _Entry:
+    __slots__ = ("vector", "answer", "created", "size")
+
+    def __init__(self, vector, answer, created, size):
+        self.vector = vector
+        self.answer = answer
+        self.created = created
+        self.size = size
+
+
+class AnswerCache:
+    def __init__(self, max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 max_bytes: int = int(ANSWER_CACHE_MAX_MB * 1024 * 1024),
+                 ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+                 similarity: float = ANSWER_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.similarity = similarity
+
+        self._lock = threading.Lock()
+        # (scope, normalized query) -> _Entry, least recently used first
+        self._entries = OrderedDict()
+        # The same keys, oldest first, for the TTL: a recent hit does not extend it
+        self._created = OrderedDict()
+        self._version = None
+        self._bytes = 0
+
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        del self._created[key]
+        self._bytes -= entry.size
+
+    def _sync_version(self, version) -> bool:
+        """
+        Move the cache to `version`, dropping every older entry. Returns False if `version`
+        is already outdated (a request that started before the latest commit).
+        """
+        if self._version is not None and version < self._version:
+            return False
+        if version != self._version:
+            self._entries.clear()
+            self._created.clear()
+            self._bytes = 0
+            self._version = version
+        return True
+
+    def _expire(self, now):
+        while self._created:
+            key = next(iter(self._created))
+            if now - self._entries[key].created < self.ttl_seconds:
+                break
+            self._drop(key)
+            self.evictions += 1
+
+    def _hit(self, key):
+        self._entries.move_to_end(key)
+        return copy.deepcopy(self._entries[key].answer)
+
+    def get(self, version, query: str, vector=None, scope: str = "", record_miss: bool = True):
+        """
+        Cached answer for `query` at KB `version` within `scope`, or None. The exact-text
+        check needs no embedding; pass the query `vector` to also match similar queries.
+        A caller that will retry with the vector passes `record_miss=False` on the first
+        lookup, so the query counts as one miss.
+        """
+        if not self.enabled:
+            return None
+
+        key = (scope, normalize_query(query))
+        with self._lock:
+            if not self._sync_version(version):
+                return None
+            self._expire(time.monotonic())
+
+            if key in self._entries:
+                self.hits += 1
+                return self._hit(key)
+
+            keys = [
+                k for k, entry in self._entries.items()
+                if entry.vector is not None and k[0] == scope
+            ]
+            if vector is not None and keys:
+                matrix = np.stack([self._entries[k].vector for k in keys])
+                scores = matrix @ _unit(vector)
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity:
+                    self.hits += 1
+                    self.semantic_hits += 1
+                    return self._hit(keys[best])
+
+            if record_miss:
+                self.misses += 1
+            return None
+
+    def put(self, version, query: str, vector, answer: dict, scope: str = ""):
+        """
+        Store an answer. Entries stored without a `vector` only match by text.
+        """
+        if not self.enabled:
+            return
+
+        key = (scope, normalize_query(query))
+        size = len(scope) + len(key[1]) + len(json.dumps(answer, default=str))
+        if vector is not None:
+            vector = _unit(vector)
+            size += vector.nbytes
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if not self._sync_version(version):
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = _Entry(vector, copy.deepcopy(answer), time.monotonic(), size)
+            self._created[key] = None
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "version": self._version,
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+def _unit(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
@@ -1,17 +1,36 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 from app.db.database import engine, Base
-from app.routers import auth, video, chat
+from app.routers import auth, video, chat, admin
+from app.services.transcription_jobs import resume_transcription_jobs
+from chatbot import start_warm_up, readiness
+from metrics import CONTENT_TYPE, MetricsMiddleware, render as render_metrics
+from profiling import ProfilingMiddleware
+from uploads import UploadSizeLimitMiddleware, MAX_VIDEO_BYTES
 import app.models.user
 import app.models.video
 
 # Create Database Tables
 Base.metadata.create_all(bind=engine)
+# create_all skips indexes of tables that already exist
+for index in app.models.video.TranscriptionJob.__table__.indexes:
+    index.create(bind=engine, checkfirst=True)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pick up transcription jobs that were queued or interrupted before a restart
+    resume_transcription_jobs()
+    # Load the models and the knowledge base in the background; /ready reports when done
+    start_warm_up()
+    yield
 
 app = FastAPI(
     title="Video Transcription API",
     description="FastAPI with PostgreSQL and JWT Auth",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # CORS Setup
@@ -22,16 +41,29 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(UploadSizeLimitMiddleware, limits={"/videos/upload": MAX_VIDEO_BYTES})
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ProfilingMiddleware)
 
 # Include Routers
 app.include_router(auth.router)
 app.include_router(video.router)
 app.include_router(chat.router)
+app.include_router(admin.router)
 
 @app.get("/")
 def home():
     return {"message": "Video Transcription API with PostgreSQL is running! 🚀"}
 
+@app.get("/ready")
+def ready():
+    status = readiness()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.get("/metrics")
+def metrics():
+    return Response(render_metrics(), media_type=CONTENT_TYPE)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app.main:app", host="0.0.0.0", port=8010, reload=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON, Float, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.database import Base
@@ -10,10 +10,13 @@ class Video(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     video_name = Column(String)
     video_path = Column(String)
+    # SHA-256 of the file; uploads are stored content-addressed under this hash
+    content_hash = Column(String, index=True, nullable=True)
     uploaded_at = Column(DateTime(timezone=True), server_default=func.now())
 
     user = relationship("app.models.user.User", back_populates="videos")
     transcriptions = relationship("VideoTranscribe", back_populates="video")
+    jobs = relationship("TranscriptionJob", back_populates="video")
 
 class VideoTranscribe(Base):
     __tablename__ = "videotranscribe"
@@ -27,3 +30,32 @@ class VideoTranscribe(Base):
 
     video = relationship("Video", back_populates="transcriptions")
     user = relationship("app.models.user.User", back_populates="transcriptions")
+
+class TranscriptionJob(Base):
+    __tablename__ = "transcription_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    video_id = Column(Integer, ForeignKey("videos.id"), index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    engine = Column(String, default="google")
+    # queued -> running -> succeeded | failed
+    status = Column(String, default="queued", index=True)
+    stage = Column(String, nullable=True)
+    progress = Column(Float, default=0.0)
+    stage_timings = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    transcription_id = Column(Integer, ForeignKey("videotranscribe.id"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+
+    video = relationship("Video", back_populates="jobs")
+
+    __table_args__ = (
+        # At most one queued or running job per video; enqueueing relies on it
+        Index(
+            "uq_transcription_jobs_active_video", "video_id", unique=True,
+            postgresql_where=status.in_(("queued", "running"))
+        ),
+    )
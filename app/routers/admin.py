@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import FileResponse
+from typing import Optional
+
+from profiling import admin_enabled, authorized, list_profiles, load_profile, profile_data_path
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+def check_token(x_profile_token: Optional[str]):
+    # Disabled unless PROFILE_TOKEN is configured
+    if not admin_enabled():
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not authorized(x_profile_token):
+        raise HTTPException(status_code=403, detail="Invalid profile token")
+
+@router.get("/profiles")
+def get_profiles(limit: int = 50, x_profile_token: Optional[str] = Header(None)):
+    """
+    Recently profiled requests, newest first. Send X-Profile: <PROFILE_TOKEN> to profile a request.
+    """
+    check_token(x_profile_token)
+    return {"profiles": list_profiles(limit)}
+
+@router.get("/profiles/{profile_id}")
+def get_profile(profile_id: str, raw: bool = False, x_profile_token: Optional[str] = Header(None)):
+    """
+    The summary and top functions of a profiled request; raw=true downloads the pstats file.
+    """
+    check_token(x_profile_token)
+    if raw:
+        path = profile_data_path(profile_id)
+        if path is None:
+            raise HTTPException(status_code=404, detail="Profile not found")
+        return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+    profile = load_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
@@ -3,56 +3,110 @@ from pydantic import BaseModel
 from typing import Optional
 import os
 from app.db.database import get_db
+from app.dependencies import get_current_user
+from app.models.user import User
+from app.models.video import Video
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 # Import existing chatbot logic (assuming chatbot.py is in root, we might need to adjust path or move it)
 import sys
 sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/../../")
-from chatbot import get_insights_from_video, process_transcribed_video_text, UNIFIED_VECTOR_STORE
+from chatbot import answer_query, stream_answer, chat_scope, answer_cache, process_transcribed_video_text, delete_source, list_sources, UNIFIED_VECTOR_STORE
+from knowledge_base import describe_store
+from admission import AdmittedStreamingResponse, ServerBusy
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
 class ChatRequest(BaseModel):
     query: str
     transcription: Optional[str] = None
+    # Only search the caller's own videos; the user comes from the token, never the body
+    own_videos: bool = False
+    # Optional relevance filters: one video, one kind of source. They narrow retrieval over
+    # the shared knowledge base and are not access control.
+    video_id: Optional[int] = None
+    source_type: Optional[str] = None
+
+def request_scope(request: ChatRequest, current_user: User):
+    try:
+        return chat_scope(
+            current_user.id if request.own_videos else None, request.video_id, request.source_type
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 class UploadTranscription(BaseModel):
     text: str
 
 @router.post("/")
-async def chat_api(request: ChatRequest):
+async def chat_api(request: ChatRequest, current_user: User = Depends(get_current_user)):
     print(f"\n[USER QUERY]: {request.query}")
+    scope = request_scope(request, current_user)
     # Using the existing RAG function
-    answer = get_insights_from_video(
-        request.query,
-        request.transcription
-    )
+    try:
+        answer = await answer_query(request.query, request.transcription, scope)
+    except ServerBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     print(f"[BOT ANSWER]: {answer}\n" + "-"*50)
     return answer
 
+@router.post("/stream")
+async def chat_stream(request: ChatRequest, current_user: User = Depends(get_current_user)):
+    """
+    Server-Sent Events: `sources` first, then `token` events as Gemini produces them,
+    then `done` with timings.
+    """
+    print(f"\n[USER QUERY][stream]: {request.query}")
+    scope = request_scope(request, current_user)
+    try:
+        events = await stream_answer(request.query, request.transcription, scope)
+    except ServerBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return AdmittedStreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/upload-transcription")
 async def upload_transcription(payload: UploadTranscription):
-    process_transcribed_video_text(UNIFIED_VECTOR_STORE, payload.text)
+    # Chunking, embedding and the commit run off the event loop
+    await run_in_threadpool(process_transcribed_video_text, UNIFIED_VECTOR_STORE, payload.text)
     return {"message": "Transcription added to knowledge base!"}
 
 @router.get("/kb-status")
 async def kb_status():
-    if not os.path.exists(UNIFIED_VECTOR_STORE):
-        return {"exists": False, "total_chunks": 0}
-
     try:
-        from langchain_community.vectorstores import FAISS
-        from langchain_huggingface import HuggingFaceEmbeddings
-
-        embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-        vector_store = FAISS.load_local(
-            UNIFIED_VECTOR_STORE,
-            embeddings,
-            allow_dangerous_deserialization=True
-        )
-
-        return {
-            "exists": True,
-            "total_chunks": vector_store.index.ntotal
-        }
+        # Answered from the segment manifest; no index or model is loaded.
+        return dict(describe_store(UNIFIED_VECTOR_STORE), answer_cache=answer_cache.stats())
     except Exception as e:
         return {"exists": False, "error": str(e)}
+
+def video_source_owned(db: Session, source_id: str, current_user: User) -> bool:
+    # "video:<id>" sources belong to the owner of the video
+    video_id = source_id.split(":", 1)[1]
+    if not video_id.isdigit():
+        return False
+    return db.query(Video.id).filter(Video.id == int(video_id), Video.user_id == current_user.id).first() is not None
+
+@router.get("/kb-sources")
+def kb_sources(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """
+    Chunk count per source: the caller's videos and the shared (non-video) sources.
+    """
+    own = {f"video:{video_id}" for (video_id,) in db.query(Video.id).filter(Video.user_id == current_user.id)}
+    return {"sources": {
+        source_id: count for source_id, count in list_sources().items()
+        if not source_id.startswith("video:") or source_id in own
+    }}
+
+@router.delete("/kb-sources/{source_id}")
+def kb_delete_source(source_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    if not source_id.startswith("video:"):
+        raise HTTPException(status_code=403, detail="Only the sources of your own videos can be deleted")
+    if not video_source_owned(db, source_id, current_user):
+        raise HTTPException(status_code=404, detail="Source not found")
+    result = delete_source(source_id)
+    if not result["deleted"]:
+        raise HTTPException(status_code=404, detail="Source not found")
+    return {"source_id": source_id, "deleted_chunks": result["deleted"]}
@@ -1,49 +1,63 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
 from sqlalchemy.orm import Session
 from typing import List
-import os
-import shutil
-from datetime import datetime
+from starlette.concurrency import run_in_threadpool
 
 from app.db.database import get_db
 from app.models.user import User
-from app.models.video import Video, VideoTranscribe
-from app.schemas.video import Video as VideoSchema, VideoCreate, Transcription as TranscriptionSchema, TranscriptionResponse
+from app.models.video import Video, VideoTranscribe, TranscriptionJob
+from app.schemas.video import Video as VideoSchema, VideoCreate, Transcription as TranscriptionSchema, TranscriptionResponse, TranscriptionJob as TranscriptionJobSchema
 from app.dependencies import get_current_user
-from app.services.video_processing import extract_audio_from_video, google_transcribe, assembly_transcribe
-from chatbot import process_transcribed_video_text, UNIFIED_VECTOR_STORE
+from app.services.video_processing import TRANSCRIPTION_ENGINES
+from app.services.transcription_jobs import enqueue_transcription
+from uploads import store_upload, MAX_VIDEO_BYTES
 
 router = APIRouter(prefix="/videos", tags=["Videos"])
 
 @router.post("/upload", response_model=VideoSchema)
-def upload_video(
+async def upload_video(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    upload_dir = "uploaded_videos"
-    os.makedirs(upload_dir, exist_ok=True)
-    file_path = f"{upload_dir}/{file.filename}"
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    new_video = Video(
-        user_id=current_user.id,
-        video_name=file.filename,
-        video_path=file_path
-    )
-    db.add(new_video)
-    db.commit()
-    db.refresh(new_video)
-    return new_video
+    """
+    Stream the video to content-addressed storage. Re-uploading identical bytes returns
+    the existing Video record.
+    """
+    stored = await store_upload(file, "uploaded_videos", MAX_VIDEO_BYTES)
 
-@router.post("/{video_id}/transcribe", response_model=TranscriptionResponse)
+    def register_video():
+        existing = db.query(Video).filter(
+            Video.content_hash == stored.sha256,
+            Video.user_id == current_user.id
+        ).first()
+        if existing:
+            return existing
+
+        new_video = Video(
+            user_id=current_user.id,
+            video_name=file.filename,
+            video_path=stored.path,
+            content_hash=stored.sha256
+        )
+        db.add(new_video)
+        db.commit()
+        db.refresh(new_video)
+        return new_video
+
+    return await run_in_threadpool(register_video)
+
+@router.post("/{video_id}/transcribe", response_model=TranscriptionJobSchema, status_code=status.HTTP_202_ACCEPTED)
 def transcribe_video(
     video_id: int,
+    engine: str = "google",
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
+    """
+    Queue the video for transcription and return the job immediately.
+    Poll GET /videos/jobs/{job_id} for status, progress and per-stage timings.
+    """
     video = db.query(Video).filter(Video.id == video_id).first()
     if not video:
         raise HTTPException(status_code=404, detail="Video not found")
@@ -51,63 +65,30 @@ def transcribe_video(
     if video.user_id != current_user.id:
          raise HTTPException(status_code=403, detail="Not authorized to transcribe this video")
 
-    # Extract Audio
-    try:
-        audio_path = extract_audio_from_video(video.video_path)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Audio extraction failed: {str(e)}")
+    engine = engine.lower()
+    if engine not in TRANSCRIPTION_ENGINES:
+        raise HTTPException(status_code=400, detail=f"Unknown engine '{engine}'. Use one of: {', '.join(TRANSCRIPTION_ENGINES)}")
 
-    # Transcribe (Default to Google for now, or add query param? User code had engine selection logic in upload)
-    # But here we are just triggering transcription. Let's use Google by default or AssemblyAI if key exists.
-    # The user provided functions `google_transcribe` and `assembly_transcribe`.
-    # Let's try Google first as per their previous code preference unless engine is specified.
-    # Actually, I'll use google_transcribe for simplicity as requested, or maybe catch error.
-    
-    # Transcribe with Timestamps
-    from app.services.video_processing import transcribe_video_chunks
-    
-    # Get chunks with timestamps
-    import traceback
-    try:
-        chunks = transcribe_video_chunks(video.video_path)
-    except Exception as e:
-        print(f"Transcription Error: {e}")
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Transcription process failed: {str(e)}")
-    
-    if not chunks:
-        raise HTTPException(status_code=400, detail="Could not extract any audio/text from the video. Please check if the video has audio.")
+    return enqueue_transcription(db, video, current_user.id, engine)
 
-    # Process for RAG (indexes metadata)
-    process_transcribed_video_text(UNIFIED_VECTOR_STORE, chunks)
-    
-    # Flatten text for database storage
-    full_text = "\n".join([c['text'] for c in chunks])
-    
-    # Check if transcription exists for this video
-    existing_transcription = db.query(VideoTranscribe).filter(VideoTranscribe.video_id == video_id).first()
-    
-    if existing_transcription:
-        # Update existing record
-        existing_transcription.transcription_text = full_text
-        existing_transcription.chunks = chunks
-        existing_transcription.transcribed_at = datetime.utcnow()
-        db.commit()
-        db.refresh(existing_transcription)
-        transcription_record = existing_transcription
-    else:
-        # Create new record
-        new_transcription = VideoTranscribe(
-            video_id=video_id,
-            user_id=current_user.id,
-            transcription_text=full_text,
-            chunks=chunks
-        )
-        db.add(new_transcription)
-        db.commit()
-        db.refresh(new_transcription)
-        transcription_record = new_transcription
-    
-    # Create response object manually to include chunks
-    response_data = TranscriptionResponse.from_orm(transcription_record)
-    return response_data
+@router.get("/jobs/{job_id}", response_model=TranscriptionJobSchema)
+def get_transcription_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    job = db.query(TranscriptionJob).filter(TranscriptionJob.id == job_id).first()
+    if not job or job.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/{video_id}/transcription", response_model=TranscriptionResponse)
+def get_transcription(
+    video_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    transcription = db.query(VideoTranscribe).filter(VideoTranscribe.video_id == video_id).first()
+    if not transcription or transcription.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Transcription not found")
+    return TranscriptionResponse.from_orm(transcription)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, Dict
 from datetime import datetime
 
 class VideoBase(BaseModel):
@@ -34,3 +34,20 @@ class Transcription(TranscriptionBase):
 
 class TranscriptionResponse(Transcription):
     chunks: list = []
+
+class TranscriptionJob(BaseModel):
+    id: int
+    video_id: int
+    engine: str
+    status: str
+    stage: Optional[str] = None
+    progress: float = 0.0
+    stage_timings: Optional[Dict[str, float]] = None
+    error: Optional[str] = None
+    transcription_id: Optional[int] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,131 @@
+import os
+import numpy as np
+
+# Energy-based voice activity detection over 16-bit mono PCM.
+# Frames whose RMS is above the threshold are speech; speech regions are closed after
+# VAD_MIN_SILENCE_MS of silence and dropped if shorter than VAD_MIN_SPEECH_MS.
+# Utterances separated by more than VAD_MAX_GAP_MS of silence are never merged into one segment.
+VAD_FRAME_MS = int(os.getenv("VAD_FRAME_MS", "30"))
+VAD_MIN_RMS = float(os.getenv("VAD_MIN_RMS", "300"))
+VAD_NOISE_FACTOR = float(os.getenv("VAD_NOISE_FACTOR", "3.0"))
+VAD_MIN_SPEECH_MS = int(os.getenv("VAD_MIN_SPEECH_MS", "250"))
+VAD_MIN_SILENCE_MS = int(os.getenv("VAD_MIN_SILENCE_MS", "500"))
+VAD_PADDING_MS = int(os.getenv("VAD_PADDING_MS", "200"))
+VAD_MAX_GAP_MS = int(os.getenv("VAD_MAX_GAP_MS", "1500"))
+
+# Frames processed per block, to keep the float copy of a long recording small
+_BLOCK_FRAMES = 4096
+
+
+def frame_energy(samples: np.ndarray, frame_length: int) -> np.ndarray:
+    """
+    RMS of each full frame of `samples` (int16), computed block by block.
+    """
+    frames = len(samples) // frame_length
+    rms = np.empty(frames, dtype=np.float32)
+    for first in range(0, frames, _BLOCK_FRAMES):
+        last = min(first + _BLOCK_FRAMES, frames)
+        block = samples[first * frame_length:last * frame_length].astype(np.float32)
+        block = block.reshape(last - first, frame_length)
+        rms[first:last] = np.sqrt(np.mean(block * block, axis=1))
+    return rms
+
+
+def speech_regions(rms: np.ndarray, frame_seconds: float):
+    """
+    Return speech regions as (first_frame, end_frame) pairs.
+    """
+    if len(rms) == 0:
+        return []
+
+    noise_floor = float(np.percentile(rms, 10))
+    threshold = max(VAD_MIN_RMS, noise_floor * VAD_NOISE_FACTOR)
+    voiced = rms > threshold
+
+    min_speech = max(1, int(VAD_MIN_SPEECH_MS / 1000 / frame_seconds))
+    min_silence = max(1, int(VAD_MIN_SILENCE_MS / 1000 / frame_seconds))
+
+    regions = []
+    start = None
+    silence = 0
+    for i, is_voiced in enumerate(voiced):
+        if is_voiced:
+            if start is None:
+                start = i
+            silence = 0
+        elif start is not None:
+            silence += 1
+            if silence >= min_silence:
+                end = i - silence + 1
+                if end - start >= min_speech:
+                    regions.append((start, end))
+                start = None
+                silence = 0
+    if start is not None:
+        end = len(voiced) - silence
+        if end - start >= min_speech:
+            regions.append((start, end))
+    return regions
+
+
+def _split_long(start: int, end: int, rms: np.ndarray, max_frames: int):
+    """
+    Split a region longer than `max_frames` at its quietest frames.
+    """
+    pieces = []
+    while end - start > max_frames:
+        # Cut in the second half of the allowed window so pieces don't get tiny
+        window = rms[start + max_frames // 2:start + max_frames]
+        cut = start + max_frames // 2 + int(np.argmin(window))
+        pieces.append((start, cut))
+        start = cut
+    pieces.append((start, end))
+    return pieces
+
+
+def segment_speech(samples: np.ndarray, sample_rate: int, max_duration: float):
+    """
+    Silence-aware segmentation of a recording.
+    Silent stretches are dropped, consecutive utterances are merged while the segment stays
+    within `max_duration` seconds and they are at most VAD_MAX_GAP_MS apart, and cuts only
+    happen in pauses (or at the quietest point of an utterance that is longer than
+    `max_duration` on its own).
+    Returns [(start_seconds, end_seconds), ...].
+    """
+    frame_length = int(sample_rate * VAD_FRAME_MS / 1000)
+    frame_seconds = frame_length / sample_rate
+    rms = frame_energy(samples, frame_length)
+
+    padding = int(VAD_PADDING_MS / 1000 / frame_seconds)
+    max_frames = max(1, int(max_duration / frame_seconds))
+    max_gap = int(VAD_MAX_GAP_MS / 1000 / frame_seconds)
+
+    segments = []
+    current = None
+    previous_end = None
+    for start, end in speech_regions(rms, frame_seconds):
+        # Measured between the utterances themselves, before padding
+        long_pause = previous_end is not None and start - previous_end > max_gap
+        previous_end = end
+        start = max(0, start - padding)
+        end = min(len(rms), end + padding)
+        if current is not None and start <= current[1]:
+            start = current[1]
+
+        if current is not None and not long_pause and end - current[0] <= max_frames:
+            current = (current[0], end)
+            continue
+        if current is not None:
+            segments.append(current)
+
+        pieces = _split_long(start, end, rms, max_frames)
+        segments.extend(pieces[:-1])
+        current = pieces[-1]
+    if current is not None:
+        segments.append(current)
+
+    return [
+        (round(start * frame_seconds, 2), round(end * frame_seconds, 2))
+        for start, end in segments
+        if end > start
+    ]
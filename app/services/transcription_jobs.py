@@ -0,0 +1,234 @@
+import os
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.db.database import SessionLocal
+from app.models.video import Video, VideoTranscribe, TranscriptionJob
+from app.services.video_processing import decode_audio, transcribe_video_chunks
+from chatbot import process_transcribed_video_text, UNIFIED_VECTOR_STORE
+from metrics import Gauge
+from profiling import profiled
+
+# Transcription jobs run on their own pool, sized independently of the HTTP workers.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# A "running" job whose heartbeat is older than this is assumed orphaned by a dead process
+# and is queued again on startup.
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "600"))
+PROGRESS_INTERVAL_SECONDS = 2.0
+
+ACTIVE_STATUSES = ("queued", "running")
+
+_job_pool = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="transcription-job")
+jobs_pending = Gauge("transcription_jobs_pending", "Transcription jobs queued or running in this process.")
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+class JobReporter:
+    """
+    Writes stage, progress and per-stage timings to the job row.
+    Only used from the job's own thread, which owns the session.
+    """
+
+    def __init__(self, db: Session, job: TranscriptionJob):
+        self.db = db
+        self.job = job
+        self._last_flush = 0.0
+
+    def _flush(self):
+        self.job.heartbeat_at = _now()
+        self.db.commit()
+        self._last_flush = time.monotonic()
+
+    @contextmanager
+    def stage(self, name: str):
+        self.job.stage = name
+        self._flush()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            # Reassign so SQLAlchemy notices the JSON change
+            self.job.stage_timings = dict(
+                self.job.stage_timings or {},
+                **{name: round(time.perf_counter() - start, 3)}
+            )
+            self._flush()
+
+    def progress(self, done: int, total: int):
+        self.job.progress = round(done / total, 3) if total else 1.0
+        if done == total or time.monotonic() - self._last_flush >= PROGRESS_INTERVAL_SECONDS:
+            self._flush()
+
+
+def transcribe_and_index(db: Session, video: Video, user_id: int, engine: str,
+                         reporter: JobReporter) -> VideoTranscribe:
+    """
+    The full pipeline for one video: decode audio, transcribe, index for RAG and store the
+    transcription. Returns the VideoTranscribe record. A transcript with failed segments
+    fails the job before indexing, so an earlier complete transcript stays in place.
+    """
+    with reporter.stage("decode"):
+        audio = decode_audio(video.video_path)
+
+    with reporter.stage("transcribe"):
+        if audio is None:
+            chunks = []
+        else:
+            try:
+                chunks = transcribe_video_chunks(
+                    video.video_path, engine=engine, audio=audio, on_progress=reporter.progress
+                )
+            finally:
+                audio.close()
+
+    if not chunks:
+        raise ValueError("Could not extract any audio/text from the video. Please check if the video has audio.")
+
+    # Process for RAG (indexes metadata); replaces the chunks of any earlier transcription
+    with reporter.stage("index"):
+        process_transcribed_video_text(
+            UNIFIED_VECTOR_STORE, chunks, source_id=f"video:{video.id}",
+            metadata={"user_id": user_id, "video_id": video.id}
+        )
+
+    with reporter.stage("save"):
+        # Flatten text for database storage
+        full_text = "\n".join([c['text'] for c in chunks])
+
+        transcription = db.query(VideoTranscribe).filter(VideoTranscribe.video_id == video.id).first()
+        if transcription:
+            transcription.transcription_text = full_text
+            transcription.chunks = chunks
+            transcription.transcribed_at = _now()
+        else:
+            transcription = VideoTranscribe(
+                video_id=video.id,
+                user_id=user_id,
+                transcription_text=full_text,
+                chunks=chunks
+            )
+            db.add(transcription)
+        db.commit()
+        db.refresh(transcription)
+
+    return transcription
+
+
+def enqueue_transcription(db: Session, video: Video, user_id: int, engine: str) -> TranscriptionJob:
+    """
+    Create a transcription job and hand it to the worker pool. If the video already has an
+    active job, that job is returned instead.
+    """
+    active_job = TranscriptionJob.status.in_(ACTIVE_STATUSES)
+    while True:
+        # The partial unique index on active jobs turns concurrent requests into one insert
+        job_id = db.execute(
+            insert(TranscriptionJob)
+            .values(
+                video_id=video.id,
+                user_id=user_id,
+                engine=engine,
+                status="queued",
+                stage="queued",
+                progress=0.0,
+                stage_timings={}
+            )
+            .on_conflict_do_nothing(index_elements=["video_id"], index_where=active_job)
+            .returning(TranscriptionJob.id)
+        ).scalar()
+        db.commit()
+        if job_id is not None:
+            break
+
+        active = db.query(TranscriptionJob).filter(
+            TranscriptionJob.video_id == video.id, active_job
+        ).first()
+        if active:
+            return active
+        # The active job finished in between; try again
+
+    _submit(job_id)
+    return db.get(TranscriptionJob, job_id)
+
+
+def _submit(job_id: int):
+    jobs_pending.inc()
+    _job_pool.submit(profiled(run_transcription_job), job_id).add_done_callback(lambda _: jobs_pending.dec())
+
+
+def _claim(db: Session, job_id: int) -> bool:
+    # Atomic queued -> running transition, so a job never runs twice
+    claimed = db.query(TranscriptionJob).filter(
+        TranscriptionJob.id == job_id,
+        TranscriptionJob.status == "queued"
+    ).update(
+        {"status": "running", "started_at": _now(), "heartbeat_at": _now()},
+        synchronize_session=False
+    )
+    db.commit()
+    return claimed == 1
+
+
+def run_transcription_job(job_id: int):
+    db = SessionLocal()
+    try:
+        if not _claim(db, job_id):
+            return
+
+        job = db.get(TranscriptionJob, job_id)
+        reporter = JobReporter(db, job)
+        try:
+            video = db.get(Video, job.video_id)
+            if video is None:
+                raise ValueError("Video not found")
+
+            transcription = transcribe_and_index(db, video, job.user_id, job.engine, reporter)
+            job.transcription_id = transcription.id
+            job.progress = 1.0
+            job.status = "succeeded"
+        except Exception as e:
+            print(f"Transcription job {job_id} failed: {e}")
+            traceback.print_exc()
+            db.rollback()
+            job.status = "failed"
+            job.error = str(e)
+
+        job.stage = None
+        job.finished_at = _now()
+        db.commit()
+    finally:
+        db.close()
+
+
+def resume_transcription_jobs():
+    """
+    Re-submit queued jobs and jobs orphaned by a dead process. Called at server start.
+    """
+    db = SessionLocal()
+    try:
+        stale_before = _now() - timedelta(seconds=JOB_STALE_SECONDS)
+        db.query(TranscriptionJob).filter(
+            TranscriptionJob.status == "running",
+            or_(TranscriptionJob.heartbeat_at == None, TranscriptionJob.heartbeat_at < stale_before)
+        ).update({"status": "queued"}, synchronize_session=False)
+        db.commit()
+
+        job_ids = [job_id for (job_id,) in db.query(TranscriptionJob.id).filter(TranscriptionJob.status == "queued")]
+    finally:
+        db.close()
+
+    for job_id in job_ids:
+        _submit(job_id)
+    if job_ids:
+        print(f"Resumed {len(job_ids)} transcription jobs")
+    return job_ids
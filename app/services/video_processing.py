@@ -1,11 +1,63 @@
+import io
+import mmap
 import os
+import random
+import subprocess
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import speech_recognition as sr
 import assemblyai as aai
 from moviepy import VideoFileClip
+from moviepy.config import FFMPEG_BINARY
 from dotenv import load_dotenv
+import numpy as np
+
+from app.services.speech_segmentation import segment_speech
+from metrics import Gauge, timed
+from profiling import profiled
 
 load_dotenv()
 
+# Segment transcription runs on a shared pool; each engine additionally has its own cap on
+# in-flight API calls so one long video cannot exhaust the speech API quota.
+TRANSCRIBE_WORKERS = int(os.getenv("TRANSCRIBE_WORKERS", "8"))
+ENGINE_CONCURRENCY = {
+    "google": int(os.getenv("GOOGLE_STT_CONCURRENCY", "4")),
+    "assemblyai": int(os.getenv("ASSEMBLYAI_CONCURRENCY", "2")),
+}
+# Longest segment each engine is sent; the silence-aware segmenter merges utterances up to it.
+ENGINE_MAX_SECONDS = {
+    "google": float(os.getenv("GOOGLE_STT_MAX_SECONDS", "55")),
+    "assemblyai": float(os.getenv("ASSEMBLYAI_MAX_SECONDS", "120")),
+}
+# "vad" cuts at pauses and skips silence; "fixed" uses plain chunk_duration windows.
+TRANSCRIBE_SEGMENTATION = os.getenv("TRANSCRIBE_SEGMENTATION", "vad")
+TRANSCRIBE_RETRIES = int(os.getenv("TRANSCRIBE_RETRIES", "3"))
+TRANSCRIBE_BACKOFF_SECONDS = float(os.getenv("TRANSCRIBE_BACKOFF_SECONDS", "1.0"))
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2  # 16-bit mono PCM
+
+_transcribe_pool = ThreadPoolExecutor(max_workers=TRANSCRIBE_WORKERS, thread_name_prefix="transcribe")
+_engine_slots = {engine: threading.BoundedSemaphore(limit) for engine, limit in ENGINE_CONCURRENCY.items()}
+
+segments_pending = Gauge("transcription_segments_pending", "Audio segments queued or being transcribed.")
+
+
+class TransientTranscriptionError(Exception):
+    """
+    A segment failed in a way worth retrying (network error, quota, 5xx).
+    """
+
+
+class IncompleteTranscriptionError(Exception):
+    """
+    Some segments still failed after their retries; the transcript would have gaps.
+    """
+
+
 def extract_audio_from_video(video_path: str) -> str:
     """
     Extract WAV audio from MP4, MOV, AVI etc.
@@ -15,16 +67,17 @@ def extract_audio_from_video(video_path: str) -> str:
     audio_path = f"{base}.wav"
 
     # Load video and export audio
-    clip = VideoFileClip(video_path)
-    # Using pcm_s16le codec for compatibility with speech recognition
-    clip.audio.write_audiofile(
-        audio_path,
-        fps=16000,
-        nbytes=2,
-        codec="pcm_s16le",
-        logger=None # Suppress moviepy logging
-    )
-    clip.close()
+    with timed("audio_extract", 1):
+        clip = VideoFileClip(video_path)
+        # Using pcm_s16le codec for compatibility with speech recognition
+        clip.audio.write_audiofile(
+            audio_path,
+            fps=16000,
+            nbytes=2,
+            codec="pcm_s16le",
+            logger=None # Suppress moviepy logging
+        )
+        clip.close()
 
     return audio_path
 
@@ -62,56 +115,212 @@ def assembly_transcribe(audio_path: str) -> str:
     except Exception as e:
         return f"[AssemblyAI Exception] {e}"
 
-def transcribe_video_chunks(video_path: str, chunk_duration: int = 30):
+class PcmAudio:
     """
-    Split video into chunks and transcribe each to get timestamps.
-    Returns: List[Dict] -> [{"text": "...", "start": 0, "end": 30}, ...]
-    """
-    results = []
-    # Removed blanket try-except to debug 500 error
-    clip = VideoFileClip(video_path)
-    duration = clip.duration
-    
-    for start in range(0, int(duration), chunk_duration):
-        end = min(start + chunk_duration, duration)
-        
-        # Create a temporary chunk audio file
-        # Use absolute path for temp file to avoid CWD issues
-        chunk_audio_path = os.path.abspath(f"temp_chunk_{start}_{end}.wav")
-        
-        # Extract audio for this chunk
-        subclip = clip.subclipped(start, end)
-        
-        # Check if audio exists
-        if subclip.audio is None:
-            print(f"No audio found in chunk {start}-{end}")
-            continue
-            
-        subclip.audio.write_audiofile(
-            chunk_audio_path,
-            fps=16000,
-            nbytes=2,
-            codec="pcm_s16le",
-            logger=None
-        )
-        
-        # Transcribe
+    A video's audio track decoded once to 16 kHz mono 16-bit PCM and memory-mapped.
+    `segment()` hands out zero-copy slices wrapped as `sr.AudioData`.
+    """
+
+    def __init__(self, pcm_path: str, sample_rate: int = SAMPLE_RATE):
+        self.path = pcm_path
+        self.sample_rate = sample_rate
+        self._file = open(pcm_path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        # mmap cannot map an empty file
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self._view = memoryview(self._map) if self._map is not None else memoryview(b"")
+
+    @property
+    def duration(self) -> float:
+        return len(self._view) / (self.sample_rate * SAMPLE_WIDTH)
+
+    def samples(self) -> np.ndarray:
+        """
+        The whole recording as an int16 array sharing the mapped memory.
+        """
+        return np.frombuffer(self._view, dtype=np.int16)
+
+    def segment(self, start: float, end: float) -> sr.AudioData:
+        first = int(start * self.sample_rate) * SAMPLE_WIDTH
+        last = min(int(end * self.sample_rate) * SAMPLE_WIDTH, len(self._view))
+        return sr.AudioData(self._view[first:last], self.sample_rate, SAMPLE_WIDTH)
+
+    def close(self):
+        self._view.release()
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # A segment slice is still referenced; the map is freed with it.
+                pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def decode_audio(video_path: str, sample_rate: int = SAMPLE_RATE):
+    """
+    Decode the audio track of `video_path` once into a raw PCM cache next to the video
+    (`<video>.16k.pcm`) and return it as a memory-mapped `PcmAudio`.
+    The cache is reused until the video changes. Returns None if the video has no audio.
+    """
+    base, _ = os.path.splitext(video_path)
+    pcm_path = f"{base}.{sample_rate // 1000}k.pcm"
+
+    if not (os.path.exists(pcm_path) and os.path.getmtime(pcm_path) >= os.path.getmtime(video_path)):
+        # Decode to a unique temp name so concurrent requests for the same video don't collide
+        tmp_path = f"{pcm_path}.{uuid.uuid4().hex}.tmp"
+        with timed("audio_extract", 1):
+            process = subprocess.run(
+                [
+                    FFMPEG_BINARY, "-v", "error", "-y", "-i", video_path,
+                    "-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", tmp_path
+                ],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE
+            )
+        if process.returncode != 0:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            error = process.stderr.decode(errors="replace").strip()
+            if "does not contain any stream" in error or "matches no streams" in error:
+                return None
+            raise RuntimeError(f"ffmpeg audio decode failed: {error}")
+        os.replace(tmp_path, pcm_path)
+
+    return PcmAudio(pcm_path, sample_rate)
+
+
+def _google_segment(audio: sr.AudioData) -> str:
+    recognizer = sr.Recognizer()
+    try:
+        return recognizer.recognize_google(audio, language="en-IN")
+    except sr.UnknownValueError:
+        # No intelligible speech in this segment
+        return ""
+    except sr.RequestError as e:
+        raise TransientTranscriptionError(str(e)) from e
+
+
+def _assembly_segment(audio: sr.AudioData) -> str:
+    if not os.getenv("ASSEMBLYAI_KEY"):
+        raise RuntimeError("AssemblyAI API Key not found.")
+
+    aai.settings.api_key = os.getenv("ASSEMBLYAI_KEY")
+    try:
+        transcript = aai.Transcriber().transcribe(io.BytesIO(audio.get_wav_data()))
+    except Exception as e:
+        raise TransientTranscriptionError(str(e)) from e
+    if transcript.status == aai.TranscriptStatus.error:
+        raise TransientTranscriptionError(transcript.error)
+    return transcript.text or ""
+
+
+_SEGMENT_ENGINES = {
+    "google": _google_segment,
+    "assemblyai": _assembly_segment,
+}
+TRANSCRIPTION_ENGINES = tuple(_SEGMENT_ENGINES)
+
+
+def transcribe_segment(audio: sr.AudioData, engine: str = "google") -> str:
+    """
+    Transcribe one in-memory audio segment, retrying transient failures with exponential
+    backoff. The engine slot is only held during the API call, not while backing off.
+    """
+    recognize = _SEGMENT_ENGINES[engine]
+    for attempt in range(TRANSCRIBE_RETRIES + 1):
         try:
-            text = google_transcribe(chunk_audio_path)
-        except Exception as e:
-            text = f"[Transcription Failed: {str(e)}]"
-            print(f"Chunk {start} transcription failed: {e}")
-
-        if text and not text.startswith("[Google Speech Error]"):
-            results.append({
-                "text": text,
-                "start": start,
-                "end": end
-            })
-        
-        # Cleanup temp file
-        if os.path.exists(chunk_audio_path):
-            os.remove(chunk_audio_path)
-            
-    clip.close()
-    return results
+            with _engine_slots[engine], timed("transcribe_segment", 1):
+                return recognize(audio)
+        except TransientTranscriptionError as e:
+            if attempt == TRANSCRIBE_RETRIES:
+                raise
+            delay = TRANSCRIBE_BACKOFF_SECONDS * (2 ** attempt) * (0.5 + random.random())
+            print(f"Segment transcription failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def speech_windows(audio: PcmAudio, engine: str = "google", chunk_duration: int = 30,
+                   segmentation: str = TRANSCRIBE_SEGMENTATION):
+    """
+    (start, end) windows of `audio` to send to the speech engine.
+    """
+    if segmentation == "fixed":
+        duration = audio.duration
+        return [
+            (start, min(start + chunk_duration, duration))
+            for start in range(0, int(duration), chunk_duration)
+        ]
+    return segment_speech(audio.samples(), audio.sample_rate, ENGINE_MAX_SECONDS[engine])
+
+
+def transcribe_video_chunks(video_path: str, chunk_duration: int = 30, engine: str = "google",
+                            audio: PcmAudio = None, segmentation: str = TRANSCRIBE_SEGMENTATION,
+                            on_progress=None):
+    """
+    Split video into chunks and transcribe each to get timestamps.
+    The audio track is decoded once (or taken from `audio`) and every window is a zero-copy
+    slice of it; windows are transcribed concurrently. By default windows follow the pauses
+    in speech and silent stretches are never sent; segmentation="fixed" restores plain
+    `chunk_duration` windows.
+    on_progress(done, total) is called on the calling thread as segments complete.
+    Raises IncompleteTranscriptionError, once every segment is done, if any of them failed.
+    Returns: List[Dict] -> [{"text": "...", "start": 0.0, "end": 28.4}, ...] in timestamp order
+    """
+    if engine not in _SEGMENT_ENGINES:
+        raise ValueError(f"Unknown transcription engine: {engine}")
+
+    owns_audio = audio is None
+    if owns_audio:
+        audio = decode_audio(video_path)
+    if audio is None:
+        print(f"No audio found in {video_path}")
+        return []
+
+    try:
+        windows = speech_windows(audio, engine, chunk_duration, segmentation)
+        speech = sum(end - start for start, end in windows)
+        print(f"[Transcribe] {len(windows)} segments, {speech:.0f}s of {audio.duration:.0f}s audio")
+
+        pending = []
+        for start, end in windows:
+            segments_pending.inc()
+            future = _transcribe_pool.submit(profiled(transcribe_segment), audio.segment(start, end), engine)
+            future.add_done_callback(lambda _: segments_pending.dec())
+            pending.append((start, end, future))
+
+        texts = {}
+        failed = []
+        for done, future in enumerate(as_completed([f for _, _, f in pending]), start=1):
+            try:
+                texts[future] = future.result()
+            except Exception as e:
+                print(f"Segment transcription failed: {e}")
+                failed.append(e)
+            if on_progress:
+                on_progress(done, len(pending))
+        if failed:
+            raise IncompleteTranscriptionError(
+                f"{len(failed)} of {len(pending)} segments failed to transcribe: {failed[0]}"
+            )
+
+        results = []
+        for start, end, future in pending:
+            text = texts.get(future)
+            if text:
+                results.append({
+                    "text": text,
+                    "start": start,
+                    "end": end
+                })
+        # Drop the segment slices so the map can be closed right away
+        pending = None
+        return results
+    finally:
+        if owns_audio:
+            audio.close()
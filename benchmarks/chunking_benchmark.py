@@ -0,0 +1,126 @@
+"""
+Chunking / retrieval-cost benchmark.
+
+Indexes a PDF with each chunking configuration into a throwaway in-memory FAISS store and
+runs the fixed question set in benchmarks/questions.json against it. For every
+configuration it reports the chunk count, prompt tokens per question, the top-k hit rate
+(the expected passage is among the retrieved chunks) and, with --llm, Gemini latency and
+billed input tokens.
+
+    python -m benchmarks.chunking_benchmark --tokens 128 256 512 --llm --json bench.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+import statistics
+import time
+
+from langchain_community.vectorstores import FAISS
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from chatbot import embeddings, get_llm, prompt, build_context, extract_pages_from_pdf, RETRIEVAL_K
+from chunking import ChunkProfile, chunk_pdf_pages, count_tokens
+
+QUESTIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "questions.json")
+DEFAULT_PDF = "documents/Ebizframe Administration User manual.pdf"
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def _legacy_chunks(pages):
+    # The previous fixed-size character splitter, kept as the baseline.
+    splitter = RecursiveCharacterTextSplitter(chunk_size=80000, chunk_overlap=1000)
+    return splitter.split_text("".join(pages)), None
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def run_config(name, texts, metadatas, questions, k, use_llm):
+    start = time.perf_counter()
+    store = FAISS.from_texts(texts, embeddings, metadatas=metadatas)
+    index_seconds = time.perf_counter() - start
+
+    hits = 0
+    prompt_tokens = []
+    billed_tokens = []
+    llm_latency = []
+    for item in questions:
+        docs = store.similarity_search(item["question"], k=k)
+        if any(_normalize(item["expect"]) in _normalize(doc.page_content) for doc in docs):
+            hits += 1
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            context_text, _ = build_context(docs)
+        rendered = prompt.format(context=context_text, question=item["question"])
+        prompt_tokens.append(count_tokens(rendered))
+
+        if use_llm:
+            start = time.perf_counter()
+            response = (prompt | get_llm()).invoke({"context": context_text, "question": item["question"]})
+            llm_latency.append(time.perf_counter() - start)
+            usage = getattr(response, "usage_metadata", None) or {}
+            if usage.get("input_tokens"):
+                billed_tokens.append(usage["input_tokens"])
+
+    result = {
+        "config": name,
+        "chunks": len(texts),
+        "max_chunk_tokens": max(count_tokens(t) for t in texts),
+        "index_seconds": round(index_seconds, 3),
+        "hit_rate": round(hits / len(questions), 3),
+        "prompt_tokens_mean": round(statistics.mean(prompt_tokens), 1),
+        "prompt_tokens_max": max(prompt_tokens),
+    }
+    if billed_tokens:
+        result["billed_input_tokens_mean"] = round(statistics.mean(billed_tokens), 1)
+    if llm_latency:
+        result["llm_latency_p50"] = round(_percentile(llm_latency, 0.5), 3)
+        result["llm_latency_p95"] = round(_percentile(llm_latency, 0.95), 3)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default=DEFAULT_PDF)
+    parser.add_argument("--questions", default=QUESTIONS_PATH)
+    parser.add_argument("--tokens", type=int, nargs="+", default=[128, 256, 512],
+                        help="chunk sizes (tokens) to compare against the legacy splitter")
+    parser.add_argument("-k", type=int, default=RETRIEVAL_K)
+    parser.add_argument("--llm", action="store_true", help="also call Gemini and time it")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    with open(args.questions, "r", encoding="utf-8") as f:
+        questions = json.load(f)
+    pages = extract_pages_from_pdf(args.pdf)
+
+    configs = [("legacy-80000chars",) + _legacy_chunks(pages)]
+    for tokens in args.tokens:
+        profile = ChunkProfile(max_tokens=tokens, overlap_tokens=tokens // 8)
+        configs.append((f"pdf-{tokens}tok",) + chunk_pdf_pages(pages, profile))
+
+    results = [
+        run_config(name, texts, metadatas, questions, args.k, args.llm)
+        for name, texts, metadatas in configs
+    ]
+
+    columns = list(dict.fromkeys(key for result in results for key in result))
+    print("\t".join(columns))
+    for result in results:
+        print("\t".join(str(result.get(column, "")) for column in columns))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"pdf": args.pdf, "k": args.k, "questions": len(questions), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Embedding backend benchmark: ingestion throughput and query latency of each backend on the
+same corpus.
+
+The corpus is the PDF chunked exactly as ingestion chunks it. For every backend and batch
+size it reports chunks/sec over the whole corpus, the p50/p99 latency of embedding a single
+query (the chat path), and the mean cosine similarity to the huggingface vectors, which
+shows what int8 quantization costs in accuracy. ONNX backends are also run without
+length-sorted batching to show the padding it saves.
+
+    python -m benchmarks.embedding_benchmark --backends huggingface onnx-int8 --threads 4
+    python -m benchmarks.embedding_benchmark --batch-sizes 16 32 64 --json embed_bench.json
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+from PyPDF2 import PdfReader
+
+from chunking import chunk_pdf_pages
+from embedding_backends import EMBEDDING_BACKENDS, EMBEDDING_BATCH_SIZE, EMBEDDING_THREADS, make_embeddings
+
+QUESTIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "questions.json")
+DEFAULT_PDF = "documents/Ebizframe Administration User manual.pdf"
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def load_corpus(pdf_path, limit=None):
+    pages = [page.extract_text() or "" for page in PdfReader(pdf_path).pages]
+    texts, _ = chunk_pdf_pages(pages)
+    return texts[:limit] if limit else texts
+
+
+def run_backend(name, embeddings, texts, queries, baseline=None, repeat=1):
+    # Warm-up: model load is lazy in places and the first batch pays for allocations
+    embeddings.embed_documents(texts[:8])
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+        timings.append(time.perf_counter() - start)
+    seconds = min(timings)
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        embeddings.embed_query(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    result = {
+        "backend": name,
+        "chunks": len(texts),
+        "seconds": round(seconds, 3),
+        "chunks_per_sec": round(len(texts) / seconds, 1),
+        "query_p50_ms": round(_percentile(latencies, 0.5), 2),
+        "query_p99_ms": round(_percentile(latencies, 0.99), 2),
+    }
+    if baseline is not None:
+        # Both sides are normalized, so the row-wise dot product is the cosine similarity
+        result["cosine_to_huggingface"] = round(float(np.mean((vectors * baseline).sum(axis=1))), 4)
+    return result, vectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default=DEFAULT_PDF)
+    parser.add_argument("--questions", default=QUESTIONS_PATH)
+    parser.add_argument("--backends", nargs="+", choices=EMBEDDING_BACKENDS, default=list(EMBEDDING_BACKENDS))
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[EMBEDDING_BATCH_SIZE])
+    parser.add_argument("--threads", type=int, default=EMBEDDING_THREADS, help="0 = library default")
+    parser.add_argument("--limit", type=int, help="only embed the first N chunks")
+    parser.add_argument("--repeat", type=int, default=1, help="best of N corpus passes")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    texts = load_corpus(args.pdf, args.limit)
+    with open(args.questions, "r", encoding="utf-8") as f:
+        queries = [item["question"] for item in json.load(f)]
+    print(f"Corpus: {len(texts)} chunks from {args.pdf}, {len(queries)} queries, threads={args.threads or 'default'}")
+
+    # The huggingface vectors are the reference for the accuracy column
+    backends = sorted(args.backends, key=lambda b: b != "huggingface")
+    baseline = None
+    results = []
+    for backend in backends:
+        for batch_size in args.batch_sizes:
+            variants = [(backend, {})]
+            if backend != "huggingface":
+                variants.append((f"{backend} (unsorted)", {"length_sorted": False}))
+            for name, kwargs in variants:
+                embeddings = make_embeddings(backend, batch_size=batch_size, threads=args.threads, **kwargs)
+                result, vectors = run_backend(name, embeddings, texts, queries, baseline, args.repeat)
+                if backend == "huggingface" and baseline is None:
+                    baseline = vectors
+                result["batch_size"] = batch_size
+                results.append(result)
+
+    columns = list(dict.fromkeys(key for result in results for key in result))
+    print("\t".join(columns))
+    for result in results:
+        print("\t".join(str(result.get(column, "")) for column in columns))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"pdf": args.pdf, "threads": args.threads, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
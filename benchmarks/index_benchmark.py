@@ -0,0 +1,145 @@
+"""
+Vector index benchmark: recall@k and search latency of the approximate index types against
+the exact flat baseline.
+
+By default it uses synthetic clustered 384-d vectors (the all-MiniLM-L6-v2 dimension) at
+10k, 100k and 1M vectors; --store benchmarks the vectors of an existing knowledge base
+instead. Every query is searched one at a time, as the chat endpoint does, and p50/p99
+are taken over those single searches. Building HNSW over 1M vectors takes several minutes.
+
+    python -m benchmarks.index_benchmark --sizes 10000 100000 --json index_bench.json
+    python -m benchmarks.index_benchmark --store ./faiss_vectors/knowledge_base
+"""
+import argparse
+import json
+import os
+import time
+
+import faiss
+import numpy as np
+
+from knowledge_base import load_manifest, _segment_path
+from vector_index import build_index, index_vectors
+
+DIMENSION = 384
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+EF_SEARCH_VALUES = [16, 32, 64, 128]
+NPROBE_VALUES = [4, 8, 16, 32]
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def synthetic_vectors(count, dimension, seed=0):
+    # Clustered rather than uniform noise, which is closer to how text embeddings are spread
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(16, count // 500), dimension)).astype(np.float32)
+    assignment = rng.integers(0, len(centers), count)
+    vectors = centers[assignment] + 0.35 * rng.standard_normal((count, dimension)).astype(np.float32)
+    return vectors
+
+
+def store_vectors(root):
+    blocks = []
+    for entry in load_manifest(root)["segments"]:
+        index = faiss.read_index(os.path.join(_segment_path(root, entry["name"]), "index.faiss"))
+        blocks.append(index_vectors(index))
+    return np.vstack(blocks)
+
+
+def sample_queries(vectors, count, seed=1):
+    rng = np.random.default_rng(seed)
+    picks = vectors[rng.integers(0, len(vectors), count)]
+    return (picks + 0.1 * rng.standard_normal(picks.shape)).astype(np.float32)
+
+
+def measure(index, queries, truth, k):
+    latencies = []
+    found = []
+    for query in queries:
+        start = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found.append(ids[0])
+    recall = np.mean([
+        len(set(ids) & set(expected)) / k for ids, expected in zip(found, truth)
+    ])
+    return {
+        "recall_at_k": round(float(recall), 4),
+        "p50_ms": round(_percentile(latencies, 0.5), 3),
+        "p99_ms": round(_percentile(latencies, 0.99), 3),
+    }
+
+
+def run_size(vectors, queries, k):
+    count, dimension = vectors.shape
+    results = []
+
+    start = time.perf_counter()
+    flat = build_index(vectors, dimension, "flat")
+    build_seconds = time.perf_counter() - start
+    _, truth = flat.search(queries, k)
+    results.append(dict(index="flat", params="exact", build_s=round(build_seconds, 2),
+                        **measure(flat, queries, truth, k)))
+    del flat
+
+    start = time.perf_counter()
+    hnsw = build_index(vectors, dimension, "hnsw")
+    build_seconds = time.perf_counter() - start
+    for ef_search in EF_SEARCH_VALUES:
+        hnsw.hnsw.efSearch = ef_search
+        results.append(dict(index="hnsw", params=f"efSearch={ef_search}", build_s=round(build_seconds, 2),
+                            **measure(hnsw, queries, truth, k)))
+    del hnsw
+
+    start = time.perf_counter()
+    ivf = build_index(vectors, dimension, "ivf")
+    build_seconds = time.perf_counter() - start
+    for nprobe in NPROBE_VALUES:
+        faiss.extract_index_ivf(ivf).nprobe = nprobe
+        results.append(dict(index="ivf", params=f"nlist={ivf.nlist},nprobe={nprobe}",
+                            build_s=round(build_seconds, 2), **measure(ivf, queries, truth, k)))
+    del ivf
+
+    for row in results:
+        row["vectors"] = count
+    return results
+
+
+def print_table(rows):
+    header = f"{'vectors':>9}  {'index':<6} {'params':<22} {'build_s':>8} {'recall@k':>9} {'p50_ms':>8} {'p99_ms':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        print(f"{r['vectors']:>9}  {r['index']:<6} {r['params']:<22} {r['build_s']:>8} "
+              f"{r['recall_at_k']:>9} {r['p50_ms']:>8} {r['p99_ms']:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--store", help="Benchmark the vectors of this knowledge base instead")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    rows = []
+    if args.store:
+        vectors = store_vectors(args.store)
+        rows.extend(run_size(vectors, sample_queries(vectors, args.queries), args.k))
+    else:
+        for size in args.sizes:
+            vectors = synthetic_vectors(size, DIMENSION)
+            rows.extend(run_size(vectors, sample_queries(vectors, args.queries), args.k))
+
+    print_table(rows)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
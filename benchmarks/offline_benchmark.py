@@ -0,0 +1,393 @@
+"""
+Offline benchmark suite: ingestion throughput, search latency as the index grows and /chat
+latency under concurrent load, with no network and no API keys.
+
+Gemini, the embedding model and the speech engines are replaced by the stand-ins in
+benchmarks/stand_ins.py (a real embedding backend can be used with --embeddings if its model
+is already in the local Hugging Face cache). Everything runs against a throwaway knowledge
+base in a temporary directory. The phases are:
+
+- pdf:        ingest_pdf on the manual; pages/sec, chunks/sec and the per-stage breakdown
+- transcript: a synthetic speech recording through transcribe_video_chunks (VAD segmentation
+              and the segment pool, with the stand-in engine) and then into the knowledge base
+- search:     synthetic chunks are added up to each --sizes target, and lexical, vector and
+              hybrid search p50/p99 is measured at every size
+- chat:       POST /chat through the FastAPI app (main.py, in process) at each --concurrency;
+              p50/p99 latency, throughput and the 503s from admission control
+
+The answer cache is off unless --answer-cache is given, so every request does the full work.
+Results are written as JSON together with the commit and machine; --compare prints how the
+latency and throughput figures moved against an earlier result file.
+
+    python -m benchmarks.offline_benchmark --json bench.json
+    python -m benchmarks.offline_benchmark --phases search chat --sizes 10000 100000 --concurrency 1 8 32
+    python -m benchmarks.offline_benchmark --json new.json --compare bench.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+QUESTIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "questions.json")
+DEFAULT_PDF = "documents/Ebizframe Administration User manual.pdf"
+PHASES = ("pdf", "transcript", "search", "chat")
+SAMPLE_RATE = 16000
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def _latency(prefix, latencies_ms):
+    return {
+        f"{prefix}p50_ms": round(_percentile(latencies_ms, 0.5), 2),
+        f"{prefix}p99_ms": round(_percentile(latencies_ms, 0.99), 2),
+    }
+
+
+def configure(workdir, answer_cache):
+    """
+    Point the application at `workdir`. Must run before chatbot is imported, since its
+    settings are read at import time.
+    """
+    os.environ["KNOWLEDGE_BASE_PATH"] = os.path.join(workdir, "knowledge_base")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(workdir, "embedding_cache.sqlite")
+    os.environ["PROFILE_DIR"] = os.path.join(workdir, "profiles")
+    os.environ["WARM_UP_ON_START"] = "0"
+    os.environ["HF_HUB_OFFLINE"] = "1"
+    os.environ["TRANSFORMERS_OFFLINE"] = "1"
+    if not answer_cache:
+        os.environ["ANSWER_CACHE_MAX_ENTRIES"] = "0"
+
+
+def _stage_delta(before, after):
+    delta = {}
+    for stage, totals in after.items():
+        previous = before.get(stage, {})
+        calls = totals["calls"] - previous.get("calls", 0)
+        if calls:
+            delta[stage] = {
+                "calls": calls,
+                "seconds": round(totals["seconds"] - previous.get("seconds", 0.0), 3),
+                "items": totals["items"] - previous.get("items", 0),
+            }
+    return delta
+
+
+def bench_pdf(store_path, pdf_path):
+    from chatbot import ingest_pdf
+    from metrics import stage_summary
+
+    before = stage_summary()
+    start = time.perf_counter()
+    result = ingest_pdf(store_path, pdf_path, source_id="benchmark-pdf")
+    seconds = time.perf_counter() - start
+    stages = _stage_delta(before, stage_summary())
+
+    pages = stages.get("pdf_extract", {}).get("items", 0)
+    return {
+        "pdf": pdf_path,
+        "pages": pages,
+        "chunks": result["chunks"],
+        "seconds": round(seconds, 3),
+        "pages_per_sec": round(pages / seconds, 1),
+        "chunks_per_sec": round(result["chunks"] / seconds, 1),
+        "stages": stages,
+    }
+
+
+def synthetic_speech(path, seconds, seed=0):
+    """
+    Write `seconds` of 16 kHz PCM alternating 2-12 s "utterances" (loud noise) with 0.3-1.5 s
+    pauses (quiet noise), which the VAD segmenter splits like real speech.
+    """
+    rng = np.random.default_rng(seed)
+    parts = []
+    total = 0
+    while total < seconds * SAMPLE_RATE:
+        speech = int(rng.uniform(2, 12) * SAMPLE_RATE)
+        pause = int(rng.uniform(0.3, 1.5) * SAMPLE_RATE)
+        parts.append(rng.normal(0, 3000, speech))
+        parts.append(rng.normal(0, 40, pause))
+        total += speech + pause
+    samples = np.clip(np.concatenate(parts)[:seconds * SAMPLE_RATE], -32768, 32767).astype(np.int16)
+    samples.tofile(path)
+    return path
+
+
+def bench_transcript(workdir, store_path, audio_seconds):
+    from app.services.video_processing import PcmAudio, transcribe_video_chunks
+    from chatbot import process_transcribed_video_text
+    from metrics import stage_summary
+
+    pcm_path = synthetic_speech(os.path.join(workdir, "speech.16k.pcm"), audio_seconds)
+    before = stage_summary()
+    with PcmAudio(pcm_path) as audio:
+        start = time.perf_counter()
+        segments = transcribe_video_chunks(pcm_path, audio=audio)
+        transcribe_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = process_transcribed_video_text(
+        store_path, segments, source_id="video:benchmark", metadata={"video_id": "benchmark"}
+    )
+    ingest_seconds = time.perf_counter() - start
+
+    return {
+        "audio_seconds": audio_seconds,
+        "segments": len(segments),
+        "chunks": result["chunks"],
+        "transcribe_seconds": round(transcribe_seconds, 3),
+        "audio_seconds_per_sec": round(audio_seconds / transcribe_seconds, 1),
+        "ingest_seconds": round(ingest_seconds, 3),
+        "chunks_per_sec": round(result["chunks"] / ingest_seconds, 1),
+        "stages": _stage_delta(before, stage_summary()),
+    }
+
+
+def synthetic_chunks(count, seed):
+    from benchmarks.stand_ins import WORDS
+
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(60, 200, count)
+    words = rng.integers(0, len(WORDS), int(lengths.sum()))
+    texts = []
+    position = 0
+    for length in lengths:
+        texts.append(" ".join(WORDS[i] for i in words[position:position + length]))
+        position += length
+    return texts
+
+
+def _search_latencies(search, queries, rounds):
+    latencies = []
+    for _ in range(rounds):
+        for query in queries:
+            start = time.perf_counter()
+            search(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def bench_search(store_path, sizes, questions, k, rounds, batch_size=2000):
+    from chatbot import get_ingestion_writer, get_vector_store
+    from knowledge_base import describe_store
+
+    writer = get_ingestion_writer(store_path)
+    store = get_vector_store(store_path)
+    queries = [item["question"] for item in questions]
+    vectors = dict(zip(queries, store.embeddings.embed_documents(queries)))
+
+    added = 0
+    results = []
+    for size in sorted(sizes):
+        start = time.perf_counter()
+        while added < size:
+            count = min(batch_size, size - added)
+            writer.add_texts(
+                synthetic_chunks(count, seed=added),
+                [{"source_type": "pdf"} for _ in range(count)],
+                source_id=f"benchmark-synthetic:{added}"
+            )
+            added += count
+        grow_seconds = time.perf_counter() - start
+
+        status = describe_store(store_path)
+        result = {
+            "target_chunks": size,
+            "total_chunks": status["total_chunks"],
+            "segments": status["segments"],
+            "grow_seconds": round(grow_seconds, 3),
+        }
+        result.update(_latency("lexical_", _search_latencies(
+            lambda q: store.lexical_search(q, k=k), queries, rounds)))
+        result.update(_latency("vector_", _search_latencies(
+            lambda q: store.similarity_search_by_vector(vectors[q], k=k), queries, rounds)))
+        result.update(_latency("hybrid_", _search_latencies(
+            lambda q: store.hybrid_search(q, vectors[q], k=k), queries, rounds)))
+        results.append(result)
+        print(f"  {result}")
+    return results
+
+
+async def _chat_load(client, questions, concurrency, requests):
+    latencies = []
+    statuses = {}
+    next_request = iter(range(requests))
+
+    async def worker():
+        for i in next_request:
+            start = time.perf_counter()
+            response = await client.post("/chat", json={"query": questions[i % len(questions)]["question"]})
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code == 200:
+                latencies.append(elapsed_ms)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    seconds = time.perf_counter() - start
+
+    result = {
+        "concurrency": concurrency,
+        "requests": requests,
+        "status_counts": {str(code): count for code, count in sorted(statuses.items())},
+        "seconds": round(seconds, 3),
+        "requests_per_sec": round(requests / seconds, 2),
+    }
+    if latencies:
+        result.update(_latency("", latencies))
+    return result
+
+
+def bench_chat(questions, concurrency_levels, requests):
+    import httpx
+    import main
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            # One request first so the first measured one does not pay for opening the store
+            await client.post("/chat", json={"query": questions[0]["question"]})
+            results = []
+            for concurrency in concurrency_levels:
+                results.append(await _chat_load(client, questions, concurrency, requests))
+            return results
+
+    # The chat routes print every query and answer
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = asyncio.run(run())
+    for result in results:
+        print(f"  {result}")
+    return results
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _figures(results, prefix=""):
+    """
+    Flatten the latency and throughput figures of a results tree to {"path": number}.
+    List rows are keyed by their size or concurrency so runs with other settings still line up.
+    """
+    figures = {}
+    if isinstance(results, dict):
+        for key, value in results.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                if key.endswith(("_ms", "_per_sec")):
+                    figures[f"{prefix}{key}"] = value
+            elif key != "stages":
+                figures.update(_figures(value, f"{prefix}{key}."))
+    elif isinstance(results, list):
+        for i, row in enumerate(results):
+            label = row.get("target_chunks", row.get("concurrency", i)) if isinstance(row, dict) else i
+            figures.update(_figures(row, f"{prefix[:-1]}[{label}]."))
+    return figures
+
+
+def compare(previous_path, results):
+    with open(previous_path, "r", encoding="utf-8") as f:
+        previous = json.load(f)
+    old, new = _figures(previous["results"]), _figures(results["results"])
+    print(f"\nCompared with {previous_path} ({previous.get('commit')} -> {results.get('commit')}):")
+    for key in sorted(set(old) & set(new)):
+        change = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+        print(f"  {key:<45} {old[key]:>10} -> {new[key]:>10}  {change:+.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--phases", nargs="+", choices=PHASES, default=list(PHASES))
+    parser.add_argument("--pdf", default=DEFAULT_PDF)
+    parser.add_argument("--questions", default=QUESTIONS_PATH)
+    parser.add_argument("--embeddings", default="stand-in",
+                        help="stand-in, or an EMBEDDING_BACKEND whose model is cached locally")
+    parser.add_argument("--llm-latency-ms", type=float, default=800, help="stand-in Gemini latency")
+    parser.add_argument("--stt-rate", type=float, default=0.05,
+                        help="stand-in speech engine seconds per second of audio")
+    parser.add_argument("--audio-seconds", type=int, default=600)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=10, help="passes over the questions per size")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=100, help="/chat requests per concurrency level")
+    parser.add_argument("--answer-cache", action="store_true", help="leave the answer cache on")
+    parser.add_argument("--workdir", help="knowledge base directory (default: a temporary one)")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="earlier --json output to compare against")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="kb-benchmark-")
+    os.makedirs(workdir, exist_ok=True)
+    configure(workdir, args.answer_cache)
+
+    from benchmarks.stand_ins import install
+    from chatbot import UNIFIED_VECTOR_STORE
+
+    embeddings = None
+    if args.embeddings != "stand-in":
+        from embedding_backends import make_embeddings
+
+        embeddings = make_embeddings(args.embeddings)
+    install(embeddings, args.llm_latency_ms, args.stt_rate if "transcript" in args.phases else None)
+
+    with open(args.questions, "r", encoding="utf-8") as f:
+        questions = json.load(f)
+
+    results = {
+        "commit": _commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "settings": vars(args),
+        "results": {},
+    }
+    try:
+        if "pdf" in args.phases:
+            print(f"PDF ingestion: {args.pdf}")
+            results["results"]["pdf_ingestion"] = bench_pdf(UNIFIED_VECTOR_STORE, args.pdf)
+            print(f"  {results['results']['pdf_ingestion']}")
+        if "transcript" in args.phases:
+            print(f"Transcript ingestion: {args.audio_seconds}s of synthetic speech")
+            results["results"]["transcript_ingestion"] = bench_transcript(
+                workdir, UNIFIED_VECTOR_STORE, args.audio_seconds
+            )
+            print(f"  {results['results']['transcript_ingestion']}")
+        if "search" in args.phases:
+            print(f"Search latency at {args.sizes} synthetic chunks")
+            results["results"]["search"] = bench_search(
+                UNIFIED_VECTOR_STORE, args.sizes, questions, args.k, args.rounds
+            )
+        if "chat" in args.phases:
+            print(f"/chat at concurrency {args.concurrency}, {args.requests} requests each")
+            results["results"]["chat"] = bench_chat(questions, args.concurrency, args.requests)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Offline stand-ins for the networked models, so benchmarks run without API keys or network.
+
+- HashingEmbeddings: deterministic bag-of-words vectors in place of the embedding model.
+  Similar texts get similar vectors, so retrieval and the answer cache behave plausibly.
+- StandInLLM: answers with words of the prompt after a fixed delay, in place of Gemini.
+- stand_in_speech_engine: returns generated words for an audio segment after a delay per
+  second of audio, in place of recognize_google / AssemblyAI.
+
+`install()` puts them in place through model_registry and the transcription engine table.
+"""
+import hashlib
+import re
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessageChunk
+from langchain_core.runnables import RunnableGenerator
+
+DIMENSION = 384  # all-MiniLM-L6-v2
+_WORD = re.compile(r"\w+")
+
+WORDS = (
+    "user role company access module report workflow approval document transaction account "
+    "dashboard widget login screen session finance ledger purchase order invoice voucher "
+    "branch period configure create modify assign restrict export schedule audit backup"
+).split()
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Signed feature hashing of the words of a text into DIMENSION dims, L2-normalized.
+    """
+
+    def __init__(self, dimension: int = DIMENSION):
+        self.dimension = dimension
+        self.model_name = f"stand-in-hashing-{dimension}"
+        self._buckets = {}
+
+    def _bucket(self, word):
+        bucket = self._buckets.get(word)
+        if bucket is None:
+            digest = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+            bucket = self._buckets[word] = (digest % self.dimension, 1.0 if digest >> 63 else -1.0)
+        return bucket
+
+    def _embed(self, text):
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in _WORD.findall(text.lower()):
+            index, sign = self._bucket(word)
+            vector[index] += sign
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str):
+        return self._embed(text)
+
+
+class StandInLLM:
+    """
+    Chat-model stand-in: after `latency_ms` it answers with the first words of the prompt.
+    Streaming yields the answer in `chunks` pieces spread over the same delay.
+    """
+
+    def __init__(self, latency_ms: float = 800, answer_words: int = 60, chunks: int = 10):
+        self.latency = latency_ms / 1000
+        self.answer_words = answer_words
+        self.chunks = chunks
+
+    def _answer(self, prompt_value) -> str:
+        text = prompt_value.to_string() if hasattr(prompt_value, "to_string") else str(prompt_value)
+        return " ".join(text.split()[:self.answer_words])
+
+    def _generate(self, inputs):
+        for prompt_value in inputs:
+            words = self._answer(prompt_value).split()
+            step = max(1, -(-len(words) // self.chunks))
+            pieces = range(0, len(words), step)
+            for first in pieces:
+                time.sleep(self.latency / len(pieces))
+                yield AIMessageChunk(content=" ".join(words[first:first + step]) + " ")
+
+    def runnable(self):
+        # invoke() aggregates the streamed chunks, so both chat paths see the same delay
+        return RunnableGenerator(self._generate)
+
+
+def generated_words(count: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return " ".join(WORDS[i] for i in rng.integers(0, len(WORDS), count))
+
+
+def stand_in_speech_engine(seconds_per_audio_second: float = 0.05, words_per_second: float = 2.5):
+    """
+    A segment transcriber taking `seconds_per_audio_second` of wall time per second of audio
+    and returning about `words_per_second` generated words per second of audio.
+    """
+    def transcribe(audio) -> str:
+        duration = len(audio.frame_data) / (audio.sample_rate * audio.sample_width)
+        time.sleep(duration * seconds_per_audio_second)
+        return generated_words(max(1, int(duration * words_per_second)), seed=len(audio.frame_data))
+
+    return transcribe
+
+
+def install(embeddings=None, llm_latency_ms: float = 800, stt_seconds_per_audio_second: float = None):
+    """
+    Route the shared models (and, when `stt_seconds_per_audio_second` is given, every
+    transcription engine) to the stand-ins. `embeddings` defaults to HashingEmbeddings.
+    """
+    import model_registry
+
+    embeddings = embeddings or HashingEmbeddings()
+    model_registry.embedding_model.replace(lambda: embeddings)
+    model_registry.embeddings.model_name = embeddings.model_name
+    model_registry.llm_client.replace(StandInLLM(llm_latency_ms).runnable)
+
+    if stt_seconds_per_audio_second is not None:
+        from app.services import video_processing
+
+        engine = stand_in_speech_engine(stt_seconds_per_audio_second)
+        for name in list(video_processing._SEGMENT_ENGINES):
+            video_processing._SEGMENT_ENGINES[name] = engine
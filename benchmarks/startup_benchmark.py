@@ -0,0 +1,100 @@
+"""
+Startup benchmark: import time of the application modules and, with --warm-up, the time to
+load the models and the knowledge base.
+
+Every module is imported in a fresh interpreter under `python -X importtime`, so nothing is
+shared between measurements. Importing must not load any model; the slowest imports are
+listed to show where the time goes. With --budget-ms the script exits non-zero when an
+import is slower than the budget, so it can guard against a heavy import creeping back in.
+
+    python -m benchmarks.startup_benchmark
+    python -m benchmarks.startup_benchmark --warm-up --budget-ms 3000 --json startup.json
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+DEFAULT_MODULES = ["chatbot", "main", "app.main"]
+
+WARM_UP_SCRIPT = """
+import json, time
+import chatbot
+start = time.perf_counter()
+chatbot.warm_up()
+print(json.dumps({"warm_up_s": round(time.perf_counter() - start, 3), **chatbot.readiness()}))
+"""
+
+
+def measure_import(module, top):
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+
+    # Lines look like "import time:      self [us] |  cumulative | imported package"
+    imports = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # Nested imports are indented by two spaces per level after the separating space
+        imports.append((int(cumulative_us), name[1:].rstrip()))
+
+    own = next((cumulative for cumulative, name in imports if name == module), None)
+    slowest = sorted(((c, n) for c, n in imports if not n.startswith(" ") and n != module), reverse=True)[:top]
+    return {
+        "module": module,
+        "ok": completed.returncode == 0,
+        "error": completed.stderr.strip().splitlines()[-1] if completed.returncode else None,
+        "import_ms": round(own / 1000, 1) if own is not None else None,
+        "process_ms": round(wall_ms, 1),
+        "slowest": [{"module": name, "cumulative_ms": round(c / 1000, 1)} for c, name in slowest],
+    }
+
+
+def measure_warm_up():
+    completed = subprocess.run([sys.executable, "-c", WARM_UP_SCRIPT], capture_output=True, text=True)
+    if completed.returncode:
+        return {"ok": False, "error": completed.stderr.strip().splitlines()[-1]}
+    return dict(json.loads(completed.stdout.strip().splitlines()[-1]), ok=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--top", type=int, default=8, help="slowest top-level imports to list")
+    parser.add_argument("--warm-up", action="store_true", help="also time chatbot.warm_up()")
+    parser.add_argument("--budget-ms", type=float, help="fail if any import takes longer")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = {"imports": [measure_import(module, args.top) for module in args.modules]}
+    for result in results["imports"]:
+        if not result["ok"]:
+            print(f"{result['module']}: import failed: {result['error']}")
+            continue
+        print(f"{result['module']}: {result['import_ms']} ms import, {result['process_ms']} ms process")
+        for item in result["slowest"]:
+            print(f"    {item['cumulative_ms']:>9} ms  {item['module']}")
+
+    if args.warm_up:
+        results["warm_up"] = measure_warm_up()
+        print(f"warm-up: {results['warm_up']}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.budget_ms is not None:
+        over = [r["module"] for r in results["imports"] if not r["ok"] or r["import_ms"] > args.budget_ms]
+        if over:
+            print(f"Over the {args.budget_ms} ms import budget: {', '.join(over)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
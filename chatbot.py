@@ -1,142 +1,590 @@
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_core.runnables import RunnableMap
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_core.prompts import PromptTemplate
-from langchain_community.vectorstores import FAISS
-from PyPDF2 import PdfReader
+
+from knowledge_base import (
+    MANIFEST_FILE, SOURCE_ID_KEY, SOURCE_TYPE_KEY, SegmentedVectorStore, check_scope, chunk_hash,
+    describe_store
+)
+from ingestion import IngestionWriter
+from embedding_cache import EmbeddingCache, EMBEDDING_CACHE_PATH
+from model_registry import embeddings, get_llm, readiness as model_readiness
+from chunking import chunk_text, chunk_pdf_pages, chunk_transcript
+from admission import AdmissionController
+from answer_cache import AnswerCache
+from lexical_index import is_keyword_query
+from vector_index import INDEX_FILE
+from metrics import Counter, Gauge, observe, stage_errors, timed
+from pdf_extraction import iter_pdf_pages
 
 import os
+import hashlib
+import json
 import logging
+import threading
 import time
-import pandas as pd
+from collections import deque
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    api_key=os.getenv("GOOGLE_API_KEY")
+# The embedding model (EMBEDDING_BACKEND, see embedding_backends) and the Gemini client
+# (get_llm) are loaded on first use by model_registry; start_warm_up loads them at startup.
+WARM_UP_ON_START = os.getenv("WARM_UP_ON_START", "1") == "1"
+
+UNIFIED_VECTOR_STORE = os.getenv("KNOWLEDGE_BASE_PATH", "./faiss_vectors/knowledge_base")
+
+# PDFs are chunked and queued for embedding this many pages at a time while later pages are
+# still being extracted; at most PDF_INGEST_MAX_PENDING such batches wait on the writer.
+PDF_INGEST_BATCH_PAGES = int(os.getenv("PDF_INGEST_BATCH_PAGES", "32"))
+PDF_INGEST_MAX_PENDING = 2
+
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "4"))
+# "auto": keyword-like queries are answered from the BM25 index alone (no embedding),
+# everything else fuses BM25 and vector results. "hybrid", "vector" and "lexical" force
+# one strategy.
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "auto")
+
+# Chat requests run on their own pool: at most CHAT_MAX_IN_FLIGHT at once, CHAT_MAX_QUEUE
+# waiting, and a waiting request gives up after CHAT_QUEUE_TIMEOUT_SECONDS.
+CHAT_MAX_IN_FLIGHT = int(os.getenv("CHAT_MAX_IN_FLIGHT", "4"))
+CHAT_MAX_QUEUE = int(os.getenv("CHAT_MAX_QUEUE", "16"))
+CHAT_QUEUE_TIMEOUT_SECONDS = float(os.getenv("CHAT_QUEUE_TIMEOUT_SECONDS", "20"))
+
+chat_admission = AdmissionController(
+    "chat", CHAT_MAX_IN_FLIGHT, CHAT_MAX_QUEUE, CHAT_QUEUE_TIMEOUT_SECONDS
 )
 
-embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+# Answers keyed on query text/embedding and the knowledge-base version (ANSWER_CACHE_* env)
+answer_cache = AnswerCache()
+
+Gauge("chat_requests_in_flight", "Chat requests being answered.",
+      callback=lambda: chat_admission.in_flight)
+Gauge("chat_requests_waiting", "Chat requests queued for a slot.",
+      callback=lambda: chat_admission.waiting)
+Counter("chat_requests_rejected_total", "Chat requests turned away with 503.",
+        callback=lambda: chat_admission.rejected)
+Counter("answer_cache_hits_total", "Chat answers served from the answer cache.",
+        callback=lambda: answer_cache.hits)
+
+PROMPT_TEMPLATE = """
+    Answer the question as detailed as possible from the provided context.
+    The context includes information from video transcriptions (with timestamps) and PDF documents.
+        
+    If the answer is not in the provided context, ignore it.
+        
+    If the {question} is a greeting, say "Hey! I am here to help you with your video analysis and insights.".
+
+    Context: {context}
+    Question: {question}
+    """
 
-UNIFIED_VECTOR_STORE = "./faiss_vectors/knowledge_base"
+prompt = PromptTemplate(
+    template=PROMPT_TEMPLATE,
+    input_variables=["context", "question"]
+)
 
 
-def extract_text_from_pdf(path: str):
-    text = ""
-    reader = PdfReader(path)
-    for page in reader.pages:
-        text += page.extract_text() or ""
-    return text
+def extract_pages_from_pdf(path: str):
+    """
+    All page texts of `path`. Ingestion streams pages with `iter_pdf_pages` instead.
+    """
+    return [text for _, text in iter_pdf_pages(path)]
 
 
 def split_text_into_chunks(text: str):
-    splitter = RecursiveCharacterTextSplitter(chunk_size=80000, chunk_overlap=1000)
-    return splitter.split_text(text)
+    return chunk_text(text)
 
 
-def create_vector_store(vector_store_path: str, text_chunks):
-    new_vectors = FAISS.from_texts(text_chunks, embeddings)
+# Process-wide resident knowledge bases, keyed by store path.
+# Each one is opened once and serves every chat request; ingestion appends new
+# segments and publishes them without rewriting or reloading what is already indexed.
+_resident_stores = {}
+_resident_writers = {}
+_resident_lock = threading.Lock()
+
+
+def get_vector_store(vector_store_path: str = UNIFIED_VECTOR_STORE) -> SegmentedVectorStore:
+    """
+    Return the resident segmented store for `vector_store_path`, opening it once and
+    catching up with what other worker processes have written since.
+    """
+    key = os.path.abspath(vector_store_path)
+    store = _resident_stores.get(key)
+    if store is not None:
+        store.refresh()
+        return store
+
+    with _resident_lock:
+        store = _resident_stores.get(key)
+        if store is None:
+            os.makedirs(vector_store_path, exist_ok=True)
+            store = SegmentedVectorStore(vector_store_path, embeddings)
+            _resident_stores[key] = store
+    return store
+
+
+def get_ingestion_writer(vector_store_path: str = UNIFIED_VECTOR_STORE) -> IngestionWriter:
+    """
+    Return this process's writer for `vector_store_path`. All endpoints ingest through it;
+    the writers of other worker processes take turns on the store's file lock.
+    """
+    key = os.path.abspath(vector_store_path)
+    writer = _resident_writers.get(key)
+    if writer is not None:
+        return writer
+
+    store = get_vector_store(vector_store_path)
+    with _resident_lock:
+        writer = _resident_writers.get(key)
+        if writer is None:
+            writer = IngestionWriter(store, embedder=EmbeddingCache(EMBEDDING_CACHE_PATH, embeddings))
+            _resident_writers[key] = writer
+    return writer
+
+
+_store_status = (None, None)
+
+
+def _knowledge_base_status() -> dict:
+    """
+    Chunk and segment counts for the gauges: from the resident store once it is open,
+    otherwise from the manifest, read again only when it changes.
+    """
+    global _store_status
+    store = _resident_stores.get(os.path.abspath(UNIFIED_VECTOR_STORE))
+    if store is not None:
+        store.refresh()
+        manifest = store.manifest
+        return {
+            "total_chunks": store.ntotal,
+            "deleted_chunks": len(manifest["tombstones"]),
+            "segments": len(manifest["segments"])
+        }
+
+    # A store from before the manifest is described from its index file, which is not
+    # cheap to read on every scrape
+    key = None
+    for filename in (MANIFEST_FILE, INDEX_FILE):
+        try:
+            key = (filename, os.stat(os.path.join(UNIFIED_VECTOR_STORE, filename)).st_mtime_ns)
+            break
+        except FileNotFoundError:
+            continue
+    cached_key, status = _store_status
+    if status is None or key != cached_key:
+        status = describe_store(UNIFIED_VECTOR_STORE)
+        _store_status = (key, status)
+    return status
+
+
+def _knowledge_base_chunks():
+    status = _knowledge_base_status()
+    return {("live",): status["total_chunks"], ("deleted",): status.get("deleted_chunks", 0)}
 
-    if os.path.exists(vector_store_path):
-        existing = FAISS.load_local(
-            vector_store_path,
-            embeddings,
-            allow_dangerous_deserialization=True
-        )
-        existing.merge_from(new_vectors)
-        existing.save_local(vector_store_path)
-    else:
-        os.makedirs(os.path.dirname(vector_store_path), exist_ok=True)
-        new_vectors.save_local(vector_store_path)
 
+Gauge("knowledge_base_chunks", "Chunks in the knowledge base.", ("state",), callback=_knowledge_base_chunks)
+Gauge("knowledge_base_segments", "Segments in the knowledge base.",
+      callback=lambda: _knowledge_base_status()["segments"])
+Gauge("ingestion_queue_depth", "Ingestion requests waiting for the writer.",
+      callback=lambda: sum(writer.pending for writer in list(_resident_writers.values())))
 
-def process_transcribed_video_text(vector_store_path, input_data):
+
+def text_source_id(text: str) -> str:
+    return f"transcript:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+
+_warm_up_thread = None
+_warm_up_done = threading.Event()
+_warm_up_error = None
+
+
+def warm_up(vector_store_path: str = UNIFIED_VECTOR_STORE):
+    """
+    Load the embedding model (with one forward pass), the Gemini client and the resident
+    knowledge base, so the first chat request does not pay for them.
+    """
+    global _warm_up_error
+    start = time.perf_counter()
+    try:
+        embeddings.embed_query("warm-up")
+        get_llm()
+        get_vector_store(vector_store_path)
+        _warm_up_error = None
+        logger.info("Warm-up finished in %.2fs", time.perf_counter() - start)
+    except Exception as e:
+        _warm_up_error = f"{type(e).__name__}: {e}"
+        logger.exception("Warm-up failed")
+    finally:
+        _warm_up_done.set()
+
+
+def start_warm_up():
+    """
+    Run `warm_up` on a background thread (server startup), so the server answers health
+    checks while the models load. Does nothing if WARM_UP_ON_START=0 or already started.
+    """
+    global _warm_up_thread
+    if not WARM_UP_ON_START:
+        _warm_up_done.set()
+        return
+    with _resident_lock:
+        if _warm_up_thread is not None:
+            return
+        _warm_up_thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    _warm_up_thread.start()
+
+
+def readiness(vector_store_path: str = UNIFIED_VECTOR_STORE) -> dict:
+    """
+    Ready once warm-up has succeeded (immediately with WARM_UP_ON_START=0, when the models
+    load on the first request instead), plus what is loaded so far. Loads nothing.
+    """
+    return {
+        "ready": _warm_up_done.is_set() and _warm_up_error is None,
+        "warm_up": "done" if _warm_up_done.is_set() else ("running" if _warm_up_thread else "not started"),
+        "warm_up_error": _warm_up_error,
+        "models": model_readiness(),
+        "knowledge_base_open": os.path.abspath(vector_store_path) in _resident_stores,
+    }
+
+
+def create_vector_store(vector_store_path: str, text_chunks, source_id: str = None, metadata: dict = None):
+    """
+    Ingest `text_chunks`. With a `source_id` the chunks replace whatever that source held before.
+    """
+    metadatas = [dict(metadata or {}) for _ in text_chunks]
+    return get_ingestion_writer(vector_store_path).add_texts(
+        text_chunks, metadatas, source_id=source_id, replace=source_id is not None
+    )
+
+
+def process_transcribed_video_text(vector_store_path, input_data, source_id: str = None, metadata: dict = None,
+                                   source_type: str = None):
     """
     input_data: Can be a string (raw text) or a list of dicts (timestamped chunks).
+    source_id: e.g. "video:<id>"; re-ingesting the same source replaces its old chunks.
+    metadata: partition tags for every chunk, e.g. {"user_id": 7, "video_id": 42}.
+    source_type: tag of the chunks; defaults to "video" for timestamped chunks and to
+    "transcript" for raw text. A video transcribed as plain text passes "video".
     """
     if isinstance(input_data, list):
-        # Timestamped chunks handling
-        texts = [chunk['text'] for chunk in input_data]
-        metadatas = [{"start": chunk['start'], "end": chunk['end']} for chunk in input_data]
-        
-        # Create/Update Vector Store with metadata
-        new_vectors = FAISS.from_texts(texts, embeddings, metadatas=metadatas)
+        # Timestamped chunks handling: re-pack the segments to the transcript token budget
+        with timed("chunk") as timing:
+            chunks = chunk_transcript(input_data)
+            timing.items = len(chunks)
+        texts = [chunk['text'] for chunk in chunks]
+        metadatas = [
+            dict(metadata or {}, start=chunk['start'], end=chunk['end'], **{SOURCE_TYPE_KEY: source_type or "video"})
+            for chunk in chunks
+        ]
         
-        if os.path.exists(vector_store_path):
-            existing = FAISS.load_local(
-                vector_store_path,
-                embeddings,
-                allow_dangerous_deserialization=True
-            )
-            existing.merge_from(new_vectors)
-            existing.save_local(vector_store_path)
-        else:
-            os.makedirs(os.path.dirname(vector_store_path), exist_ok=True)
-            new_vectors.save_local(vector_store_path)
+        # Upsert into the Vector Store with metadata
+        return get_ingestion_writer(vector_store_path).add_texts(
+            texts, metadatas, source_id=source_id, replace=source_id is not None
+        )
             
     else:
         # Legacy String handling
-        chunks = split_text_into_chunks(input_data)
-        create_vector_store(vector_store_path, chunks)
+        with timed("chunk") as timing:
+            chunks = split_text_into_chunks(input_data)
+            timing.items = len(chunks)
+        return create_vector_store(
+            vector_store_path, chunks, source_id=source_id or text_source_id(input_data),
+            metadata=dict(metadata or {}, **{SOURCE_TYPE_KEY: source_type or "transcript"})
+        )
 
 
-def get_insights_from_video(user_query, transcribed_text=None):
-    os.makedirs("./faiss_vectors", exist_ok=True)
-    vector_store_path = UNIFIED_VECTOR_STORE
+def _page_batches(pages, size: int):
+    batch = []
+    for page in pages:
+        batch.append(page)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
-    if transcribed_text:
-        process_transcribed_video_text(vector_store_path, transcribed_text)
 
-    if not os.path.exists(vector_store_path):
-        return {"answer": "❌ No documents found. Upload PDFs first!", "sources": []}
+def ingest_pdf(vector_store_path: str, pdf_path: str, source_id: str = None, metadata: dict = None):
+    """
+    Extract, page-aware chunk and ingest a PDF. Chunks carry their page number.
+    Pages stream in from the extraction pool and are chunked and queued for embedding
+    PDF_INGEST_BATCH_PAGES at a time, so the document is never held whole. With a
+    `source_id`, chunks of the previous version that are gone from this one are tombstoned
+    once every batch is in, so searches never see the document half-replaced.
+    """
+    writer = get_ingestion_writer(vector_store_path)
+    totals = {"segment": None, "chunks": 0, "added": 0, "deleted": 0}
+    pages = 0
+    characters = 0
+    kept = set()
+    pending = deque()
 
-    vector_store = FAISS.load_local(
-        vector_store_path, embeddings,
-        allow_dangerous_deserialization=True
-    )
-    docs = vector_store.similarity_search(user_query, k=4)
-    print(f"\n[RAG] Query: {user_query}")
-    print(f"[RAG] Found {len(docs)} documents.")
-    
+    def collect(future):
+        result = future.result()
+        totals["segment"] = result["segment"] or totals["segment"]
+        for key in ("chunks", "added", "deleted"):
+            totals[key] += result[key]
+
+    for batch in _page_batches(iter_pdf_pages(pdf_path), PDF_INGEST_BATCH_PAGES):
+        page_texts = [text for _, text in batch]
+        pages += len(page_texts)
+        characters += sum(len(text) for text in page_texts)
+        with timed("chunk") as timing:
+            texts, metadatas = chunk_pdf_pages(page_texts, first_page=batch[0][0])
+            timing.items = len(texts)
+        metadatas = [dict(metadata or {}, **m, **{SOURCE_TYPE_KEY: "pdf"}) for m in metadatas]
+        if source_id is not None:
+            kept.update(
+                chunk_hash(text, dict(m, **{SOURCE_ID_KEY: source_id})) for text, m in zip(texts, metadatas)
+            )
+
+        while len(pending) >= PDF_INGEST_MAX_PENDING:
+            collect(pending.popleft())
+        pending.append(writer.submit(texts, metadatas, source_id=source_id))
+
+    if source_id is not None:
+        pending.append(writer.submit([], source_id=source_id, replace=True, keep=kept))
+    while pending:
+        collect(pending.popleft())
+    return dict(totals, pages=pages, characters=characters)
+
+
+def build_context(docs):
+    """
+    Render retrieved chunks into the prompt context and the `sources` list of the answer.
+    """
     context_text = ""
     sources = []
-    
+
     for i, doc in enumerate(docs):
         timestamp = doc.metadata.get("start", "N/A")
         content = doc.page_content
         print(f"[RAG] Doc {i+1} (Time: {timestamp}s): {content[:50]}...")
         context_text += f"\n[Time: {timestamp}s] {content}"
-        
+
         if timestamp != "N/A":
             sources.append({"start": timestamp, "text": content[:100]})
 
-    if not docs:
-        return {"answer": "The answer is not available in the context.", "sources": []}
+    return context_text, sources
 
-    prompt_template = """
-    Answer the question as detailed as possible from the provided context.
-    The context includes information from video transcriptions (with timestamps) and PDF documents.
-        
-    If the answer is not in the provided context, ignore it.
-        
-    If the {question} is a greeting, say "Hey! I am here to help you with your video analysis and insights.".
 
-    Context: {context}
-    Question: {question}
+def delete_source(source_id: str, vector_store_path: str = UNIFIED_VECTOR_STORE):
+    return get_ingestion_writer(vector_store_path).delete_source(source_id)
+
+
+def list_sources(vector_store_path: str = UNIFIED_VECTOR_STORE):
+    return get_vector_store(vector_store_path).sources()
+
+
+NO_DOCUMENTS_ANSWER = "❌ No documents found. Upload PDFs first!"
+NOT_IN_CONTEXT_ANSWER = "The answer is not available in the context."
+
+
+def open_knowledge_base(transcribed_text=None, scope=None):
     """
+    The resident store for a chat request, after indexing any transcription sent with it.
+    The transcription is tagged with the user/video of the request's scope.
+    """
+    os.makedirs("./faiss_vectors", exist_ok=True)
+    vector_store_path = UNIFIED_VECTOR_STORE
 
-    prompt = PromptTemplate(
-        template=prompt_template,
-        input_variables=["context", "question"]
-    )
-    
-    chain = prompt | llm
-    response = chain.invoke({"context": context_text, "question": user_query})
+    if transcribed_text:
+        tags = {k: v for k, v in (scope or {}).items() if k != SOURCE_TYPE_KEY}
+        process_transcribed_video_text(vector_store_path, transcribed_text, metadata=tags)
+
+    return get_vector_store(vector_store_path)
+
+
+def uses_embedding(user_query) -> bool:
+    if RETRIEVAL_MODE == "lexical":
+        return False
+    if RETRIEVAL_MODE == "auto":
+        return not is_keyword_query(user_query)
+    return True
+
+
+def chat_scope(user_id=None, video_id=None, source_type=None):
+    """
+    Retrieval scope of a chat request: a user's own content, one video, one kind of source
+    ("video", "transcript", "pdf"), or any combination. None searches everything.
+    Raises ValueError for an unknown source type.
+    """
+    return check_scope({"user_id": user_id, "video_id": video_id, "source_type": source_type})
+
+
+def _cache_scope(scope) -> str:
+    return json.dumps(scope, sort_keys=True) if scope else ""
+
+
+def lookup_answer(vector_store, user_query, scope=None):
+    """
+    Check the answer cache against the store's current version.
+    Returns (cached_answer or None, query_vector, version). The query is only embedded
+    when its text alone is not a hit and retrieval needs the vector, which is then reused.
+    """
+    version = vector_store.version
+    cache_scope = _cache_scope(scope)
+    embedded = uses_embedding(user_query)
+    cached = answer_cache.get(version, user_query, scope=cache_scope, record_miss=not embedded)
+    if cached is not None or not embedded:
+        return cached, None, version
+
+    with timed("embed_query", 1):
+        query_vector = vector_store.embeddings.embed_query(user_query)
+    return answer_cache.get(version, user_query, query_vector, scope=cache_scope), query_vector, version
+
+
+def search_documents(vector_store, user_query, query_vector=None, scope=None):
+    """
+    Run the retrieval strategy picked by RETRIEVAL_MODE, restricted to `scope`.
+    Returns (docs, query_vector); a keyword query without lexical hits falls back to
+    embedding search in "auto" mode.
+    """
+    if query_vector is None:
+        with timed("search", 1):
+            docs = vector_store.lexical_search(user_query, k=RETRIEVAL_K, scope=scope)
+        if docs or RETRIEVAL_MODE == "lexical":
+            return docs, None
+        with timed("embed_query", 1):
+            query_vector = vector_store.embeddings.embed_query(user_query)
+
+    with timed("search", 1):
+        if RETRIEVAL_MODE == "vector":
+            docs = vector_store.similarity_search_by_vector(query_vector, k=RETRIEVAL_K, scope=scope)
+        else:
+            docs = vector_store.hybrid_search(user_query, query_vector, k=RETRIEVAL_K, scope=scope)
+    return docs, query_vector
+
+
+def retrieve_context(vector_store, user_query, query_vector=None, scope=None):
+    """
+    Retrieval half of the RAG pipeline.
+    Returns (context_text, sources, query_vector); context_text is None when nothing
+    relevant was found.
+    """
+    docs, query_vector = search_documents(vector_store, user_query, query_vector, scope)
+    print(f"\n[RAG] Query: {user_query}{f' (scope {scope})' if scope else ''}")
+    print(f"[RAG] Found {len(docs)} documents{'' if query_vector is not None else ' (lexical only)'}.")
+
+    if not docs:
+        return None, None, query_vector
+
+    context_text, sources = build_context(docs)
+    return context_text, sources, query_vector
+
+
+def get_insights_from_video(user_query, transcribed_text=None, scope=None):
+    vector_store = open_knowledge_base(transcribed_text, scope)
+    if vector_store.ntotal == 0:
+        return {"answer": NO_DOCUMENTS_ANSWER, "sources": []}
+
+    cached, query_vector, version = lookup_answer(vector_store, user_query, scope)
+    if cached is not None:
+        print(f"\n[RAG] Answer cache hit: {user_query}")
+        return cached
+
+    context_text, sources, query_vector = retrieve_context(vector_store, user_query, query_vector, scope)
+    if context_text is None:
+        return {"answer": NOT_IN_CONTEXT_ANSWER, "sources": []}
+
+    chain = prompt | get_llm()
+    with timed("llm", 1):
+        response = chain.invoke({"context": context_text, "question": user_query})
     
-    return {
+    result = {
         "answer": response.content,
         "sources": sources
     }
+    answer_cache.put(version, user_query, query_vector, result, scope=_cache_scope(scope))
+    return result
+
+
+def stream_insights_from_video(user_query, transcribed_text=None, scope=None):
+    """
+    Streaming variant of `get_insights_from_video`. Yields (event, data) pairs:
+    one "sources" event as soon as retrieval is done, a "token" event per LLM chunk, and a
+    final "done" event with timings in ms (or "error" if the LLM call fails midway).
+    Answers served from the cache arrive as a single token.
+    """
+    started = time.perf_counter()
+
+    def elapsed_ms():
+        return round((time.perf_counter() - started) * 1000, 1)
+
+    def complete(answer, sources, cached):
+        timings = {"retrieval_ms": elapsed_ms()}
+        yield "sources", {"sources": sources}
+        yield "token", {"text": answer}
+        yield "done", dict(timings, total_ms=elapsed_ms(), cached=cached)
+
+    vector_store = open_knowledge_base(transcribed_text, scope)
+    if vector_store.ntotal == 0:
+        yield from complete(NO_DOCUMENTS_ANSWER, [], False)
+        return
+
+    cached, query_vector, version = lookup_answer(vector_store, user_query, scope)
+    if cached is not None:
+        yield from complete(cached["answer"], cached["sources"], True)
+        return
+
+    context_text, sources, query_vector = retrieve_context(vector_store, user_query, query_vector, scope)
+    if context_text is None:
+        yield from complete(NOT_IN_CONTEXT_ANSWER, [], False)
+        return
+
+    timings = {"retrieval_ms": elapsed_ms()}
+    yield "sources", {"sources": sources}
+
+    chain = prompt | get_llm()
+    parts = []
+    try:
+        for chunk in chain.stream({"context": context_text, "question": user_query}):
+            if not chunk.content:
+                continue
+            if "first_token_ms" not in timings:
+                timings["first_token_ms"] = elapsed_ms()
+            parts.append(chunk.content)
+            yield "token", {"text": chunk.content}
+    except Exception as e:
+        logger.exception("LLM stream failed")
+        stage_errors.inc(stage="llm")
+        yield "error", {"detail": str(e)}
+        return
+
+    answer_cache.put(
+        version, user_query, query_vector, {"answer": "".join(parts), "sources": sources},
+        scope=_cache_scope(scope)
+    )
+
+    total_ms = elapsed_ms()
+    timings["llm_ms"] = round(total_ms - timings["retrieval_ms"], 1)
+    observe("llm", timings["llm_ms"] / 1000, 1)
+    yield "done", dict(timings, total_ms=total_ms, cached=False)
+
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def answer_query(user_query, transcribed_text=None, scope=None):
+    """
+    Async entry point for the chat routes: runs `get_insights_from_video` off the event
+    loop under `chat_admission`. Raises admission.ServerBusy when saturated.
+    `scope` comes from `chat_scope`.
+    """
+    return await chat_admission.run(get_insights_from_video, user_query, transcribed_text, scope)
+
+
+def _sse_events(user_query, transcribed_text=None, scope=None):
+    for event, data in stream_insights_from_video(user_query, transcribed_text, scope):
+        yield format_sse(event, data)
+
+
+async def stream_answer(user_query, transcribed_text=None, scope=None):
+    """
+    Admit a streaming chat request and return an `admission.AdmittedStream` of
+    Server-Sent Events, to be served with `AdmittedStreamingResponse`. ServerBusy is raised
+    here, before the response starts; the slot is held until the stream ends or the
+    response is over.
+    """
+    return await chat_admission.stream(_sse_events, user_query, transcribed_text, scope)
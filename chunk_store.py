@@ -0,0 +1,256 @@
+"""
+On-disk chunk store of a knowledge-base segment.
+
+Each segment keeps its chunk text and metadata in `chunks.sqlite`, one row per vector,
+keyed by the vector's position in the FAISS index. A search reads only the rows of the
+vectors it returns, so opening a segment costs neither the time nor the memory of its
+text. The lookups the knowledge base needs for dedup (chunk_hash), deletes (doc_id,
+source_id) and scoped searches (user_id, video_id, source_type) are indexed queries
+against the file, so nothing per chunk is kept in memory.
+
+Segments are immutable, so the database is written once and then opened read-only
+without locking.
+"""
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+from langchain_core.documents import Document
+
+CHUNKS_FILE = "chunks.sqlite"
+
+# Chunk metadata copied into their own columns so scoped searches can find a partition's
+# chunks without reading any metadata
+PARTITION_KEYS = ("user_id", "video_id", "source_type")
+
+# Source types of chunks ingested before they were tagged, by source_id prefix
+# ("video:<id>" also gives the video_id)
+SOURCE_ID_TYPES = {"video": "video", "video-file": "video", "transcript": "transcript", "pdf": "pdf"}
+
+# SQLite's default limit on host parameters per statement is 999 in older builds
+_BATCH = 500
+
+_SCHEMA = """
+CREATE TABLE chunks (
+    position INTEGER PRIMARY KEY,
+    doc_id TEXT NOT NULL UNIQUE,
+    chunk_hash TEXT,
+    source_id TEXT,
+    user_id TEXT,
+    video_id TEXT,
+    source_type TEXT,
+    text TEXT NOT NULL,
+    metadata TEXT NOT NULL
+)
+"""
+
+_INDEXES = (
+    "CREATE INDEX chunks_chunk_hash ON chunks (chunk_hash)",
+    "CREATE INDEX chunks_source_id ON chunks (source_id)",
+    "CREATE INDEX chunks_user_id ON chunks (user_id)",
+    "CREATE INDEX chunks_video_id ON chunks (video_id)",
+    "CREATE INDEX chunks_source_type ON chunks (source_type)",
+)
+
+
+def partition_of(metadata: dict) -> tuple:
+    """
+    The PARTITION_KEYS values of a chunk's metadata, as strings (None when untagged).
+    """
+    return tuple(
+        str(metadata[key]) if metadata.get(key) is not None else None
+        for key in PARTITION_KEYS
+    )
+
+
+def write_chunks(directory: str, items):
+    """
+    Write `items` as (position, doc_id, chunk_hash, source_id, Document) to the directory's
+    chunk store.
+    """
+    path = os.path.join(directory, CHUNKS_FILE)
+    tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute(_SCHEMA)
+        conn.executemany(
+            "INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                (position, doc_id, hash_, source_id, *partition_of(doc.metadata),
+                 doc.page_content, json.dumps(doc.metadata, default=str))
+                for position, doc_id, hash_, source_id, doc in items
+            )
+        )
+        for statement in _INDEXES:
+            conn.execute(statement)
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+
+
+def _document(text, metadata) -> Document:
+    return Document(page_content=text, metadata=json.loads(metadata))
+
+
+class ChunkStore:
+    """
+    Read-only access to a segment's `chunks.sqlite`; one connection per thread.
+    """
+
+    def __init__(self, directory: str):
+        self.path = os.path.join(directory, CHUNKS_FILE)
+        self._uri = Path(self.path).resolve().as_uri() + "?mode=ro&immutable=1"
+        self._local = threading.local()
+        self._count = self._conn().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        columns = {row[1] for row in self._conn().execute("PRAGMA table_info(chunks)")}
+        # Stores written before the partition columns read them as NULL
+        self._columns = {key: key if key in columns else "NULL" for key in PARTITION_KEYS}
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._uri, uri=True, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def __len__(self):
+        return self._count
+
+    def documents(self, positions) -> dict:
+        """
+        {position: (doc_id, Document)} for the given vector positions.
+        """
+        positions = list(positions)
+        found = {}
+        for first in range(0, len(positions), _BATCH):
+            batch = positions[first:first + _BATCH]
+            rows = self._conn().execute(
+                f"SELECT position, doc_id, text, metadata FROM chunks "
+                f"WHERE position IN ({','.join('?' * len(batch))})",
+                batch
+            )
+            for position, doc_id, text, metadata in rows:
+                found[position] = (doc_id, _document(text, metadata))
+        return found
+
+    def search(self, doc_id: str):
+        row = self._conn().execute(
+            "SELECT text, metadata FROM chunks WHERE doc_id = ?", (doc_id,)
+        ).fetchone()
+        return _document(*row) if row else None
+
+    def _select_in(self, query: str, values, params=()):
+        """
+        Rows of `query`, whose last condition is `IN ({})`, for all `values` in batches.
+        """
+        values = list(values)
+        for first in range(0, len(values), _BATCH):
+            batch = values[first:first + _BATCH]
+            yield from self._conn().execute(
+                query.format(",".join("?" * len(batch))), (*params, *batch)
+            )
+
+    def locate(self, doc_ids) -> dict:
+        """
+        {doc_id: position} for the given doc_ids held by this segment.
+        """
+        return dict(self._select_in("SELECT doc_id, position FROM chunks WHERE doc_id IN ({})", doc_ids))
+
+    def doc_ids(self, positions) -> list:
+        return [row[0] for row in self._select_in("SELECT doc_id FROM chunks WHERE position IN ({})", positions)]
+
+    def find_hashes(self, hashes):
+        """
+        Yield (position, chunk_hash) for the chunks with one of `hashes`.
+        """
+        yield from self._select_in("SELECT position, chunk_hash FROM chunks WHERE chunk_hash IN ({})", hashes)
+
+    def source_chunks(self, source_id: str):
+        """
+        Yield (position, doc_id, chunk_hash) for the chunks of a source.
+        """
+        yield from self._conn().execute(
+            "SELECT position, doc_id, chunk_hash FROM chunks WHERE source_id = ?", (source_id,)
+        )
+
+    def source_counts(self, exclude=()) -> dict:
+        """
+        Chunk count per source_id, not counting the chunks at the `exclude` positions.
+        """
+        counts = dict(self._conn().execute(
+            "SELECT source_id, COUNT(*) FROM chunks WHERE source_id IS NOT NULL GROUP BY source_id"
+        ))
+        for (source_id,) in self._select_in("SELECT source_id FROM chunks WHERE position IN ({})", exclude):
+            if source_id in counts:
+                counts[source_id] -= 1
+                if not counts[source_id]:
+                    del counts[source_id]
+        return counts
+
+    def scope_chunks(self, scope: dict):
+        """
+        Yield (position, doc_id) for the chunks whose partition columns match `scope`
+        ({partition key: str value}). Untagged chunks are matched on what their source_id
+        gives away, like "video:<id>".
+        """
+        clauses = []
+        params = []
+        for key, value in scope.items():
+            column = self._columns[key]
+            if key == "source_type":
+                prefixes = [f"{prefix}:%" for prefix, type_ in SOURCE_ID_TYPES.items() if type_ == value]
+                derived = " OR ".join("source_id LIKE ?" for _ in prefixes) or "0"
+                clauses.append(f"({column} = ? OR ({column} IS NULL AND ({derived})))")
+                params += [value, *prefixes]
+            elif key == "video_id":
+                clauses.append(f"({column} = ? OR ({column} IS NULL AND source_id = ?))")
+                params += [value, f"video:{value}"]
+            else:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        yield from self._conn().execute(
+            f"SELECT position, doc_id FROM chunks WHERE {' AND '.join(clauses)}", params
+        )
+
+    def rows(self):
+        """
+        Yield (position, doc_id, chunk_hash, source_id, Document) for every chunk, the
+        `write_chunks` row shape. Reads all text.
+        """
+        rows = self._conn().execute(
+            "SELECT position, doc_id, chunk_hash, source_id, text, metadata FROM chunks ORDER BY position"
+        )
+        for position, doc_id, hash_, source_id, text, metadata in rows:
+            yield position, doc_id, hash_, source_id, _document(text, metadata)
+
+
+class MemoryChunks:
+    """
+    Chunks of a segment that has been built in memory and not written yet, in the same
+    shape as `ChunkStore`. `chunks` is a list of (doc_id, chunk_hash, source_id, Document)
+    in vector order.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._positions = {chunk[0]: position for position, chunk in enumerate(chunks)}
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def documents(self, positions) -> dict:
+        return {
+            p: (self._chunks[p][0], self._chunks[p][3])
+            for p in positions if 0 <= p < len(self._chunks)
+        }
+
+    def search(self, doc_id: str):
+        position = self._positions.get(doc_id)
+        return self._chunks[position][3] if position is not None else None
+
+    def rows(self):
+        for position, (doc_id, hash_, source_id, doc) in enumerate(self._chunks):
+            yield position, doc_id, hash_, source_id, doc
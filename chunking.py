@@ -0,0 +1,149 @@
+"""
+Token-aware chunking for the knowledge base.
+
+Chunk sizes are measured in tokens of the embedding model's tokenizer, so a chunk is never
+longer than what `all-MiniLM-L6-v2` actually embeds (it truncates at 256 word pieces) and
+the k retrieved chunks put a predictable number of tokens into the Gemini prompt.
+
+Every source type has its own profile, configurable through the environment:
+- pdf:        split page by page, chunks never straddle a page and carry its number
+- transcript: merge timestamped segments up to a token and duration budget
+- text:       plain text (raw transcriptions)
+"""
+import logging
+import os
+from dataclasses import dataclass
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+logger = logging.getLogger(__name__)
+
+TOKENIZER_NAME = os.getenv("CHUNK_TOKENIZER", "sentence-transformers/all-MiniLM-L6-v2")
+
+
+@dataclass(frozen=True)
+class ChunkProfile:
+    max_tokens: int
+    overlap_tokens: int = 0
+    # Transcripts only: longest stretch of video a single chunk may cover.
+    max_seconds: float = None
+
+
+PROFILES = {
+    "pdf": ChunkProfile(
+        max_tokens=int(os.getenv("CHUNK_PDF_TOKENS", "256")),
+        overlap_tokens=int(os.getenv("CHUNK_PDF_OVERLAP", "32"))
+    ),
+    "transcript": ChunkProfile(
+        max_tokens=int(os.getenv("CHUNK_TRANSCRIPT_TOKENS", "256")),
+        max_seconds=float(os.getenv("CHUNK_TRANSCRIPT_SECONDS", "120"))
+    ),
+    "text": ChunkProfile(
+        max_tokens=int(os.getenv("CHUNK_TEXT_TOKENS", "256")),
+        overlap_tokens=int(os.getenv("CHUNK_TEXT_OVERLAP", "32"))
+    ),
+}
+
+_tokenizer = None
+_tokenizer_loaded = False
+
+
+def _get_tokenizer():
+    global _tokenizer, _tokenizer_loaded
+    if not _tokenizer_loaded:
+        try:
+            from transformers import AutoTokenizer
+
+            _tokenizer = AutoTokenizer.from_pretrained(TOKENIZER_NAME)
+        except Exception as e:
+            logger.warning("Tokenizer %s unavailable (%s); estimating 4 chars per token", TOKENIZER_NAME, e)
+        _tokenizer_loaded = True
+    return _tokenizer
+
+
+def count_tokens(text: str) -> int:
+    tokenizer = _get_tokenizer()
+    if tokenizer is None:
+        return max(1, len(text) // 4) if text else 0
+    return len(tokenizer.encode(text, add_special_tokens=False))
+
+
+def _splitter(profile: ChunkProfile) -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=profile.max_tokens,
+        chunk_overlap=profile.overlap_tokens,
+        length_function=count_tokens
+    )
+
+
+def chunk_text(text: str, profile: ChunkProfile = None):
+    """
+    Split plain text into chunks of at most `profile.max_tokens` tokens.
+    """
+    return _splitter(profile or PROFILES["text"]).split_text(text)
+
+
+def chunk_pdf_pages(pages, profile: ChunkProfile = None, first_page: int = 1):
+    """
+    pages: page texts in document order, starting at page `first_page`.
+    Returns (texts, metadatas); each metadata holds the 1-based page number.
+    """
+    splitter = _splitter(profile or PROFILES["pdf"])
+    texts = []
+    metadatas = []
+    for page_number, page_text in enumerate(pages, start=first_page):
+        for chunk in splitter.split_text(page_text or ""):
+            texts.append(chunk)
+            metadatas.append({"page": page_number})
+    return texts, metadatas
+
+
+def chunk_transcript(segments, profile: ChunkProfile = None):
+    """
+    segments: [{"text": ..., "start": ..., "end": ...}] in time order.
+    Consecutive segments are merged while the result stays within the token and duration
+    budget; a segment that is too long on its own is split, with timestamps interpolated
+    by character position. Returns the same shape as the input.
+    """
+    profile = profile or PROFILES["transcript"]
+    splitter = _splitter(profile)
+
+    pieces = []
+    for segment in segments:
+        text = segment["text"]
+        tokens = count_tokens(text)
+        if tokens <= profile.max_tokens:
+            pieces.append((text, segment["start"], segment["end"], tokens))
+            continue
+
+        duration = segment["end"] - segment["start"]
+        cursor = 0
+        for part in splitter.split_text(text):
+            position = text.find(part, cursor)
+            if position < 0:
+                position = cursor
+            cursor = position + 1
+            pieces.append((
+                part,
+                round(segment["start"] + duration * position / len(text), 1),
+                round(segment["start"] + duration * min(position + len(part), len(text)) / len(text), 1),
+                count_tokens(part)
+            ))
+
+    chunks = []
+    current = None
+    for text, start, end, tokens in pieces:
+        if current is not None:
+            fits_tokens = current["tokens"] + tokens <= profile.max_tokens
+            fits_time = profile.max_seconds is None or end - current["start"] <= profile.max_seconds
+            if fits_tokens and fits_time:
+                current["text"] += " " + text
+                current["end"] = end
+                current["tokens"] += tokens
+                continue
+            chunks.append(current)
+        current = {"text": text, "start": start, "end": end, "tokens": tokens}
+    if current is not None:
+        chunks.append(current)
+
+    return [{"text": c["text"], "start": c["start"], "end": c["end"]} for c in chunks]
@@ -8,6 +8,12 @@ def migrate():
             conn.execute(text("ALTER TABLE videotranscribe ADD COLUMN IF NOT EXISTS chunks JSON;"))
             conn.commit()
             print("Migration successful! Column 'chunks' added.")
+
+            print("Adding 'content_hash' column to 'videos' table...")
+            conn.execute(text("ALTER TABLE videos ADD COLUMN IF NOT EXISTS content_hash VARCHAR;"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_videos_content_hash ON videos (content_hash);"))
+            conn.commit()
+            print("Migration successful! Column 'content_hash' added.")
         except Exception as e:
             print(f"Migration failed: {e}")
 
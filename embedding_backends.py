@@ -0,0 +1,168 @@
+"""
+CPU embedding backends.
+
+EMBEDDING_BACKEND picks how chunks and queries are embedded:
+
+- huggingface: sentence-transformers on PyTorch (the default)
+- onnx:        the model's ONNX export on onnxruntime
+- onnx-int8:   the dynamically quantized int8 ONNX export (EMBEDDING_ONNX_INT8_FILE),
+               the fastest option on CPUs without a GPU
+
+Every backend mean-pools and normalizes like sentence-transformers does, so vectors from
+one backend can be searched with another (int8 ones are a close approximation). The ONNX
+backends get their own `model_name`, so the embedding cache never serves vectors from a
+different backend.
+
+EMBEDDING_BATCH_SIZE texts go through the model per forward pass and EMBEDDING_THREADS
+caps the intra-op threads (0 keeps the library default of one per core). Texts are
+tokenized up front and batched in order of token length, so a batch is padded to the
+length of similar texts instead of the longest one in the upload; sentence-transformers
+sorts its batches the same way internally.
+
+The ONNX backends need `onnxruntime`; the model files come from the Hugging Face hub.
+"""
+import logging
+import os
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_BACKENDS = ("huggingface", "onnx", "onnx-int8")
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "huggingface")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+# all-MiniLM-L6-v2 truncates its input at 256 tokens
+EMBEDDING_MAX_TOKENS = int(os.getenv("EMBEDDING_MAX_TOKENS", "256"))
+
+ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model.onnx")
+# AVX2 build of the quantized export; the hub also has avx512 / avx512_vnni / arm64 builds
+ONNX_INT8_FILE = os.getenv("EMBEDDING_ONNX_INT8_FILE", "onnx/model_quint8_avx2.onnx")
+
+
+def check_backend(backend: str) -> str:
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}; expected one of {EMBEDDING_BACKENDS}")
+    return backend
+
+
+def _repo_id(model_name: str) -> str:
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+
+def length_sorted_batches(lengths, batch_size: int):
+    """
+    Yield lists of indexes into `lengths`, `batch_size` at a time, shortest texts first.
+    """
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    for first in range(0, len(order), batch_size):
+        yield order[first:first + batch_size]
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence embeddings from an ONNX export of a sentence-transformers model.
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, file_name: str = ONNX_FILE,
+                 batch_size: int = EMBEDDING_BATCH_SIZE, threads: int = EMBEDDING_THREADS,
+                 max_tokens: int = EMBEDDING_MAX_TOKENS, length_sorted: bool = True):
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError("The onnx embedding backends need onnxruntime: pip install onnxruntime") from e
+        from huggingface_hub import hf_hub_download
+        from tokenizers import Tokenizer
+
+        repo = _repo_id(model_name)
+        self.model_name = f"{model_name}:{file_name}"
+        self.batch_size = batch_size
+        self.length_sorted = length_sorted
+
+        self.tokenizer = Tokenizer.from_file(hf_hub_download(repo, "tokenizer.json"))
+        self.tokenizer.no_padding()
+        self.tokenizer.enable_truncation(max_tokens)
+        self.pad_id = self.tokenizer.token_to_id("[PAD]") or 0
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            hf_hub_download(repo, file_name), options, providers=["CPUExecutionProvider"]
+        )
+        self._inputs = {i.name for i in self.session.get_inputs()}
+        logger.info("Loaded ONNX embedding model %s/%s", repo, file_name)
+
+    def _embed_batch(self, encodings) -> np.ndarray:
+        length = max(len(e.ids) for e in encodings)
+        ids = np.full((len(encodings), length), self.pad_id, dtype=np.int64)
+        mask = np.zeros((len(encodings), length), dtype=np.int64)
+        for row, encoding in enumerate(encodings):
+            ids[row, :len(encoding.ids)] = encoding.ids
+            mask[row, :len(encoding.ids)] = 1
+
+        feeds = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self._inputs:
+            feeds["token_type_ids"] = np.zeros_like(ids)
+        hidden = self.session.run(None, feeds)[0]
+
+        # Mean pooling over real tokens, then L2 normalization, as in sentence-transformers
+        weights = mask[..., None].astype(np.float32)
+        pooled = (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        return pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        if not texts:
+            return []
+        encodings = self.tokenizer.encode_batch(texts)
+        if self.length_sorted:
+            batches = length_sorted_batches([len(e.ids) for e in encodings], self.batch_size)
+        else:
+            batches = (
+                list(range(first, min(first + self.batch_size, len(texts))))
+                for first in range(0, len(texts), self.batch_size)
+            )
+
+        vectors = [None] * len(texts)
+        for batch in batches:
+            for position, vector in zip(batch, self._embed_batch([encodings[i] for i in batch])):
+                vectors[position] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text: str):
+        return self.embed_documents([text])[0]
+
+
+def backend_model_name(backend: str = EMBEDDING_BACKEND) -> str:
+    """
+    The `model_name` the embeddings of `backend` will report, without loading them.
+    """
+    files = {"onnx": ONNX_FILE, "onnx-int8": ONNX_INT8_FILE}
+    check_backend(backend)
+    return f"{EMBEDDING_MODEL}:{files[backend]}" if backend in files else EMBEDDING_MODEL
+
+
+def make_embeddings(backend: str = EMBEDDING_BACKEND, batch_size: int = EMBEDDING_BATCH_SIZE,
+                    threads: int = EMBEDDING_THREADS, **kwargs):
+    """
+    Build the embeddings object for `backend`. Extra keyword arguments go to
+    `OnnxEmbeddings` (e.g. length_sorted=False) for the ONNX backends.
+    """
+    check_backend(backend)
+    if backend == "onnx":
+        return OnnxEmbeddings(file_name=ONNX_FILE, batch_size=batch_size, threads=threads, **kwargs)
+    if backend == "onnx-int8":
+        return OnnxEmbeddings(file_name=ONNX_INT8_FILE, batch_size=batch_size, threads=threads, **kwargs)
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    if threads:
+        import torch
+
+        torch.set_num_threads(threads)
+    return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL, encode_kwargs={"batch_size": batch_size})
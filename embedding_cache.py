@@ -0,0 +1,90 @@
+"""
+Persistent embedding cache.
+
+Vectors are stored in SQLite keyed by a SHA-256 of the model name and the chunk text, so
+re-ingesting a PDF or transcript only runs the embedding model on text it has never seen.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from array import array
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./faiss_vectors/embedding_cache.sqlite")
+
+# SQLite limits the number of bound parameters per statement.
+_LOOKUP_BATCH = 500
+
+
+class EmbeddingCache:
+    """
+    Wraps an embeddings object and serves `embed_documents` from the cache where possible.
+    """
+
+    def __init__(self, path: str, embeddings, model_name: str = None):
+        self.path = path
+        self.embeddings = embeddings
+        self.model_name = model_name or getattr(embeddings, "model_name", type(embeddings).__name__)
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys):
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), _LOOKUP_BATCH):
+                batch = keys[i:i + _LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                )
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+        return found
+
+    def _store(self, items):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, array("f", vector).tobytes()) for key, vector in items]
+            )
+            self._conn.commit()
+
+    def embed_documents(self, texts):
+        keys = [self.key(text) for text in texts]
+        vectors = self._lookup(list(set(keys)))
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            computed = self.embeddings.embed_documents(list(missing.values()))
+            new_items = list(zip(missing.keys(), computed))
+            self._store(new_items)
+            vectors.update(new_items)
+
+        logger.info("Embedding cache: %d hits, %d misses", len(texts) - len(missing), len(missing))
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str):
+        return self.embeddings.embed_query(text)
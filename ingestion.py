@@ -0,0 +1,219 @@
+"""
+Single-writer ingestion queue for the knowledge base.
+
+PDF uploads, video transcriptions and chat transcriptions all submit their chunk batches
+here instead of writing the store themselves. One writer thread drains whatever is pending,
+embeds it in a single call and commits it as one segment, so concurrent uploads are
+serialized without losing vectors and share the cost of each commit. Each worker process
+has its own writer; their commits are serialized by the store's file lock.
+
+Chunks that are already indexed (same text and location metadata) are dropped before
+embedding, so re-uploading a PDF or re-transcribing a video does not add duplicates.
+A batch submitted with `replace=True` is an upsert of its `source_id`: chunks of that source
+that are not in the new batch are tombstoned in the same commit. A source streamed in several
+batches ends with an empty replace batch whose `keep` holds the hashes of what it sent.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+import numpy as np
+from langchain_core.documents import Document
+
+from chunk_store import MemoryChunks
+from knowledge_base import CHUNK_HASH_KEY, DOC_ID_KEY, SOURCE_ID_KEY, chunk_hash
+from metrics import timed
+from vector_index import Segment, build_index
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_CHUNKS = int(os.getenv("INGEST_MAX_BATCH_CHUNKS", "512"))
+COMMIT_WINDOW_SECONDS = float(os.getenv("INGEST_COMMIT_WINDOW_MS", "50")) / 1000
+
+
+class _PendingBatch:
+    __slots__ = ("texts", "metadatas", "source_id", "replace", "keep", "future")
+
+    def __init__(self, texts, metadatas, source_id, replace, keep=None):
+        self.texts = texts
+        self.metadatas = metadatas
+        self.source_id = source_id
+        self.replace = replace
+        self.keep = keep
+        self.future = Future()
+
+
+class IngestionWriter:
+    """
+    Group-committing writer in front of a `SegmentedVectorStore`.
+
+    Batches submitted within `commit_window` seconds of each other (up to `max_batch_chunks`
+    chunks) are embedded together and written as one segment. Each `submit` call gets its
+    own future that resolves once its chunks are durable and searchable.
+
+    `embedder` defaults to the store's embeddings; pass an `EmbeddingCache` to reuse vectors
+    for text embedded before.
+    """
+
+    def __init__(self, store, embedder=None, max_batch_chunks: int = MAX_BATCH_CHUNKS,
+                 commit_window: float = COMMIT_WINDOW_SECONDS):
+        self.store = store
+        self.embedder = embedder or store.embeddings
+        self.max_batch_chunks = max_batch_chunks
+        self.commit_window = commit_window
+
+        self._queue = queue.Queue()
+        self._carry = None
+        self._thread = threading.Thread(target=self._run, name="kb-ingestion-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() + (self._carry is not None)
+
+    def submit(self, texts, metadatas=None, source_id: str = None, replace: bool = False,
+               keep=None) -> Future:
+        """
+        Queue chunks for ingestion, tagged with `source_id` if given.
+        With `replace=True` the batch becomes the full content of `source_id`, together with
+        the already indexed chunks whose hashes are in `keep`.
+        The future resolves to
+        {"segment": ..., "chunks": submitted, "added": newly indexed, "deleted": tombstoned}.
+        """
+        if replace and source_id is None:
+            raise ValueError("replace=True requires a source_id")
+
+        texts = list(texts)
+        if metadatas is None:
+            metadatas = [{} for _ in texts]
+        metadatas = list(metadatas)
+        if source_id is not None:
+            metadatas = [dict(m, **{SOURCE_ID_KEY: source_id}) for m in metadatas]
+        batch = _PendingBatch(texts, metadatas, source_id, replace, set(keep or ()))
+
+        if not texts and not replace:
+            batch.future.set_result({"segment": None, "chunks": 0, "added": 0, "deleted": 0})
+        else:
+            self._queue.put(batch)
+        return batch.future
+
+    def add_texts(self, texts, metadatas=None, source_id: str = None, replace: bool = False) -> dict:
+        """
+        Blocking form of `submit` for synchronous callers.
+        """
+        return self.submit(texts, metadatas, source_id=source_id, replace=replace).result()
+
+    def delete_source(self, source_id: str) -> dict:
+        """
+        Tombstone every chunk of `source_id`. Blocks until committed.
+        """
+        return self.add_texts([], source_id=source_id, replace=True)
+
+    def _collect(self):
+        if self._carry is not None:
+            group, self._carry = [self._carry], None
+        else:
+            group = [self._queue.get()]
+        size = len(group[0].texts)
+        sources = {group[0].source_id}
+        deadline = time.monotonic() + self.commit_window
+
+        while size < self.max_batch_chunks:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if batch.replace and batch.source_id in sources:
+                # A replace must see the earlier batches of its source as committed.
+                self._carry = batch
+                break
+            group.append(batch)
+            sources.add(batch.source_id)
+            size += len(batch.texts)
+        return group
+
+    def _run(self):
+        while True:
+            group = self._collect()
+            try:
+                segment, added, deleted = self._commit(group)
+            except Exception as e:
+                logger.exception("Ingestion commit of %d batches failed", len(group))
+                for batch in group:
+                    batch.future.set_exception(e)
+                continue
+
+            for batch, batch_added, batch_deleted in zip(group, added, deleted):
+                batch.future.set_result({
+                    "segment": segment,
+                    "chunks": len(batch.texts),
+                    "added": batch_added,
+                    "deleted": batch_deleted
+                })
+
+    def _commit(self, group):
+        texts = []
+        metadatas = []
+        added = []
+        deleted = []
+        tombstones = set()
+        seen = set()
+        for batch in group:
+            hashes = [chunk_hash(text, metadata) for text, metadata in zip(batch.texts, batch.metadatas)]
+
+            stale = set()
+            if batch.replace:
+                keep = batch.keep.union(hashes)
+                stale = {
+                    doc_id for doc_id, hash_ in self.store.source_chunks(batch.source_id).items()
+                    if hash_ not in keep
+                }
+                tombstones |= stale
+            deleted.append(len(stale))
+
+            indexed = self.store.live_hashes(hashes)
+            count = 0
+            for text, metadata, hash_ in zip(batch.texts, batch.metadatas, hashes):
+                if hash_ in seen or hash_ in indexed:
+                    continue
+                seen.add(hash_)
+                texts.append(text)
+                metadatas.append(dict(metadata, **{
+                    CHUNK_HASH_KEY: hash_,
+                    DOC_ID_KEY: uuid.uuid4().hex
+                }))
+                count += 1
+            added.append(count)
+
+        submitted = sum(len(batch.texts) for batch in group)
+        if not texts and not tombstones:
+            logger.info("Group commit: all %d chunks already indexed", submitted)
+            return None, added, deleted
+
+        start = time.perf_counter()
+        segment = None
+        if texts:
+            with timed("embed", len(texts)):
+                vectors = np.asarray(self.embedder.embed_documents(texts), dtype=np.float32)
+            # Fresh segments are small: exact flat index, float vectors
+            segment = Segment(
+                build_index(vectors, vectors.shape[1], "flat"),
+                MemoryChunks([
+                    (m[DOC_ID_KEY], m[CHUNK_HASH_KEY], m.get(SOURCE_ID_KEY), Document(page_content=text, metadata=m))
+                    for text, m in zip(texts, metadatas)
+                ])
+            )
+        with timed("index_write", len(texts)):
+            name = self.store.commit(segment, deleted=tombstones)
+        logger.info(
+            "Group commit: %d requests, %d/%d new chunks, %d deletions -> %s in %.2fs",
+            len(group), len(texts), submitted, len(tombstones), name, time.perf_counter() - start
+        )
+        return name, added, deleted
@@ -0,0 +1,854 @@
+"""
+Segment-based FAISS knowledge base.
+
+Every ingestion batch is written as a small, immutable FAISS segment under
+`<root>/segments/` and recorded in `<root>/manifest.json`. Searches fan out over all
+segments and merge the hits by distance. A background compaction merges small segments
+once there are too many of them or their combined size passes the target size, so an
+upload only costs I/O proportional to the batch being added.
+
+Chunks are tagged with a `source_id` (a video, a PDF file hash, ...) and a stable `doc_id`.
+Replacing or deleting a source only records tombstones for its old `doc_id`s in the
+manifest; searches skip tombstoned chunks without reading them and compaction drops them
+for good.
+
+Chunks can also be tagged with the user, the video and the kind of source they came from
+(`PARTITION_KEYS`). Searches take an optional `scope` such as {"user_id": "7"} or
+{"source_type": "pdf"}: the chunk store of each segment finds the partition's positions
+with an indexed query, so a scoped search only looks at the chunks of that partition (see
+`Segment.search`).
+
+Each segment also stores the BM25 postings of its chunks on disk (see `lexical_index`), so
+keyword lookups can be answered without the embedding model or an in-memory index.
+
+Chunk text and metadata live in a per-segment SQLite chunk store (see `chunk_store`) and
+are only read for the hits a search returns. Dedup, source lookups and deletes query the
+chunk stores too, so a worker's memory does not grow with the number of chunks: it holds
+the segments' mapped files, the tombstoned doc_ids and their vector positions (recorded
+per segment in the manifest).
+
+A store written by the old load-merge-rewrite code (`index.faiss`/`index.pkl` directly in
+`<root>`) is picked up as the first segment and folded in by the next compaction. Segments
+from before the chunk store have their pickled docstore converted once, on first open.
+"""
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+from langchain_core.documents import Document
+
+from chunk_store import CHUNKS_FILE, PARTITION_KEYS, ChunkStore, write_chunks
+from lexical_index import (
+    LEGACY_LEXICAL_FILE, LEXICAL_FILE, LexicalIndex, SegmentPostings, load_legacy_postings,
+    postings_bytes, segment_postings, write_postings
+)
+from vector_index import (
+    INDEX_FILE, INDEX_TYPE, VECTOR_ENCODING, VECTORS_FILE, Segment, describe_encoding,
+    describe_index, load_vectors, merge_segments, read_index, save_vectors, write_index
+)
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+LOCK_FILE = ".lock"
+SEGMENTS_DIR = "segments"
+LEGACY_SEGMENT = "."
+
+MAX_SEGMENTS = int(os.getenv("KB_MAX_SEGMENTS", "8"))
+SEGMENT_TARGET_BYTES = int(os.getenv("KB_SEGMENT_TARGET_BYTES", str(64 * 1024 * 1024)))
+# Rewrite a segment once this fraction of its vectors has been deleted.
+TOMBSTONE_RATIO = float(os.getenv("KB_TOMBSTONE_RATIO", "0.3"))
+# Files of merged-away segments are kept this long for searches in other worker processes
+RETIRED_GRACE_SECONDS = float(os.getenv("KB_RETIRED_GRACE_SECONDS", "60"))
+# Hybrid search: candidates taken from each side before reciprocal rank fusion.
+HYBRID_FETCH_K = int(os.getenv("KB_HYBRID_FETCH_K", "20"))
+RRF_K = 60
+
+
+CHUNK_HASH_KEY = "chunk_hash"
+DOC_ID_KEY = "doc_id"
+SOURCE_ID_KEY = "source_id"
+USER_ID_KEY, VIDEO_ID_KEY, SOURCE_TYPE_KEY = PARTITION_KEYS
+
+SOURCE_TYPES = ("video", "transcript", "pdf")
+
+
+def chunk_hash(text: str, metadata: dict = None) -> str:
+    """
+    Identity of a chunk in the index: its text plus the metadata that locates it
+    (source, transcript timestamps), so identical text from different places is kept.
+    """
+    located = {
+        k: v for k, v in (metadata or {}).items()
+        if k not in (CHUNK_HASH_KEY, DOC_ID_KEY)
+    }
+    payload = json.dumps([text, located], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def check_scope(scope: dict = None):
+    """
+    Normalize a search scope to {partition key: str value}, dropping unset keys.
+    Returns None for an unscoped search.
+    """
+    scope = {key: str(value) for key, value in (scope or {}).items() if value is not None}
+    unknown = set(scope) - set(PARTITION_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown scope keys {sorted(unknown)}; expected {PARTITION_KEYS}")
+    if SOURCE_TYPE_KEY in scope and scope[SOURCE_TYPE_KEY] not in SOURCE_TYPES:
+        raise ValueError(f"Unknown source type {scope[SOURCE_TYPE_KEY]!r}; expected one of {SOURCE_TYPES}")
+    return scope or None
+
+
+def _convert_pickled_docstore(path: str):
+    """
+    One-time conversion of a segment written by `FAISS.save_local` (chunks pickled in
+    `index.pkl`) to a chunk store. The pickle is this application's own output; it is
+    deleted once converted, so it is never deserialized again.
+    """
+    pickle_path = os.path.join(path, "index.pkl")
+    try:
+        with open(pickle_path, "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+    except FileNotFoundError:
+        # Another process converted it first
+        if os.path.exists(os.path.join(path, CHUNKS_FILE)):
+            return
+        raise
+
+    rows = []
+    for position, doc_id in sorted(index_to_docstore_id.items()):
+        doc = docstore.search(doc_id)
+        if not isinstance(doc, Document):
+            continue
+        hash_ = doc.metadata.get(CHUNK_HASH_KEY) or chunk_hash(doc.page_content, doc.metadata)
+        rows.append((position, doc_id, hash_, doc.metadata.get(SOURCE_ID_KEY), doc))
+    write_chunks(path, rows)
+    try:
+        os.remove(pickle_path)
+    except FileNotFoundError:
+        pass
+    logger.info("Converted pickled docstore of %s (%d chunks) to %s", path, len(rows), CHUNKS_FILE)
+
+
+def _convert_postings(path: str, segment: Segment):
+    """
+    One-time write of `lexical.sqlite` for a segment from before the on-disk postings,
+    from its `lexical.json` or, for older segments still, by tokenizing its chunks.
+    """
+    postings = load_legacy_postings(path)
+    if postings is None:
+        postings = segment_postings(segment)
+    write_postings(path, postings)
+    try:
+        os.remove(os.path.join(path, LEGACY_LEXICAL_FILE))
+    except FileNotFoundError:
+        pass
+    logger.info("Wrote %s for %s (%d chunks)", LEXICAL_FILE, path, len(postings))
+
+
+def _segment_path(root: str, name: str) -> str:
+    if name == LEGACY_SEGMENT:
+        return root
+    return os.path.join(root, SEGMENTS_DIR, name)
+
+
+def _segment_bytes(path: str) -> int:
+    total = 0
+    for filename in (INDEX_FILE, CHUNKS_FILE, VECTORS_FILE):
+        file_path = os.path.join(path, filename)
+        if os.path.exists(file_path):
+            total += os.path.getsize(file_path)
+    return total
+
+
+def load_manifest(root: str) -> dict:
+    """
+    Read the segment manifest of `root` without loading any segment.
+    """
+    manifest_path = os.path.join(root, MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    manifest = {"version": 0, "next_segment": 1, "segments": [], "tombstones": [], "retired": []}
+    vectors = _legacy_vectors(root)
+    if vectors is not None:
+        manifest["segments"].append({
+            "name": LEGACY_SEGMENT,
+            "vectors": vectors,
+            "bytes": _segment_bytes(root)
+        })
+    return manifest
+
+
+# index.faiss path -> ((mtime_ns, size), vector count)
+_legacy_counts = {}
+
+
+def _legacy_vectors(root: str):
+    """
+    Vector count of a store from before the manifest, or None if it has no index. The
+    index is only read again when its file changes.
+    """
+    path = os.path.join(root, INDEX_FILE)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _legacy_counts.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    vectors = read_index(root).ntotal
+    _legacy_counts[path] = (key, vectors)
+    return vectors
+
+
+@contextmanager
+def _file_lock(root: str):
+    """
+    Exclusive lock on the store directory, held by one writing process at a time.
+    """
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, LOCK_FILE), "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.05)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _write_manifest(root: str, manifest: dict):
+    tmp_path = os.path.join(root, MANIFEST_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(root, MANIFEST_FILE))
+
+
+class SegmentedVectorStore:
+    """
+    Append-only FAISS store made of immutable segments.
+
+    The loaded segments are published as a tuple that is replaced, never mutated, on
+    every write or compaction, so searches always see a consistent snapshot. Searches
+    register the segments of their snapshot (`_reading`). The files of a merged-away
+    segment are removed by a later write once RETIRED_GRACE_SECONDS have passed and no
+    search of this process still uses it.
+
+    Every worker process may write: writes hold an exclusive lock on `<root>/.lock`, and
+    catch up with the manifest on disk before reserving a segment number or publishing.
+    Reads call `refresh`, which picks up what other processes published.
+    """
+
+    def __init__(self, root: str, embeddings, max_segments: int = MAX_SEGMENTS,
+                 target_bytes: int = SEGMENT_TARGET_BYTES):
+        self.root = root
+        self.embeddings = embeddings
+        self.max_segments = max_segments
+        self.target_bytes = target_bytes
+
+        self._write_lock = threading.Lock()
+        self._compacting = False
+        # Readers per segment name, and merged-away segments waiting for theirs to finish
+        self._readers_lock = threading.Lock()
+        self._readers = {}
+
+        start = time.perf_counter()
+        self._manifest_stat = self._stat_manifest()
+        self.manifest = self._read_manifest()
+        self._segments = tuple(
+            (entry, self._load_segment(entry["name"]))
+            for entry in self.manifest["segments"]
+        )
+
+        self._tombstones = frozenset(self.manifest["tombstones"])
+        # Vector positions of the tombstoned chunks, by segment name
+        self._deleted = self._manifest_deletions(self._segments, self._tombstones)
+        self.lexical = LexicalIndex()
+
+        logger.info(
+            "Opened knowledge base %s: %d segments, %d vectors in %.2fs",
+            root, len(self._segments), self.ntotal, time.perf_counter() - start
+        )
+
+    @property
+    def ntotal(self) -> int:
+        """
+        Number of live (not deleted) vectors.
+        """
+        return sum(entry["vectors"] for entry, _ in self._segments) - len(self._tombstones)
+
+    @property
+    def version(self) -> int:
+        return self.manifest["version"]
+
+    def _read_manifest(self) -> dict:
+        manifest = load_manifest(self.root)
+        manifest.setdefault("tombstones", [])
+        manifest.setdefault("retired", [])
+        return manifest
+
+    def _stat_manifest(self):
+        try:
+            stat = os.stat(os.path.join(self.root, MANIFEST_FILE))
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def refresh(self):
+        """
+        Load the segments, deletions and compactions published by other processes since
+        the last look; a stat of the manifest when nothing changed. Skipped while this
+        process is writing, as the write catches up itself.
+        """
+        stat = self._stat_manifest()
+        if stat == self._manifest_stat or not self._write_lock.acquire(blocking=False):
+            return
+        try:
+            manifest = self._read_manifest()
+            if manifest["version"] != self.manifest["version"]:
+                self._adopt(manifest)
+            self._manifest_stat = stat
+        finally:
+            self._write_lock.release()
+
+    @contextmanager
+    def _writing(self):
+        """
+        Hold the write lock of this process and the store's file lock, with the manifest
+        and the published segments caught up with the writes of other processes.
+        """
+        with self._write_lock, _file_lock(self.root):
+            manifest = self._read_manifest()
+            if manifest["version"] != self.manifest["version"]:
+                self._adopt(manifest)
+            else:
+                # A merge in another process may have reserved segment numbers
+                self.manifest = dict(self.manifest, next_segment=manifest["next_segment"])
+            yield
+
+    def _adopt(self, manifest: dict):
+        """
+        Publish the segments of a manifest written by another process, reusing the ones
+        already loaded.
+        """
+        loaded = {entry["name"]: segment for entry, segment in self._segments}
+        segments = tuple(
+            (entry, loaded[entry["name"]] if entry["name"] in loaded else self._load_segment(entry["name"]))
+            for entry in manifest["segments"]
+        )
+        tombstones = frozenset(manifest["tombstones"])
+        deleted = self._manifest_deletions(segments, tombstones)
+        self.manifest = manifest
+        with self._readers_lock:
+            self._segments = segments
+            self._tombstones = tombstones
+            self._deleted = deleted
+
+    def _locate(self, doc_ids, segments) -> dict:
+        """
+        {segment name: {doc_id: position}} for the `doc_ids` held by `segments`.
+        """
+        remaining = set(doc_ids)
+        found = {}
+        for entry, segment in segments:
+            if not remaining:
+                break
+            positions = segment.chunks.locate(remaining)
+            if positions:
+                found[entry["name"]] = positions
+                remaining -= positions.keys()
+        return found
+
+    def _manifest_deletions(self, segments, tombstones) -> dict:
+        deleted = {
+            entry["name"]: np.asarray(entry["deleted_positions"], dtype=np.int64)
+            for entry, _ in segments if entry.get("deleted_positions")
+        }
+        # Manifests from before the positions were recorded
+        unrecorded = [(e, segment) for e, segment in segments if "deleted_positions" not in e]
+        if tombstones and unrecorded:
+            for name, positions in self._locate(tombstones, unrecorded).items():
+                deleted[name] = np.asarray(sorted(positions.values()), dtype=np.int64)
+        return deleted
+
+    def _scope_chunks(self, scope: dict, segments, deleted) -> dict:
+        """
+        {segment name: (positions, doc_ids)} of the live chunks in `scope`.
+        """
+        by_segment = {}
+        for entry, segment in segments:
+            rows = list(segment.chunks.scope_chunks(scope))
+            dead = deleted.get(entry["name"])
+            if dead is not None and rows:
+                dead = set(dead.tolist())
+                rows = [row for row in rows if row[0] not in dead]
+            if rows:
+                by_segment[entry["name"]] = ([p for p, _ in rows], [d for _, d in rows])
+        return by_segment
+
+    def live_hashes(self, hashes) -> set:
+        """
+        The `chunk_hash`es among `hashes` of chunks that are indexed and live.
+        """
+        hashes = set(hashes)
+        found = set()
+        with self._reading() as (segments, _, deleted):
+            for entry, segment in segments:
+                dead = deleted.get(entry["name"])
+                dead = set(dead.tolist()) if dead is not None else ()
+                found.update(h for p, h in segment.chunks.find_hashes(hashes - found) if p not in dead)
+        return found
+
+    def contains(self, hash_: str) -> bool:
+        """
+        True if a live chunk with this `chunk_hash` is already indexed.
+        """
+        return bool(self.live_hashes([hash_]))
+
+    def source_chunks(self, source_id: str) -> dict:
+        """
+        Live chunks of a source as {doc_id: chunk_hash}.
+        """
+        chunks = {}
+        with self._reading() as (segments, tombstones, _):
+            for _, segment in segments:
+                for _, doc_id, hash_ in segment.chunks.source_chunks(source_id):
+                    if doc_id not in tombstones:
+                        chunks[doc_id] = hash_
+        return chunks
+
+    def sources(self) -> dict:
+        """
+        Live chunk count per source_id.
+        """
+        counts = {}
+        with self._reading() as (segments, _, deleted):
+            for entry, segment in segments:
+                exclude = deleted[entry["name"]].tolist() if entry["name"] in deleted else ()
+                for source_id, count in segment.chunks.source_counts(exclude=exclude).items():
+                    counts[source_id] = counts.get(source_id, 0) + count
+        return counts
+
+    def _publish(self, loaded, tombstones, deleted, retired=()):
+        """
+        Write the manifest for `loaded` (entry, segment) pairs, `tombstones` and their
+        positions by segment (`deleted`), then swap them in for readers. Segments named in
+        `retired` are no longer in use; their files, and those of segments retired long
+        enough ago, are removed. Caller is `_writing`.
+        """
+        loaded = tuple(
+            (dict(
+                e,
+                deleted=len(deleted.get(e["name"], ())),
+                deleted_positions=deleted[e["name"]].tolist() if e["name"] in deleted else []
+            ), segment)
+            for e, segment in loaded
+        )
+        now = time.time()
+        with self._readers_lock:
+            reading = set(self._readers)
+        expired = [
+            e["name"] for e in self.manifest["retired"]
+            if now - e["at"] >= RETIRED_GRACE_SECONDS and e["name"] not in reading
+        ]
+        manifest = dict(
+            self.manifest,
+            version=self.manifest["version"] + 1,
+            segments=[e for e, _ in loaded],
+            tombstones=sorted(tombstones),
+            retired=[e for e in self.manifest["retired"] if e["name"] not in expired]
+            + [{"name": name, "at": now} for name in retired]
+        )
+        _write_manifest(self.root, manifest)
+        self._manifest_stat = self._stat_manifest()
+        self.manifest = manifest
+        # Swapped together, so a reader pairs every segment with its own deletions
+        with self._readers_lock:
+            self._segments = loaded
+            self._tombstones = frozenset(tombstones)
+            self._deleted = deleted
+        for name in expired:
+            self._remove_segment_files(name)
+
+    def _load_segment(self, name: str) -> Segment:
+        path = _segment_path(self.root, name)
+        if not os.path.exists(os.path.join(path, CHUNKS_FILE)):
+            _convert_pickled_docstore(path)
+        segment = Segment(read_index(path), ChunkStore(path), load_vectors(path))
+        if not os.path.exists(os.path.join(path, LEXICAL_FILE)):
+            _convert_postings(path, segment)
+        segment.postings = SegmentPostings(path)
+        return segment
+
+    def _save_segment(self, name: str, segment: Segment) -> dict:
+        segments_dir = os.path.join(self.root, SEGMENTS_DIR)
+        os.makedirs(segments_dir, exist_ok=True)
+
+        tmp_path = os.path.join(segments_dir, f".tmp-{name}")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        write_index(tmp_path, segment.index)
+        write_chunks(tmp_path, segment.chunks.rows())
+        if segment.vectors is not None:
+            save_vectors(tmp_path, segment.vectors)
+        write_postings(tmp_path, segment_postings(segment))
+        os.replace(tmp_path, _segment_path(self.root, name))
+
+        return {
+            "name": name,
+            "vectors": segment.index.ntotal,
+            "bytes": _segment_bytes(_segment_path(self.root, name)),
+            "lexical_bytes": postings_bytes(_segment_path(self.root, name)),
+            "index": describe_index(segment.index),
+            "encoding": describe_encoding(segment.index)
+        }
+
+    def _reserve_segment_name(self) -> str:
+        # Caller is `_writing`. The counter is persisted with the next manifest write.
+        number = self.manifest["next_segment"]
+        self.manifest = dict(self.manifest, next_segment=number + 1)
+        return f"seg-{number:06d}"
+
+    # ---------------------------
+    # Writes
+    # ---------------------------
+
+    def commit(self, batch=None, deleted=()):
+        """
+        Atomically add an in-memory `Segment` as a new segment and/or tombstone `deleted`
+        doc_ids, with a single manifest write. Returns the new segment name, if any.
+        Ingestion goes through `ingestion.IngestionWriter`, which calls this from its
+        writer thread; writers of other processes wait on the file lock.
+        """
+        with self._writing():
+            located = self._locate(set(deleted) - self._tombstones, self._segments)
+            if batch is None and not located:
+                return None
+
+            tombstones = set(self._tombstones)
+            deletions = dict(self._deleted)
+            for segment_name, positions in located.items():
+                tombstones.update(positions)
+                deletions[segment_name] = np.union1d(
+                    deletions.get(segment_name, np.empty(0, dtype=np.int64)),
+                    np.fromiter(positions.values(), dtype=np.int64)
+                )
+
+            loaded = self._segments
+            name = None
+            if batch is not None:
+                name = self._reserve_segment_name()
+                entry = self._save_segment(name, batch)
+                batch = self._load_segment(name)
+                loaded = loaded + ((entry, batch),)
+
+            self._publish(loaded, tombstones, deletions)
+
+        logger.info(
+            "Committed %s (%d vectors), %d deletions",
+            name or "no segment", entry["vectors"] if batch is not None else 0,
+            sum(len(positions) for positions in located.values())
+        )
+        self._maybe_compact()
+        return name
+
+    # ---------------------------
+    # Reads
+    # ---------------------------
+
+    @contextmanager
+    def _reading(self):
+        """
+        The current (segments, tombstones, deleted positions by segment); the segments are
+        kept on disk until the block exits.
+        """
+        self.refresh()
+        with self._readers_lock:
+            segments = self._segments
+            snapshot = (segments, self._tombstones, self._deleted)
+            for entry, _ in segments:
+                self._readers[entry["name"]] = self._readers.get(entry["name"], 0) + 1
+        try:
+            yield snapshot
+        finally:
+            with self._readers_lock:
+                for entry, _ in segments:
+                    name = entry["name"]
+                    self._readers[name] -= 1
+                    if not self._readers[name]:
+                        del self._readers[name]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, scope: dict = None):
+        if not self._segments:
+            return []
+        return self.similarity_search_with_score_by_vector(self.embeddings.embed_query(query), k=k, scope=scope)
+
+    def similarity_search_with_score_by_vector(self, embedding, k: int = 4, scope: dict = None):
+        scope = check_scope(scope)
+        hits = []
+        with self._reading() as (segments, _, deleted):
+            by_segment = self._scope_chunks(scope, segments, deleted) if scope else None
+            for entry, segment in segments:
+                if by_segment is None:
+                    # Deleted chunks are skipped by the index, so they are never read
+                    hits.extend(segment.search(embedding, k=k, exclude=deleted.get(entry["name"])))
+                elif entry["name"] in by_segment:
+                    positions, _ = by_segment[entry["name"]]
+                    hits.extend(segment.search(embedding, k=k, positions=positions))
+
+        # Default FAISS metric is L2 distance: lower is closer.
+        hits.sort(key=lambda hit: hit[1])
+        return hits[:k]
+
+    def similarity_search(self, query: str, k: int = 4, scope: dict = None):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, scope=scope)]
+
+    def similarity_search_by_vector(self, embedding, k: int = 4, scope: dict = None):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k=k, scope=scope)]
+
+    def _document(self, doc_id: str, segments: dict):
+        for segment in segments.values():
+            doc = segment.chunks.search(doc_id)
+            if doc is not None:
+                return doc
+        return None
+
+    def lexical_search_with_score(self, query: str, k: int = 4, scope: dict = None):
+        """
+        BM25 search; no embedding is computed. Scores are higher-is-better.
+        """
+        scope = check_scope(scope)
+        hits = []
+        with self._reading() as (loaded, tombstones, deleted):
+            include = None
+            if scope:
+                include = set()
+                for _, doc_ids in self._scope_chunks(scope, loaded, deleted).values():
+                    include.update(doc_ids)
+            segments = {entry["name"]: segment for entry, segment in loaded}
+            found = self.lexical.search(
+                query, [segment.postings for segment in segments.values()],
+                k=k, exclude=tombstones, include=include
+            )
+            for doc_id, score in found:
+                doc = self._document(doc_id, segments)
+                if doc is not None:
+                    hits.append((doc, score))
+        return hits
+
+    def lexical_search(self, query: str, k: int = 4, scope: dict = None):
+        return [doc for doc, _ in self.lexical_search_with_score(query, k=k, scope=scope)]
+
+    def hybrid_search(self, query: str, embedding, k: int = 4, scope: dict = None):
+        """
+        Fuse vector and BM25 results with reciprocal rank fusion.
+        """
+        fetch_k = max(k, HYBRID_FETCH_K)
+        ranked = (
+            self.similarity_search_with_score_by_vector(embedding, k=fetch_k, scope=scope),
+            self.lexical_search_with_score(query, k=fetch_k, scope=scope),
+        )
+        scores = {}
+        docs = {}
+        for hits in ranked:
+            for rank, (doc, _) in enumerate(hits):
+                doc_id = doc.metadata.get(DOC_ID_KEY) or doc.page_content
+                docs[doc_id] = doc
+                scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+        best = sorted(scores, key=scores.get, reverse=True)[:k]
+        return [docs[doc_id] for doc_id in best]
+
+    # ---------------------------
+    # Compaction
+    # ---------------------------
+
+    def _compaction_candidates(self):
+        entries = self.manifest["segments"]
+        small = [e for e in entries if e["bytes"] < self.target_bytes]
+        dirty = [e for e in entries if e.get("deleted", 0) > e["vectors"] * TOMBSTONE_RATIO]
+
+        if len(entries) > self.max_segments:
+            if len(small) < 2:
+                small = sorted(entries, key=lambda e: e["bytes"])[:2]
+            candidates = small + dirty
+        elif len(small) >= 2 and sum(e["bytes"] for e in small) >= self.target_bytes:
+            candidates = small + dirty
+        else:
+            candidates = dirty
+
+        unique = {}
+        for e in candidates:
+            unique.setdefault(e["name"], e)
+        return list(unique.values())
+
+    def _maybe_compact(self):
+        with self._write_lock:
+            if self._compacting or not self._compaction_candidates():
+                return
+            self._compacting = True
+
+        threading.Thread(target=self._run_compaction, name="kb-compaction", daemon=True).start()
+
+    def _run_compaction(self):
+        try:
+            self.compact()
+        except Exception:
+            logger.exception("Knowledge base compaction failed")
+        finally:
+            with self._write_lock:
+                self._compacting = False
+
+    def compact(self):
+        """
+        Merge the current compaction candidates into a single segment, dropping
+        tombstoned chunks. Ingestion keeps running while the merged segment is being built.
+        """
+        with self._writing():
+            candidates = self._compaction_candidates()
+            if not candidates:
+                return None
+        return self._merge(candidates)
+
+    def rebuild(self, index_type: str = None, encoding: str = None):
+        """
+        Merge every segment into one, built as `index_type` ("flat", "hnsw", "ivf") with
+        `encoding` ("float", "sq8", "pq"); defaults are KB_INDEX_TYPE/KB_VECTOR_ENCODING
+        regardless of size. This is how an existing flat index is migrated.
+        """
+        with self._writing():
+            if self._compacting:
+                raise RuntimeError("A compaction is running; retry once it has finished")
+            candidates = list(self.manifest["segments"])
+            if not candidates:
+                return None
+            self._compacting = True
+        try:
+            return self._merge(
+                candidates,
+                index_type=index_type or INDEX_TYPE,
+                encoding=encoding or VECTOR_ENCODING
+            )
+        finally:
+            with self._write_lock:
+                self._compacting = False
+
+    def _merge(self, candidates, index_type: str = None, encoding: str = None):
+        with self._writing():
+            # Segments published since the candidates were picked are not touched
+            current = {e["name"] for e in self.manifest["segments"]}
+            candidates = [e for e in candidates if e["name"] in current]
+            if not candidates:
+                return None
+            name = self._reserve_segment_name()
+            # Persisted now, as other processes keep committing while this merge runs
+            _write_manifest(self.root, self.manifest)
+            merged_names = {e["name"] for e in candidates}
+            purged = set()
+            for entry, segment in self._segments:
+                if entry["name"] in merged_names and entry["name"] in self._deleted:
+                    purged.update(segment.chunks.doc_ids(self._deleted[entry["name"]].tolist()))
+
+        start = time.perf_counter()
+        # Segments on disk are immutable, so they can be merged without holding the lock.
+        merged = merge_segments(
+            [self._load_segment(entry["name"]) for entry in candidates],
+            exclude=purged,
+            index_type=index_type,
+            encoding=encoding
+        )
+        entry = self._save_segment(name, merged)
+        # Serve the merged segment from the mapped files rather than the build copy
+        merged = self._load_segment(name)
+
+        with self._writing():
+            if not merged_names <= {e["name"] for e in self.manifest["segments"]}:
+                # Another process merged some of the same segments first
+                logger.info("Dropping merge into %s: its segments were merged elsewhere", name)
+                self._remove_segment_files(name)
+                return None
+            loaded = tuple(
+                seg for seg in self._segments if seg[0]["name"] not in merged_names
+            ) + ((entry, merged),)
+            tombstones = self._tombstones - purged
+            deletions = {n: p for n, p in self._deleted.items() if n not in merged_names}
+            # Chunks of the merged segments deleted while the merge was running
+            late = self._locate(tombstones, ((entry, merged),)).get(name)
+            if late:
+                deletions[name] = np.asarray(sorted(late.values()), dtype=np.int64)
+            # Searches that started before the publish may still read the merged-away segments
+            self._publish(loaded, tombstones, deletions, retired=sorted(merged_names))
+
+        logger.info(
+            "Merged %d segments into %s (%s/%s index, %d vectors, %d deletions reclaimed) in %.2fs",
+            len(candidates), name, entry["index"], entry["encoding"], entry["vectors"], len(purged),
+            time.perf_counter() - start
+        )
+        return name
+
+    def _remove_segment_files(self, name: str):
+        if name == LEGACY_SEGMENT:
+            for filename in (INDEX_FILE, "index.pkl", CHUNKS_FILE, LEXICAL_FILE):
+                file_path = os.path.join(self.root, filename)
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+        else:
+            shutil.rmtree(_segment_path(self.root, name), ignore_errors=True)
+
+
+def describe_store(root: str) -> dict:
+    """
+    Summarize a knowledge base from its manifest; does not load any index.
+    """
+    if not os.path.exists(root):
+        return {"exists": False, "total_chunks": 0, "segments": 0}
+
+    manifest = load_manifest(root)
+    segments = manifest["segments"]
+    deleted = len(manifest.get("tombstones", []))
+    lexical_bytes = sum(
+        e["lexical_bytes"] if "lexical_bytes" in e else postings_bytes(_segment_path(root, e["name"]))
+        for e in segments
+    )
+    return {
+        "exists": bool(segments),
+        "total_chunks": sum(e["vectors"] for e in segments) - deleted,
+        "deleted_chunks": deleted,
+        "segments": len(segments),
+        "index_types": sorted({e.get("index", "flat") for e in segments}),
+        "encodings": sorted({e.get("encoding", "float") for e in segments}),
+        # BM25 postings on disk, shared by the worker processes through the page cache;
+        # each open connection also caches up to LEXICAL_CACHE_KB of it
+        "lexical_index_bytes": lexical_bytes,
+        "version": manifest["version"]
+    }
@@ -0,0 +1,218 @@
+"""
+BM25 inverted index over the knowledge-base chunks.
+
+Each segment directory holds the postings of its chunks in `lexical.sqlite` (term ->
+doc_id, term frequency), written together with the FAISS files, so the index is persisted
+and grows segment by segment like the vectors do. A search looks up only the query terms
+in each segment's postings; nothing is loaded into memory when a segment is opened, and
+worker processes on one host share the files through the page cache. Corpus statistics
+(document count, average length, document frequencies) are summed over the segments of
+the snapshot being searched. Compaction writes the postings of the merged segment without
+the purged chunks.
+
+Exact menu, screen and field names ("Purchase Order Approval", "GL01") are matched here
+without running the embedding model.
+"""
+import heapq
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path
+
+LEXICAL_FILE = "lexical.sqlite"
+# Postings of segments written before they moved to SQLite; converted on first open
+LEGACY_LEXICAL_FILE = "lexical.json"
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+# Queries with at most this many terms and no question words count as keyword queries
+KEYWORD_QUERY_MAX_TERMS = int(os.getenv("KEYWORD_QUERY_MAX_TERMS", "4"))
+# SQLite page cache per connection (KiB); the files themselves stay in the page cache
+LEXICAL_CACHE_KB = int(os.getenv("LEXICAL_CACHE_KB", "2048"))
+
+_TOKEN = re.compile(r"\w+")
+
+# SQLite's default limit on host parameters per statement is 999 in older builds
+_BATCH = 500
+
+_SCHEMA = (
+    "CREATE TABLE docs (doc_id TEXT PRIMARY KEY, length INTEGER NOT NULL) WITHOUT ROWID",
+    "CREATE TABLE terms (term TEXT PRIMARY KEY, df INTEGER NOT NULL) WITHOUT ROWID",
+    "CREATE TABLE postings (term TEXT NOT NULL, doc_id TEXT NOT NULL, tf INTEGER NOT NULL, "
+    "PRIMARY KEY (term, doc_id)) WITHOUT ROWID",
+)
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have i in is it its of on or that the this to was
+were will with you your we our can do does did
+""".split())
+
+QUESTION_WORDS = frozenset("how what why when where which who whom whose explain describe".split())
+
+
+def tokenize(text: str):
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def is_keyword_query(query: str) -> bool:
+    """
+    True for short lookups like "purchase order approval" as opposed to questions.
+    """
+    words = _TOKEN.findall(query.lower())
+    if any(w in QUESTION_WORDS for w in words):
+        return False
+    terms = tokenize(query)
+    return 0 < len(terms) <= KEYWORD_QUERY_MAX_TERMS
+
+
+def segment_postings(segment) -> dict:
+    """
+    Term counts of every chunk in a segment: {doc_id: {term: count}}.
+    """
+    return {
+        doc_id: dict(Counter(tokenize(doc.page_content)))
+        for _, doc_id, _, _, doc in segment.chunks.rows()
+    }
+
+
+def write_postings(directory: str, postings: dict):
+    """
+    Write `postings` ({doc_id: {term: count}}) to the directory's `lexical.sqlite`.
+    """
+    path = os.path.join(directory, LEXICAL_FILE)
+    tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    df = Counter()
+    for counts in postings.values():
+        df.update(counts.keys())
+    conn = sqlite3.connect(tmp_path)
+    try:
+        for statement in _SCHEMA:
+            conn.execute(statement)
+        conn.executemany(
+            "INSERT INTO docs VALUES (?, ?)",
+            ((doc_id, sum(counts.values())) for doc_id, counts in postings.items())
+        )
+        conn.executemany("INSERT INTO terms VALUES (?, ?)", df.items())
+        conn.executemany(
+            "INSERT INTO postings VALUES (?, ?, ?)",
+            (
+                (term, doc_id, tf)
+                for doc_id, counts in postings.items()
+                for term, tf in counts.items()
+            )
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+
+
+def load_legacy_postings(directory: str):
+    """
+    Postings saved in `lexical.json` by older releases, or None.
+    """
+    path = os.path.join(directory, LEGACY_LEXICAL_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class SegmentPostings:
+    """
+    Read-only access to a segment's `lexical.sqlite`; one connection per thread.
+    Only the document count and total length are kept in memory.
+    """
+
+    def __init__(self, directory: str):
+        self.path = os.path.join(directory, LEXICAL_FILE)
+        self._uri = Path(self.path).resolve().as_uri() + "?mode=ro&immutable=1"
+        self._local = threading.local()
+        count, total = self._conn().execute("SELECT COUNT(*), SUM(length) FROM docs").fetchone()
+        self.documents = count
+        self.total_length = total or 0
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._uri, uri=True, check_same_thread=False)
+            conn.execute(f"PRAGMA cache_size = -{LEXICAL_CACHE_KB}")
+            self._local.conn = conn
+        return conn
+
+    def document_frequency(self, term: str) -> int:
+        row = self._conn().execute("SELECT df FROM terms WHERE term = ?", (term,)).fetchone()
+        return row[0] if row else 0
+
+    def postings(self, term: str, doc_ids=None):
+        """
+        Yield (doc_id, term frequency, document length) for the documents containing
+        `term`, only among `doc_ids` when given.
+        """
+        query = (
+            "SELECT p.doc_id, p.tf, d.length FROM postings p JOIN docs d ON d.doc_id = p.doc_id "
+            "WHERE p.term = ?"
+        )
+        if doc_ids is None:
+            yield from self._conn().execute(query, (term,))
+            return
+        doc_ids = list(doc_ids)
+        for first in range(0, len(doc_ids), _BATCH):
+            batch = doc_ids[first:first + _BATCH]
+            yield from self._conn().execute(
+                f"{query} AND p.doc_id IN ({','.join('?' * len(batch))})", (term, *batch)
+            )
+
+
+class LexicalIndex:
+    """
+    BM25 scoring over the `SegmentPostings` of a set of segments.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+
+    def search(self, query: str, segments, k: int = 4, exclude=frozenset(), include=None):
+        """
+        Top `k` (doc_id, score) pairs by BM25 over the `segments` postings, best first,
+        skipping `exclude` and, when `include` is given, anything not in it. Term statistics
+        stay corpus-wide.
+        """
+        terms = set(tokenize(query))
+        segments = [postings for postings in segments if postings.documents]
+        count = sum(postings.documents for postings in segments)
+        if not count or not terms:
+            return []
+        average = sum(postings.total_length for postings in segments) / count
+
+        scores = {}
+        for term in terms:
+            found = [(postings, postings.document_frequency(term)) for postings in segments]
+            df = sum(segment_df for _, segment_df in found)
+            if not df:
+                continue
+            idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+            for postings, segment_df in found:
+                if not segment_df:
+                    continue
+                if include is not None and len(include) < segment_df:
+                    # A narrow scope never scans a common term
+                    matches = postings.postings(term, include)
+                else:
+                    matches = postings.postings(term)
+                for doc_id, tf, length in matches:
+                    if doc_id in exclude or (include is not None and doc_id not in include):
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * length / average)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+def postings_bytes(directory: str) -> int:
+    path = os.path.join(directory, LEXICAL_FILE)
+    return os.path.getsize(path) if os.path.exists(path) else 0
@@ -1,10 +1,12 @@
 import os
-import shutil
+from contextlib import asynccontextmanager
 from typing import List, Optional
 
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, Response
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 
 from moviepy import VideoFileClip
 
@@ -12,13 +14,37 @@ import speech_recognition as sr
 import assemblyai as aai
 
 from chatbot import (
-    extract_text_from_pdf,
-    split_text_into_chunks,
-    create_vector_store,
     process_transcribed_video_text,
-    get_insights_from_video,
+    answer_query,
+    stream_answer,
+    chat_scope,
+    answer_cache,
+    ingest_pdf,
+    delete_source,
+    list_sources,
+    start_warm_up,
+    readiness,
     UNIFIED_VECTOR_STORE
 )
+from knowledge_base import describe_store
+from admission import AdmittedStreamingResponse, ServerBusy
+from metrics import CONTENT_TYPE, MetricsMiddleware, render as render_metrics, timed
+from profiling import (
+    ProfilingMiddleware,
+    profiled,
+    admin_enabled,
+    authorized,
+    list_profiles,
+    load_profile,
+    profile_data_path
+)
+from uploads import (
+    store_upload,
+    UploadSizeLimitMiddleware,
+    MAX_PDF_BYTES,
+    MAX_VIDEO_BYTES,
+    MAX_UPLOAD_FILES
+)
 
 from chatbot_repo import save_chat_to_db
 from dotenv import load_dotenv
@@ -29,10 +55,18 @@ load_dotenv()
 # FastAPI App Setup
 # ---------------------------
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the models and the knowledge base in the background; /ready reports when done
+    start_warm_up()
+    yield
+
+
 app = FastAPI(
     title="AI Knowledge Base Chatbot",
     description="Handles PDFs, Videos, Speech Recognition, RAG Chat",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -42,6 +76,16 @@ app.add_middleware(
     allow_methods=["*"],
 )
 
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    limits={
+        "/upload-pdfs": MAX_PDF_BYTES * MAX_UPLOAD_FILES,
+        "/upload-videos": MAX_VIDEO_BYTES * MAX_UPLOAD_FILES
+    }
+)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ProfilingMiddleware)
+
 
 # ---------------------------
 # Models
@@ -50,6 +94,12 @@ app.add_middleware(
 class ChatRequest(BaseModel):
     query: str
     transcription: Optional[str] = None
+    # Optional relevance filters: one video, one kind of source. They narrow retrieval and
+    # are not access control; this API has no authentication and one shared knowledge base.
+    video_id: Optional[int] = None
+    source_type: Optional[str] = None
+    # Rejected: without authentication a client could claim any user's content
+    user_id: Optional[int] = None
 
 
 class UploadTranscription(BaseModel):
@@ -66,13 +116,14 @@ def extract_audio_from_video(video_path: str) -> str:
     """
     audio_path = video_path.rsplit(".", 1)[0] + ".wav"
 
-    clip = VideoFileClip(video_path)
-    clip.audio.write_audiofile(
-        audio_path,
-        fps=16000,
-        codec="pcm_s16le"
-    )
-    clip.close()
+    with timed("audio_extract", 1):
+        clip = VideoFileClip(video_path)
+        clip.audio.write_audiofile(
+            audio_path,
+            fps=16000,
+            codec="pcm_s16le"
+        )
+        clip.close()
 
     return audio_path
 
@@ -113,29 +164,52 @@ def home():
     return {"message": "Backend is running! 🎉"}
 
 
+@app.get("/ready")
+def ready():
+    status = readiness()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.get("/metrics")
+def metrics():
+    return Response(render_metrics(), media_type=CONTENT_TYPE)
+
+
 # ---------------------------
 # 1️⃣ Upload PDFs & Store in FAISS
 # ---------------------------
 
 @app.post("/upload-pdfs")
 async def upload_pdfs(files: List[UploadFile] = File(...)):
-    os.makedirs("documents", exist_ok=True)
     saved_files = []
 
     for file in files:
-        save_path = f"documents/{file.filename}"
-
-        with open(save_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        text = extract_text_from_pdf(save_path)
-        chunks = split_text_into_chunks(text)
-        create_vector_store(UNIFIED_VECTOR_STORE, chunks)
+        # Stream to documents/<sha256>.pdf without blocking the event loop
+        stored = await store_upload(file, "documents", MAX_PDF_BYTES)
+        source_id = f"pdf:{stored.sha256}"
+
+        if stored.existed and source_id in list_sources():
+            saved_files.append({
+                "file": file.filename,
+                "source_id": source_id,
+                "duplicate": True,
+                "new_chunks": 0
+            })
+            continue
+
+        result = await run_in_threadpool(
+            profiled(ingest_pdf),
+            UNIFIED_VECTOR_STORE, stored.path,
+            source_id=source_id,
+            metadata={"file": file.filename}
+        )
 
         saved_files.append({
             "file": file.filename,
-            "chunks": len(chunks),
-            "characters": len(text)
+            "source_id": source_id,
+            "chunks": result["chunks"],
+            "new_chunks": result["added"],
+            "characters": result["characters"]
         })
 
     return {
@@ -148,37 +222,49 @@ async def upload_pdfs(files: List[UploadFile] = File(...)):
 # 2️⃣ Upload Video → Transcribe → Add to FAISS
 # ---------------------------
 
+def transcribe_uploaded_video(video_path: str, engine: str, source_id: str):
+    # Extract audio
+    audio_path = extract_audio_from_video(video_path)
+
+    # Choose transcription engine; the whole file is sent as one segment
+    with timed("transcribe_segment", 1):
+        if engine.lower() == "assemblyai":
+            text = assembly_transcribe(audio_path)
+        else:
+            text = google_transcribe(audio_path)
+
+    print(f"\n[TRANSCRIPTION for {video_path}]:\n{text}\n" + "-"*50)
+
+    # Add transcription to knowledge base
+    process_transcribed_video_text(UNIFIED_VECTOR_STORE, text, source_id=source_id, source_type="video")
+    return text, audio_path
+
+
 @app.post("/upload-videos")
 async def upload_videos(
     files: List[UploadFile] = File(...),
     engine: str = "google"
 ):
-    os.makedirs("videos", exist_ok=True)
     results = []
 
     for file in files:
-        video_path = f"videos/{file.filename}"
-
-        # Save uploaded video
-        with open(video_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Stream to videos/<sha256>.<ext> without blocking the event loop
+        stored = await store_upload(file, "videos", MAX_VIDEO_BYTES)
+        source_id = f"video-file:{stored.sha256}"
 
-        # Extract audio
-        audio_path = extract_audio_from_video(video_path)
-
-        # Choose transcription engine
-        if engine.lower() == "assemblyai":
-            text = assembly_transcribe(audio_path)
-        else:
-            text = google_transcribe(audio_path)
-            
-        print(f"\n[TRANSCRIPTION for {file.filename}]:\n{text}\n" + "-"*50)
+        if stored.existed and source_id in list_sources():
+            results.append({
+                "file": file.filename,
+                "source_id": source_id,
+                "duplicate": True
+            })
+            continue
 
-        # Add transcription to knowledge base
-        process_transcribed_video_text(UNIFIED_VECTOR_STORE, text)
+        text, audio_path = await run_in_threadpool(profiled(transcribe_uploaded_video), stored.path, engine, source_id)
 
         results.append({
             "file": file.filename,
+            "source_id": source_id,
             "chars": len(text),
             "engine_used": engine,
             "audio_file": audio_path
@@ -193,7 +279,8 @@ async def upload_videos(
 
 @app.post("/upload-transcription")
 async def upload_transcription(payload: UploadTranscription):
-    process_transcribed_video_text(UNIFIED_VECTOR_STORE, payload.text)
+    # Chunking, embedding and the commit run off the event loop
+    await run_in_threadpool(profiled(process_transcribed_video_text), UNIFIED_VECTOR_STORE, payload.text)
     return {"message": "Transcription added to knowledge base!"}
 
 
@@ -201,13 +288,26 @@ async def upload_transcription(payload: UploadTranscription):
 # 4️⃣ CHAT API
 # ---------------------------
 
+def request_scope(request: ChatRequest):
+    if request.user_id is not None:
+        raise HTTPException(
+            status_code=400,
+            detail="user_id cannot be set by the client; use the authenticated API to search your own videos"
+        )
+    try:
+        return chat_scope(video_id=request.video_id, source_type=request.source_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.post("/chat")
 async def chat_api(request: ChatRequest):
     print(f"\n[USER QUERY]: {request.query}")
-    answer = get_insights_from_video(
-        request.query,
-        request.transcription
-    )
+    scope = request_scope(request)
+    try:
+        answer = await answer_query(request.query, request.transcription, scope)
+    except ServerBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
 
     # Save to SQL Server
     # save_chat_to_db(request.query, answer)
@@ -216,35 +316,90 @@ async def chat_api(request: ChatRequest):
     return {"answer": answer}
 
 
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Server-Sent Events: `sources` first, then `token` events as Gemini produces them,
+    then `done` with timings.
+    """
+    print(f"\n[USER QUERY][stream]: {request.query}")
+    scope = request_scope(request)
+    try:
+        events = await stream_answer(request.query, request.transcription, scope)
+    except ServerBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return AdmittedStreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 # ---------------------------
 # 5️⃣ Knowledge Base Status
 # ---------------------------
 
 @app.get("/kb-status")
 async def kb_status():
-    if not os.path.exists(UNIFIED_VECTOR_STORE):
-        return {"exists": False, "total_chunks": 0}
-
     try:
-        from langchain_community.vectorstores import FAISS
-        from langchain_huggingface import HuggingFaceEmbeddings
-
-        embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-        vector_store = FAISS.load_local(
-            UNIFIED_VECTOR_STORE,
-            embeddings,
-            allow_dangerous_deserialization=True
-        )
-
-        return {
-            "exists": True,
-            "total_chunks": vector_store.index.ntotal
-        }
-
+        # Answered from the segment manifest; no index or model is loaded.
+        return dict(describe_store(UNIFIED_VECTOR_STORE), answer_cache=answer_cache.stats())
     except Exception as e:
         return {"exists": False, "error": str(e)}
 
 
+# ---------------------------
+# 6️⃣ Knowledge Base Sources
+# ---------------------------
+
+@app.get("/kb-sources")
+async def kb_sources():
+    return {"sources": list_sources()}
+
+
+@app.delete("/kb-sources/{source_id}")
+def kb_delete_source(source_id: str):
+    result = delete_source(source_id)
+    if not result["deleted"]:
+        raise HTTPException(status_code=404, detail="Source not found")
+    return {"source_id": source_id, "deleted_chunks": result["deleted"]}
+
+
+# ---------------------------
+# 7️⃣ Request Profiles (send X-Profile: <PROFILE_TOKEN> to profile a request)
+# ---------------------------
+
+def check_profile_token(x_profile_token: Optional[str]):
+    # Disabled unless PROFILE_TOKEN is configured
+    if not admin_enabled():
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not authorized(x_profile_token):
+        raise HTTPException(status_code=403, detail="Invalid profile token")
+
+
+@app.get("/admin/profiles")
+def get_profiles(limit: int = 50, x_profile_token: Optional[str] = Header(None)):
+    check_profile_token(x_profile_token)
+    return {"profiles": list_profiles(limit)}
+
+
+@app.get("/admin/profiles/{profile_id}")
+def get_profile(profile_id: str, raw: bool = False, x_profile_token: Optional[str] = Header(None)):
+    """
+    The summary and top functions of a profiled request; raw=true downloads the pstats file.
+    """
+    check_profile_token(x_profile_token)
+    if raw:
+        path = profile_data_path(profile_id)
+        if path is None:
+            raise HTTPException(status_code=404, detail="Profile not found")
+        return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+    profile = load_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
+
 # ---------------------------
 # 🚀 RUN SERVER
 
@@ -0,0 +1,241 @@
+"""
+In-process pipeline metrics, exposed on /metrics in the Prometheus text format.
+
+Every pipeline stage records its latency in one histogram, `pipeline_stage_seconds{stage}`,
+and the items it handled (pages, chunks, segments, ...) in `pipeline_stage_items_total`;
+failures count in `pipeline_stage_errors_total`. The stages are:
+
+    pdf_extract, chunk, embed, embed_query, index_write, search, llm,
+    audio_extract, transcribe_segment
+
+Gauges such as index size and queue depths are either set as things happen or read from a
+callback at scrape time. HTTP requests are timed per route by `MetricsMiddleware`.
+
+Metrics live in the memory of each process; with several workers, scrape every worker.
+"""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; spans a BM25 lookup (~1 ms) up to a long transcription segment
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _register(metric):
+    with _registry_lock:
+        _registry.append(metric)
+    return metric
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames=(), callback=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        self._lock = threading.Lock()
+        self._series = {}
+        _register(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _items(self):
+        if self.callback is None:
+            with self._lock:
+                return sorted(self._series.items())
+        try:
+            values = self.callback()
+        except Exception:
+            # A scrape must not fail because one source is unavailable
+            return []
+        return sorted(values.items() if isinstance(values, dict) else [((), values)])
+
+    def samples(self):
+        return [(self.name, _labels(self.labelnames, key), value) for key, value in self._items()]
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name}{labels} {_number(value)}" for name, labels, value in self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """
+    A counter that is inc'd, or read from `callback` at scrape time (for totals another
+    object already keeps). The callback returns a number, or {label values tuple: number}.
+    """
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """
+    A gauge that is set/inc/dec'd, or read from `callback` at scrape time like `Counter`.
+    """
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._series[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket (non-cumulative) counts, sum, count
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._series.items())
+        samples = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", _labels(self.labelnames, key, [("le", _number(bound))]), cumulative))
+            samples.append((f"{self.name}_bucket", _labels(self.labelnames, key, [("le", "+Inf")]), count))
+            samples.append((f"{self.name}_sum", _labels(self.labelnames, key), total))
+            samples.append((f"{self.name}_count", _labels(self.labelnames, key), count))
+        return samples
+
+
+stage_seconds = Histogram("pipeline_stage_seconds", "Latency of each pipeline stage.", ("stage",))
+stage_items = Counter("pipeline_stage_items_total", "Items processed by each pipeline stage.", ("stage",))
+stage_errors = Counter("pipeline_stage_errors_total", "Pipeline stage calls that raised.", ("stage",))
+
+http_seconds = Histogram("http_request_seconds", "HTTP request latency by route.", ("method", "route", "status"))
+
+
+def observe(stage: str, seconds: float, items: int = 0):
+    stage_seconds.observe(seconds, stage=stage)
+    if items:
+        stage_items.inc(items, stage=stage)
+
+
+class _Timing:
+    __slots__ = ("items",)
+
+    def __init__(self, items):
+        self.items = items
+
+
+@contextmanager
+def timed(stage: str, items: int = 0):
+    """
+    Time the block as one call of `stage`, processing `items` items. When the count is
+    only known inside the block, set `.items` on the yielded object.
+    """
+    timing = _Timing(items)
+    start = time.perf_counter()
+    try:
+        yield timing
+    except Exception:
+        stage_errors.inc(stage=stage)
+        raise
+    finally:
+        observe(stage, time.perf_counter() - start, timing.items)
+
+
+def stage_summary() -> dict:
+    """
+    {stage: {"calls", "seconds", "items", "errors"}} recorded so far in this process.
+    """
+    summary = {}
+    for (stage,), (_, seconds, calls) in stage_seconds._items():
+        summary[stage] = {"calls": calls, "seconds": seconds, "items": 0, "errors": 0}
+    for counter, field in ((stage_items, "items"), (stage_errors, "errors")):
+        for (stage,), value in counter._items():
+            summary.setdefault(stage, {"calls": 0, "seconds": 0.0, "items": 0, "errors": 0})[field] = value
+    return summary
+
+
+def render() -> str:
+    with _registry_lock:
+        metrics = list(_registry)
+    return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    Times every HTTP request into `http_request_seconds`, labelled with the route template
+    (e.g. /videos/{video_id}/transcribe) rather than the raw path. Streaming responses are
+    timed until their last chunk is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            http_seconds.observe(
+                time.perf_counter() - start, method=scope["method"], route=route, status=status["code"]
+            )
@@ -0,0 +1,33 @@
+import argparse
+
+from chatbot import get_vector_store, UNIFIED_VECTOR_STORE
+from knowledge_base import describe_store
+from vector_index import ENCODINGS, INDEX_TYPES, INDEX_TYPE, VECTOR_ENCODING
+
+
+def migrate(index_type: str, encoding: str, path: str = UNIFIED_VECTOR_STORE):
+    """
+    Rebuild the knowledge base as a single segment of `index_type` and `encoding`, e.g. to
+    move an existing flat index to HNSW or IVF, or to compress it. Running API servers pick
+    up the new manifest on their next request.
+    """
+    before = describe_store(path)
+    print(f"Rebuilding {path} ({before.get('total_chunks', 0)} chunks, "
+          f"{before.get('segments', 0)} segments) as {index_type}/{encoding}...")
+    try:
+        name = get_vector_store(path).rebuild(index_type, encoding)
+        if name is None:
+            print("Nothing to migrate: the knowledge base is empty.")
+        else:
+            print(f"Migration successful! Knowledge base is now segment {name}: {describe_store(path)}")
+    except Exception as e:
+        print(f"Migration failed: {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=migrate.__doc__)
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=INDEX_TYPE)
+    parser.add_argument("--encoding", choices=ENCODINGS, default=VECTOR_ENCODING)
+    parser.add_argument("--path", default=UNIFIED_VECTOR_STORE)
+    args = parser.parse_args()
+    migrate(args.index_type, args.encoding, args.path)
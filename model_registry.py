@@ -0,0 +1,114 @@
+"""
+Process-wide registry of the shared models.
+
+Importing the application loads nothing: the embedding model and the Gemini client are each
+built on first use, exactly once per process, behind a lock. The servers call
+`chatbot.start_warm_up` at startup so the first request does not pay for loading them, and
+report `readiness()` on their /ready endpoints.
+
+`embeddings` is a stand-in for the embedding model that only loads it when something is
+actually embedded, so the knowledge base can be opened, listed and described without it.
+"""
+import logging
+import os
+import threading
+import time
+
+from langchain_core.embeddings import Embeddings
+
+from embedding_backends import EMBEDDING_BACKEND, backend_model_name, make_embeddings
+
+logger = logging.getLogger(__name__)
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash")
+
+
+class LazyResource:
+    """
+    A value built by `factory` on the first `get()`; concurrent first calls build it once.
+    A failed build is retried on the next `get()`.
+    """
+
+    def __init__(self, name: str, factory):
+        self.name = name
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._value = None
+        self._loaded = False
+        self.load_seconds = None
+        self.error = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def get(self):
+        if self._loaded:
+            return self._value
+        with self._lock:
+            if not self._loaded:
+                start = time.perf_counter()
+                try:
+                    self._value = self._factory()
+                except Exception as e:
+                    self.error = f"{type(e).__name__}: {e}"
+                    raise
+                self.load_seconds = round(time.perf_counter() - start, 3)
+                self.error = None
+                self._loaded = True
+                logger.info("Loaded %s in %.2fs", self.name, self.load_seconds)
+        return self._value
+
+    def replace(self, factory):
+        """
+        Build from `factory` from now on, dropping any loaded value. Benchmarks use it to put
+        offline stand-ins in place of the real models.
+        """
+        with self._lock:
+            self._factory = factory
+            self._value = None
+            self._loaded = False
+            self.load_seconds = None
+            self.error = None
+
+    def status(self) -> dict:
+        return {"loaded": self._loaded, "load_seconds": self.load_seconds, "error": self.error}
+
+
+def _build_llm():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(model=LLM_MODEL, api_key=os.getenv("GOOGLE_API_KEY"))
+
+
+embedding_model = LazyResource("embeddings", make_embeddings)
+llm_client = LazyResource("llm", _build_llm)
+
+RESOURCES = (embedding_model, llm_client)
+
+
+class LazyEmbeddings(Embeddings):
+    """
+    Embeddings that load the configured backend on the first embed call.
+    """
+
+    def __init__(self, resource: LazyResource, model_name: str):
+        self.resource = resource
+        self.model_name = model_name
+
+    def embed_documents(self, texts):
+        return self.resource.get().embed_documents(texts)
+
+    def embed_query(self, text: str):
+        return self.resource.get().embed_query(text)
+
+
+embeddings = LazyEmbeddings(embedding_model, backend_model_name(EMBEDDING_BACKEND))
+
+
+def get_llm():
+    return llm_client.get()
+
+
+def readiness() -> dict:
+    return {resource.name: resource.status() for resource in RESOURCES}
@@ -0,0 +1,119 @@
+"""
+PDF text extraction, page by page, spread over a process pool.
+
+`iter_pdf_pages` yields (page_number, text) in document order while later pages are still
+being extracted. A large PDF is cut into runs of PDF_PAGES_PER_TASK pages that
+PDF_EXTRACT_WORKERS processes extract in parallel (PyPDF2 is pure Python, so threads would
+serialize on the GIL). At most two runs per worker are in flight, so memory stays bounded
+however long the document is. PDFs under PDF_PARALLEL_MIN_PAGES pages are extracted on the
+calling thread, where handing them to the pool costs more than it saves.
+
+Workers are started with the "spawn" method: forking a server process that holds threads,
+locks and model state is unsafe. This module is what the worker processes import, so it
+must stay light.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from PyPDF2 import PdfReader
+
+from metrics import observe, stage_errors
+
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "16"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# In a worker process: the last document opened, keyed by path and modification time, so
+# the runs of one document do not each parse it again
+_reader = (None, None)
+
+
+def _open(path: str) -> PdfReader:
+    global _reader
+    key = (path, os.path.getmtime(path))
+    if _reader[0] != key:
+        _reader = (key, PdfReader(path))
+    return _reader[1]
+
+
+def extract_page_range(path: str, first: int, last: int):
+    """
+    Text of pages [first, last) (0-based) of `path` and the seconds it took. Runs in a worker.
+    """
+    start = time.perf_counter()
+    reader = _open(path)
+    texts = [reader.pages[i].extract_text() or "" for i in range(first, last)]
+    return texts, time.perf_counter() - start
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_EXTRACT_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def _drop_pool(pool):
+    # A worker died; the next document gets a fresh pool
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+
+
+def _iter_inline(reader: PdfReader):
+    for number, page in enumerate(reader.pages, start=1):
+        start = time.perf_counter()
+        text = page.extract_text() or ""
+        observe("pdf_extract", time.perf_counter() - start, 1)
+        yield number, text
+
+
+def iter_pdf_pages(path: str, pages_per_task: int = PDF_PAGES_PER_TASK):
+    """
+    Yield (1-based page number, text) for every page of `path`, in order.
+    """
+    reader = PdfReader(path)
+    total = len(reader.pages)
+    if PDF_EXTRACT_WORKERS <= 1 or total < PDF_PARALLEL_MIN_PAGES:
+        yield from _iter_inline(reader)
+        return
+    del reader
+
+    pool = _get_pool()
+    runs = deque((first, min(first + pages_per_task, total)) for first in range(0, total, pages_per_task))
+    pending = deque()
+    try:
+        while runs or pending:
+            while runs and len(pending) < 2 * PDF_EXTRACT_WORKERS:
+                first, last = runs.popleft()
+                pending.append((first, pool.submit(extract_page_range, path, first, last)))
+
+            first, future = pending.popleft()
+            try:
+                texts, seconds = future.result()
+            except BrokenProcessPool:
+                _drop_pool(pool)
+                stage_errors.inc(stage="pdf_extract")
+                raise
+            except Exception:
+                stage_errors.inc(stage="pdf_extract")
+                raise
+            observe("pdf_extract", seconds, len(texts))
+            for offset, text in enumerate(texts):
+                yield first + offset + 1, text
+    finally:
+        # The caller stopped early or a run failed: don't extract pages nobody will read
+        for _, future in pending:
+            future.cancel()
@@ -0,0 +1,304 @@
+"""
+Opt-in per-request profiling.
+
+A request is profiled when it carries `X-Profile: <PROFILE_TOKEN>`, or when it is picked by
+PROFILE_SAMPLE_RATE among requests under PROFILE_PATHS. Without a PROFILE_TOKEN only sampling
+is available and the /admin/profiles endpoints are disabled. The
+blocking work the request hands to a pool runs under cProfile: the chat pipeline on the
+admission pool, for /videos/{id}/transcribe the transcription job and its segments, and the
+legacy app's uploads. The event loop is shared with other requests, so it is not profiled.
+
+When the request and all the work it started have finished, the merged call graph is written
+to PROFILE_DIR as `<profile_id>.prof` (open with pstats or snakeviz) next to
+`<profile_id>.json`, which holds the timings and the top PROFILE_TOP functions by cumulative
+time. The profile ID is generated here and returned in the X-Profile-Id response header; the
+client's X-Request-ID, when it is a plain token, is only recorded in the summary. Only the
+newest PROFILE_KEEP reports are kept.
+
+When a request is not profiled, the only cost is a header lookup in the middleware and one
+context-variable read per pool submission, so this can stay enabled in production.
+"""
+import contextvars
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_PATHS = tuple(p for p in os.getenv("PROFILE_PATHS", "/chat,/videos").split(",") if p)
+# X-Profile must carry this value and the admin endpoints require it in X-Profile-Token;
+# when unset, neither is available
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "200"))
+PROFILE_TOP = int(os.getenv("PROFILE_TOP", "40"))
+
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+_PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+_active = contextvars.ContextVar("profile_session", default=None)
+# Reports are rendered off the event loop and the request pools
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profile-writer")
+
+
+def valid_request_id(request_id) -> bool:
+    return bool(request_id) and _REQUEST_ID.match(request_id) is not None
+
+
+def valid_profile_id(profile_id) -> bool:
+    return bool(profile_id) and _PROFILE_ID.match(profile_id) is not None
+
+
+def admin_enabled() -> bool:
+    return bool(PROFILE_TOKEN)
+
+
+def authorized(token) -> bool:
+    return bool(PROFILE_TOKEN) and token is not None and hmac.compare_digest(token, PROFILE_TOKEN)
+
+
+class _Session:
+    """
+    The profile of one request. Every piece of work bound to it holds a reference; the
+    report is written when the last one is released.
+    """
+
+    def __init__(self, profile_id: str, request_id, method: str, path: str, reason: str):
+        self.profile_id = profile_id
+        self.request_id = request_id
+        self.method = method
+        self.path = path
+        self.reason = reason
+        self.status = None
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.wall_ms = None
+        self.profiled_ms = 0.0
+        self.calls = 0
+        self.skipped = 0
+        self.threads = set()
+        self.stats = None
+        self._refs = 1
+        self._lock = threading.Lock()
+
+    def hold(self):
+        with self._lock:
+            self._refs += 1
+
+    def release(self):
+        with self._lock:
+            self._refs -= 1
+            done = self._refs == 0
+        if done:
+            _writer.submit(_write_report, self)
+
+    def finish_request(self, status: int):
+        self.status = status
+        self.wall_ms = round((time.perf_counter() - self._start) * 1000, 1)
+        self.release()
+
+    def run(self, fn, args, kwargs):
+        token = _active.set(self)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ allows one cProfile at a time per process; run this call unprofiled
+            profile = None
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            if profile is not None:
+                profile.disable()
+            _active.reset(token)
+            with self._lock:
+                if profile is None:
+                    self.skipped += 1
+                else:
+                    self.calls += 1
+                    self.profiled_ms += seconds * 1000
+                    self.threads.add(threading.current_thread().name)
+                    if self.stats is None:
+                        self.stats = pstats.Stats(profile)
+                    else:
+                        self.stats.add(profile)
+            self.release()
+
+
+def profiled(fn):
+    """
+    Return `fn` bound to the profile of the current request, to be handed to a pool.
+    Outside a profiled request `fn` is returned as is.
+    """
+    session = _active.get()
+    if session is None:
+        return fn
+    session.hold()
+
+    def run(*args, **kwargs):
+        return session.run(fn, args, kwargs)
+
+    return run
+
+
+def _prune(directory: str):
+    reports = sorted(
+        (entry for entry in os.scandir(directory) if entry.name.endswith(".json")),
+        key=lambda entry: entry.stat().st_mtime
+    )
+    for entry in reports[:max(0, len(reports) - PROFILE_KEEP)]:
+        base = entry.path[:-len(".json")]
+        for path in (entry.path, f"{base}.prof"):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _write_report(session: _Session):
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, session.profile_id)
+
+        report = ""
+        if session.stats is None:
+            if os.path.exists(f"{base}.prof"):
+                os.remove(f"{base}.prof")
+        else:
+            session.stats.dump_stats(f"{base}.prof")
+            buffer = io.StringIO()
+            session.stats.stream = buffer
+            session.stats.sort_stats("cumulative").print_stats(PROFILE_TOP)
+            report = buffer.getvalue()
+
+        summary = {
+            "profile_id": session.profile_id,
+            "request_id": session.request_id,
+            "method": session.method,
+            "path": session.path,
+            "status": session.status,
+            "reason": session.reason,
+            "started_at": session.started_at,
+            "wall_ms": session.wall_ms,
+            "profiled_ms": round(session.profiled_ms, 1),
+            "profiled_calls": session.calls,
+            "unprofiled_calls": session.skipped,
+            "threads": sorted(session.threads),
+            "call_graph": session.stats is not None,
+            "report": report,
+        }
+        tmp_path = f"{base}.json.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        os.replace(tmp_path, f"{base}.json")
+        _prune(PROFILE_DIR)
+        print(f"[Profile] {session.method} {session.path} -> {base}.json")
+    except Exception as e:
+        print(f"Failed to write profile {session.profile_id}: {e}")
+
+
+def list_profiles(limit: int = 50):
+    """
+    The newest saved profiles, without their reports.
+    """
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    entries = sorted(
+        (entry for entry in os.scandir(PROFILE_DIR) if entry.name.endswith(".json")),
+        key=lambda entry: entry.stat().st_mtime,
+        reverse=True
+    )[:limit]
+    profiles = []
+    for entry in entries:
+        try:
+            with open(entry.path, "r", encoding="utf-8") as f:
+                summary = json.load(f)
+        except (OSError, ValueError):
+            continue
+        summary.pop("report", None)
+        profiles.append(summary)
+    return profiles
+
+
+def load_profile(profile_id: str):
+    """
+    The saved summary and report of `profile_id`, or None.
+    """
+    if not valid_profile_id(profile_id):
+        return None
+    try:
+        with open(os.path.join(PROFILE_DIR, f"{profile_id}.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def profile_data_path(profile_id: str):
+    """
+    Path of the raw pstats file of `profile_id`, or None.
+    """
+    if not valid_profile_id(profile_id):
+        return None
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.prof")
+    return path if os.path.exists(path) else None
+
+
+class ProfilingMiddleware:
+    """
+    Starts a profile session for requests that ask for one or are sampled; everything else
+    passes straight through.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _reason(self, scope):
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                return "header" if authorized(value.decode("latin-1")) else None
+        if PROFILE_SAMPLE_RATE > 0 and scope["path"].startswith(PROFILE_PATHS):
+            if random.random() < PROFILE_SAMPLE_RATE:
+                return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        reason = self._reason(scope)
+        if reason is None:
+            await self.app(scope, receive, send)
+            return
+
+        request_id = next(
+            (v.decode("latin-1") for n, v in scope["headers"] if n == b"x-request-id"), None
+        )
+        if not valid_request_id(request_id):
+            request_id = None
+        # Report files are named by the server, never by the client
+        profile_id = uuid.uuid4().hex
+        session = _Session(profile_id, request_id, scope["method"], scope["path"], reason)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-id", profile_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        token = _active.set(session)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _active.reset(token)
+            session.finish_request(status["code"])
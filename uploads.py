@@ -0,0 +1,121 @@
+"""
+Streaming, content-addressed upload storage.
+
+Uploaded files are copied to disk in fixed-size blocks without blocking the event loop,
+hashed (SHA-256) on the fly and stored as `<directory>/<sha256><ext>`. Identical bytes are
+therefore stored once; callers can use the hash to find an existing record instead of
+processing the file again.
+"""
+import hashlib
+import os
+import uuid
+
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+
+UPLOAD_BLOCK_BYTES = 1024 * 1024
+MAX_PDF_BYTES = int(os.getenv("MAX_PDF_UPLOAD_MB", "100")) * 1024 * 1024
+MAX_VIDEO_BYTES = int(os.getenv("MAX_VIDEO_UPLOAD_MB", "4096")) * 1024 * 1024
+# Multi-file endpoints accept up to this many files' worth of bytes per request
+MAX_UPLOAD_FILES = int(os.getenv("MAX_UPLOAD_FILES", "10"))
+
+
+class StoredUpload:
+    __slots__ = ("path", "sha256", "size", "existed", "filename")
+
+    def __init__(self, path, sha256, size, existed, filename):
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+        self.existed = existed
+        self.filename = filename
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"File exceeds the upload limit of {max_bytes // (1024 * 1024)} MB"
+    )
+
+
+def _write_block(buffer, digest, block: bytes):
+    digest.update(block)
+    buffer.write(block)
+
+
+def _finish(tmp_path: str, final_path: str) -> bool:
+    """
+    Move the temp file into place. Returns True if the content was already stored.
+    """
+    if os.path.exists(final_path):
+        os.remove(tmp_path)
+        return True
+    os.replace(tmp_path, final_path)
+    return False
+
+
+async def store_upload(file: UploadFile, directory: str, max_bytes: int) -> StoredUpload:
+    """
+    Stream `file` into content-addressed storage under `directory`.
+    Raises HTTPException(413) as soon as the upload is known to exceed `max_bytes`.
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise _too_large(max_bytes)
+
+    os.makedirs(directory, exist_ok=True)
+    _, ext = os.path.splitext(file.filename or "")
+    tmp_path = os.path.join(directory, f".upload-{uuid.uuid4().hex}.part")
+
+    digest = hashlib.sha256()
+    size = 0
+    buffer = await run_in_threadpool(open, tmp_path, "wb")
+    try:
+        while True:
+            block = await file.read(UPLOAD_BLOCK_BYTES)
+            if not block:
+                break
+            size += len(block)
+            if size > max_bytes:
+                raise _too_large(max_bytes)
+            await run_in_threadpool(_write_block, buffer, digest, block)
+    except BaseException:
+        await run_in_threadpool(buffer.close)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    await run_in_threadpool(buffer.close)
+
+    sha256 = digest.hexdigest()
+    final_path = os.path.join(directory, f"{sha256}{ext.lower()}")
+    existed = await run_in_threadpool(_finish, tmp_path, final_path)
+    return StoredUpload(final_path, sha256, size, existed, file.filename)
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Rejects requests to the given path prefixes whose Content-Length already exceeds the
+    limit, before the multipart body is read and spooled. Per-file limits are still
+    enforced by `store_upload`.
+    """
+
+    def __init__(self, app, limits: dict):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST":
+            path = scope["path"]
+            for prefix, max_bytes in self.limits.items():
+                if not path.startswith(prefix):
+                    continue
+                headers = dict(scope["headers"])
+                length = headers.get(b"content-length")
+                # Allow one block of slack for the multipart framing
+                if length and length.isdigit() and int(length) > max_bytes + UPLOAD_BLOCK_BYTES:
+                    error = _too_large(max_bytes)
+                    response = JSONResponse({"detail": error.detail}, status_code=error.status_code)
+                    await response(scope, receive, send)
+                    return
+                break
+        await self.app(scope, receive, send)
@@ -0,0 +1,367 @@
+"""
+FAISS index construction for knowledge-base segments.
+
+Fresh ingestion segments are small and stay exact (flat). Compaction rebuilds the merged
+segment with the index type chosen by KB_INDEX_TYPE once it holds at least
+KB_ANN_MIN_VECTORS vectors:
+
+- flat: exact brute-force L2 search
+- hnsw: graph index (KB_HNSW_M, KB_HNSW_EF_CONSTRUCTION), searched with KB_HNSW_EF_SEARCH
+- ivf:  inverted lists trained on the segment's vectors (KB_IVF_NLIST, 0 = derived from
+        the segment size), searched with KB_IVF_NPROBE
+
+Merged segments can also store their vectors compressed (KB_VECTOR_ENCODING):
+
+- float: full-precision float32 (the default)
+- sq8:   8-bit scalar quantization, 4x smaller
+- pq:    product quantization with KB_PQ_M 8-bit codes per vector (48 codes: 32x smaller)
+
+A compressed segment keeps its float32 vectors in `vectors.npy` next to the index. A search
+fetches KB_REFINE_FACTOR x k candidates from the compressed index and re-ranks them by exact
+distance, reading only those rows. Compaction also merges from these exact vectors.
+
+A search can be scoped to a subset of a segment's vectors (a user's or a video's chunks).
+Subsets of up to KB_PREFILTER_EXACT_MAX vectors are scanned exactly, reading only their
+rows; larger subsets are searched through the index with a FAISS ID selector (flat PQ
+indexes take no selector, so their subsets are always scanned from `vectors.npy`).
+Deleted chunks are left out of unscoped searches with an excluding selector.
+
+All types return L2 distances, so hits from segments of different types still merge by
+distance. Search parameters are applied when a segment is loaded, so they can be tuned
+without rebuilding. Index files and `vectors.npy` are memory-mapped (KB_INDEX_MMAP), so
+worker processes on one host share their pages through the page cache instead of each
+holding a private copy.
+"""
+import logging
+import math
+import os
+
+import faiss
+import numpy as np
+
+from chunk_store import MemoryChunks
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "hnsw", "ivf")
+
+INDEX_TYPE = os.getenv("KB_INDEX_TYPE", "flat")
+# Below this many vectors a flat scan is as fast as any approximate index
+ANN_MIN_VECTORS = int(os.getenv("KB_ANN_MIN_VECTORS", "10000"))
+
+HNSW_M = int(os.getenv("KB_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("KB_HNSW_EF_CONSTRUCTION", "80"))
+HNSW_EF_SEARCH = int(os.getenv("KB_HNSW_EF_SEARCH", "64"))
+
+IVF_NLIST = int(os.getenv("KB_IVF_NLIST", "0"))
+IVF_NPROBE = int(os.getenv("KB_IVF_NPROBE", "16"))
+# FAISS wants roughly this many training points per inverted list
+IVF_POINTS_PER_LIST = 39
+
+ENCODINGS = ("float", "sq8", "pq")
+VECTOR_ENCODING = os.getenv("KB_VECTOR_ENCODING", "float")
+PQ_M = int(os.getenv("KB_PQ_M", "48"))
+# PQ trains 256 centroids per sub-quantizer and wants ~39 points per centroid; smaller
+# segments stay float
+COMPRESS_MIN_VECTORS = int(os.getenv("KB_COMPRESS_MIN_VECTORS", "10000"))
+# Below this many vectors PQ cannot be trained at all (256 centroids per sub-quantizer)
+PQ_MIN_VECTORS = 256
+# Candidates fetched per requested hit from a compressed index before exact re-ranking;
+# 0 returns the approximate distances as they are.
+REFINE_FACTOR = int(os.getenv("KB_REFINE_FACTOR", "4"))
+
+# Scoped searches over at most this many vectors of a segment skip the index
+PREFILTER_EXACT_MAX = int(os.getenv("KB_PREFILTER_EXACT_MAX", "20000"))
+
+INDEX_MMAP = os.getenv("KB_INDEX_MMAP", "1") == "1"
+# IO_FLAG_MMAP_IFC (faiss >= 1.9) maps flat/SQ/PQ codes and IVF lists; older releases only
+# have IO_FLAG_MMAP, which maps IVF lists. The two cannot be combined.
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+INDEX_FILE = "index.faiss"
+VECTORS_FILE = "vectors.npy"
+
+
+def ivf_nlist(count: int) -> int:
+    if IVF_NLIST:
+        # Never more lists than training points
+        return max(1, min(IVF_NLIST, count))
+    return max(1, min(int(4 * math.sqrt(count)), count // IVF_POINTS_PER_LIST))
+
+
+def check_index_type(index_type: str) -> str:
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}; expected one of {INDEX_TYPES}")
+    return index_type
+
+
+def index_type_for(count: int) -> str:
+    """
+    The configured index type for a segment of `count` vectors.
+    """
+    return check_index_type(INDEX_TYPE) if count >= ANN_MIN_VECTORS else "flat"
+
+
+def check_encoding(encoding: str) -> str:
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown vector encoding {encoding!r}; expected one of {ENCODINGS}")
+    return encoding
+
+
+def encoding_for(count: int) -> str:
+    """
+    The configured vector encoding for a segment of `count` vectors.
+    """
+    return check_encoding(VECTOR_ENCODING) if count >= COMPRESS_MIN_VECTORS else "float"
+
+
+def describe_index(index) -> str:
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf"
+    return "flat"
+
+
+def describe_encoding(index) -> str:
+    name = type(faiss.downcast_index(index)).__name__
+    if "PQ" in name:
+        return "pq"
+    if "SQ" in name or "ScalarQuantizer" in name:
+        return "sq8"
+    return "float"
+
+
+def factory_string(index_type: str, encoding: str, count: int) -> str:
+    codes = {"float": "Flat", "sq8": "SQ8", "pq": f"PQ{PQ_M}"}[encoding]
+    if index_type == "hnsw":
+        return f"HNSW{HNSW_M}" if encoding == "float" else f"HNSW{HNSW_M},{codes}"
+    if index_type == "ivf":
+        return f"IVF{ivf_nlist(count)},{codes}"
+    return codes
+
+
+def configure_search(index):
+    """
+    Apply the configured search-time parameters (efSearch / nprobe) to a loaded index.
+    """
+    # Keep returning the caller's wrapper: it holds the Python reference to an IVF quantizer
+    concrete = faiss.downcast_index(index)
+    if isinstance(concrete, faiss.IndexHNSW):
+        concrete.hnsw.efSearch = HNSW_EF_SEARCH
+    elif isinstance(concrete, faiss.IndexIVF):
+        concrete.nprobe = IVF_NPROBE
+    return index
+
+
+def selector_params(index, positions, exclude: bool = False):
+    """
+    Search parameters restricting a search of `index` to `positions` (or, with `exclude`,
+    to everything but `positions`), keeping the configured efSearch / nprobe. None for
+    indexes that take no search parameters (flat PQ).
+    """
+    concrete = faiss.downcast_index(index)
+    if isinstance(concrete, faiss.IndexPQ):
+        return None
+    batch = faiss.IDSelectorBatch(np.asarray(positions, dtype=np.int64))
+    selector = faiss.IDSelectorNot(batch) if exclude else batch
+    if isinstance(concrete, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=concrete.hnsw.efSearch)
+    elif isinstance(concrete, faiss.IndexIVF):
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=concrete.nprobe)
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    # The parameters do not own the selectors
+    params.selector_ref = (selector, batch)
+    return params
+
+
+def trainable(index_type: str, encoding: str, count: int, dimension: int):
+    """
+    The nearest (index_type, encoding) that can be trained on `count` vectors: IVF needs at
+    least one vector and PQ at least PQ_MIN_VECTORS; anything smaller is built flat/float.
+    """
+    if encoding == "pq" and dimension % PQ_M:
+        raise ValueError(f"KB_PQ_M={PQ_M} must divide the embedding dimension {dimension}")
+    if encoding == "pq" and count < PQ_MIN_VECTORS:
+        encoding = "float"
+    if index_type == "ivf" and not count:
+        index_type = "flat"
+    return index_type, encoding
+
+
+def build_index(vectors: np.ndarray, dimension: int, index_type: str, encoding: str = "float"):
+    """
+    Build an index of `index_type` and `encoding` holding `vectors`, in order. Too few
+    vectors to train it give the untrained fallback of `trainable` instead.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    fitted = trainable(index_type, encoding, len(vectors), dimension)
+    if fitted != (index_type, encoding):
+        logger.warning(
+            "%d vectors are too few to train a %s/%s index; building %s/%s",
+            len(vectors), index_type, encoding, *fitted
+        )
+        index_type, encoding = fitted
+    index = faiss.index_factory(dimension, factory_string(index_type, encoding, len(vectors)))
+    concrete = faiss.downcast_index(index)
+    if isinstance(concrete, faiss.IndexHNSW):
+        concrete.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    if not index.is_trained:
+        index.train(vectors)
+    if len(vectors):
+        index.add(vectors)
+    return configure_search(index)
+
+
+def read_index(directory: str):
+    """
+    Load a segment's FAISS index, memory-mapped unless KB_INDEX_MMAP=0.
+    """
+    index = faiss.read_index(os.path.join(directory, INDEX_FILE), MMAP_FLAGS if INDEX_MMAP else 0)
+    return configure_search(index)
+
+
+def write_index(directory: str, index):
+    faiss.write_index(index, os.path.join(directory, INDEX_FILE))
+
+
+def save_vectors(directory: str, vectors: np.ndarray):
+    np.save(os.path.join(directory, VECTORS_FILE), np.ascontiguousarray(vectors, dtype=np.float32))
+
+
+def load_vectors(directory: str):
+    """
+    Full-precision vectors of a compressed segment (memory-mapped), or None.
+    """
+    path = os.path.join(directory, VECTORS_FILE)
+    if not os.path.exists(path):
+        return None
+    return np.load(path, mmap_mode="r" if INDEX_MMAP else None)
+
+
+class Segment:
+    """
+    A knowledge-base segment: its FAISS index, its chunks (a `chunk_store.ChunkStore` on
+    disk or `MemoryChunks` while being built), for compressed indexes the exact vectors
+    used for re-ranking and merging, and once written its BM25 postings
+    (`lexical_index.SegmentPostings`).
+    """
+
+    def __init__(self, index, chunks, vectors=None, postings=None):
+        self.index = index
+        self.chunks = chunks
+        self.vectors = vectors
+        self.postings = postings
+
+    def all_vectors(self) -> np.ndarray:
+        if self.vectors is not None:
+            return np.asarray(self.vectors)
+        return index_vectors(self.index)
+
+    def _exact_rows(self, positions):
+        """
+        Exact vectors at `positions`, or None if the index cannot return them cheaply.
+        """
+        if self.vectors is not None:
+            return np.asarray(self.vectors[positions])
+        if isinstance(faiss.downcast_index(self.index), faiss.IndexIVF):
+            return None
+        return self.index.reconstruct_batch(np.asarray(positions, dtype=np.int64))
+
+    def search(self, embedding, k: int = 4, positions=None, exclude=None):
+        """
+        [(Document, L2 distance)] for the `k` nearest vectors, closest first, optionally
+        only among the vectors at `positions` or skipping those at `exclude` (deleted
+        chunks). Only the returned chunks are read from the chunk store.
+        """
+        ntotal = self.index.ntotal
+        if ntotal == 0:
+            return []
+        query = np.asarray([embedding], dtype=np.float32)
+
+        params = None
+        if positions is not None:
+            positions = sorted(positions)
+            if not positions:
+                return []
+            if len(positions) > PREFILTER_EXACT_MAX:
+                params = selector_params(self.index, positions)
+            # Small subsets, and large ones of an index that takes no selector, are scanned
+            rows = self._exact_rows(positions) if params is None else None
+            if rows is not None:
+                exact = ((rows - query) ** 2).sum(axis=1)
+                candidates = sorted(zip(exact.tolist(), positions))[:k]
+                return self._documents(candidates)
+            if params is None:
+                params = selector_params(self.index, positions)
+            ntotal = len(positions)
+
+        skip = ()
+        if exclude is not None and len(exclude):
+            params = selector_params(self.index, exclude, exclude=True)
+            if params is None:
+                # Over-fetch instead, and drop the excluded hits before any chunk is read
+                skip = set(np.asarray(exclude).tolist())
+            else:
+                ntotal -= len(exclude)
+            if ntotal <= 0:
+                return []
+
+        refine = self.vectors is not None and REFINE_FACTOR > 0
+        fetch = k * REFINE_FACTOR if refine else k
+        fetch = min(ntotal, fetch + len(skip))
+        distances, found = self.index.search(query, fetch, params=params)
+        candidates = [
+            (float(d), int(p)) for d, p in zip(distances[0], found[0]) if p >= 0 and p not in skip
+        ]
+
+        if refine and candidates:
+            # Sorted positions keep the reads from the mapped file sequential
+            positions = sorted(p for _, p in candidates)
+            exact = ((np.asarray(self.vectors[positions]) - query) ** 2).sum(axis=1)
+            candidates = sorted(zip(exact.tolist(), positions))
+
+        return self._documents(candidates[:k])
+
+    def _documents(self, candidates):
+        docs = self.chunks.documents(position for _, position in candidates)
+        return [(docs[position][1], distance) for distance, position in candidates if position in docs]
+
+
+def index_vectors(index) -> np.ndarray:
+    """
+    All vectors of an index, by position.
+    """
+    concrete = faiss.downcast_index(index)
+    if isinstance(concrete, faiss.IndexIVF):
+        concrete.make_direct_map()
+    if index.ntotal == 0:
+        return np.empty((0, index.d), dtype=np.float32)
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def merge_segments(segments, exclude=frozenset(), index_type: str = None,
+                   encoding: str = None) -> Segment:
+    """
+    Merge loaded segments into one new in-memory segment, leaving out the doc_ids in
+    `exclude`. The index is rebuilt as `index_type`/`encoding`, or as configured for its size.
+    """
+    dimension = segments[0].index.d
+    blocks = []
+    chunks = []
+    for segment in segments:
+        keep = [row for row in segment.chunks.rows() if row[1] not in exclude]
+        if not keep:
+            continue
+        vectors = segment.all_vectors()
+        blocks.append(vectors[[position for position, *_ in keep]])
+        chunks.extend(tuple(row[1:]) for row in keep)
+
+    vectors = np.vstack(blocks) if blocks else np.empty((0, dimension), dtype=np.float32)
+    index_type = check_index_type(index_type) if index_type else index_type_for(len(vectors))
+    encoding = check_encoding(encoding) if encoding else encoding_for(len(vectors))
+    index = build_index(vectors, dimension, index_type, encoding)
+    logger.info("Built %s/%s index over %d vectors", describe_index(index), describe_encoding(index), len(vectors))
+    return Segment(index, MemoryChunks(chunks), vectors if encoding != "float" else None)